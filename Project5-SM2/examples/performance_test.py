@@ -10,15 +10,14 @@ import random
 import statistics
 import json
 from typing import List, Dict, Tuple
-from src.core.sm2_basic import SM2Basic
-from src.core.sm2_optimized import SM2Optimized
+from src.core.sm2_tables import get_shared_sm2
 
 class SM2PerformanceTester:
     """SM2性能测试类"""
     
     def __init__(self):
-        self.sm2_basic = SM2Basic()
-        self.sm2_optimized = SM2Optimized()
+        self.sm2_basic = get_shared_sm2()
+        self.sm2_optimized = get_shared_sm2(optimized=True)
         self.test_results = {}
     
     def time_function(self, func, *args, **kwargs) -> Tuple[float, any]:
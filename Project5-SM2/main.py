@@ -8,8 +8,7 @@ SM2椭圆曲线密码算法主演示程序
 import sys
 import time
 import random
-from src.core.sm2_basic import SM2Basic
-from src.core.sm2_optimized import SM2Optimized
+from src.core.sm2_tables import get_shared_sm2
 from examples.performance_test import SM2PerformanceTester
 
 def demo_basic_functionality():
@@ -18,7 +17,7 @@ def demo_basic_functionality():
     print("=" * 50)
     
     # 创建SM2实例
-    sm2 = SM2Basic()
+    sm2 = get_shared_sm2()
     
     # 生成密钥对
     print("1. Key Generation")
@@ -110,7 +109,7 @@ def demo_optimized_functionality():
     print("=" * 50)
     
     # 创建优化版本的SM2实例
-    sm2 = SM2Optimized()
+    sm2 = get_shared_sm2(optimized=True)
     
     # 生成密钥对
     print("1. Optimized Key Generation")
@@ -212,8 +211,8 @@ def performance_comparison():
     print("=" * 50)
     
     # 创建基础版本和优化版本
-    sm2_basic = SM2Basic()
-    sm2_optimized = SM2Optimized()
+    sm2_basic = get_shared_sm2()
+    sm2_optimized = get_shared_sm2(optimized=True)
     
     # 生成测试数据
     test_scalar = random.randint(1, sm2_basic.n - 1)
@@ -296,7 +295,7 @@ def interactive_demo():
     print("SM2 Interactive Demo")
     print("=" * 30)
     
-    sm2 = SM2Optimized()
+    sm2 = get_shared_sm2(optimized=True)
     
     while True:
         print("\nSelect an option:")
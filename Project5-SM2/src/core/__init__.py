@@ -7,5 +7,6 @@ SM2核心算法实现模块
 
 from .sm2_basic import SM2Basic
 from .sm2_optimized import SM2Optimized
+from .sm2_keys import SM2SigningKey, SM2VerifyingKey, SM2VerifyingKeyCache
 
-__all__ = ['SM2Basic', 'SM2Optimized'] 
\ No newline at end of file
+__all__ = ['SM2Basic', 'SM2Optimized', 'SM2SigningKey', 'SM2VerifyingKey', 'SM2VerifyingKeyCache'] 
\ No newline at end of file
@@ -8,8 +8,13 @@ SM2椭圆曲线密码算法基础实现
 import hashlib
 import random
 import os
+import threading
+from collections import OrderedDict
 from typing import Tuple, Optional
 
+# 模逆元LRU缓存的容量：足以容纳基点G与一个热点公钥的倍点链（各约256个逆元）
+INV_CACHE_SIZE = 1024
+
 class SM2Point:
     """椭圆曲线上的点"""
     def __init__(self, x: int, y: int, is_infinity: bool = False):
@@ -46,14 +51,30 @@ class SM2Basic:
         # 基点G
         self.G = SM2Point(self.Gx, self.Gy)
         
-        # 预计算的逆元表（用于优化）
-        self._inv_cache = {}
+        # 模逆元的有界LRU缓存 (a mod m, m) -> a^(-1) mod m，共享实例可能被多个线程同时使用；
+        # 对固定点的标量乘法每次都重复同一条倍点链，其中的逆元可以直接命中
+        self._inv_cache = OrderedDict()
+        self._inv_cache_lock = threading.Lock()
     
     def _mod_inverse(self, a: int, m: int) -> int:
-        """计算模逆元 a^(-1) mod m"""
-        if a in self._inv_cache:
-            return self._inv_cache[a]
-        
+        """计算模逆元 a^(-1) mod m（带缓存）"""
+        key = (a % m, m)
+        with self._inv_cache_lock:
+            result = self._inv_cache.get(key)
+            if result is not None:
+                self._inv_cache.move_to_end(key)
+                return result
+        
+        result = self._compute_mod_inverse(a, m)
+        
+        with self._inv_cache_lock:
+            self._inv_cache[key] = result
+            while len(self._inv_cache) > INV_CACHE_SIZE:
+                self._inv_cache.popitem(last=False)
+        return result
+    
+    def _compute_mod_inverse(self, a: int, m: int) -> int:
+        """计算模逆元 a^(-1) mod m（不缓存）"""
         # 使用扩展欧几里得算法
         def extended_gcd(a, b):
             if a == 0:
@@ -67,9 +88,7 @@ class SM2Basic:
         if gcd != 1:
             raise ValueError("Modular inverse does not exist")
         
-        result = (x % m + m) % m
-        self._inv_cache[a] = result
-        return result
+        return (x % m + m) % m
     
     def point_add(self, P: SM2Point, Q: SM2Point) -> SM2Point:
         """椭圆曲线点加法"""
@@ -224,6 +243,13 @@ class SM2Basic:
         # 计算消息摘要
         e = int.from_bytes(hashlib.sha256(message).digest(), 'big')
         
+        # 计算(1 + d)^(-1) mod n
+        d_inv = self._mod_inverse(1 + private_key, self.n)
+        
+        return self._sign_digest(e, private_key, d_inv)
+    
+    def _sign_digest(self, e: int, private_key: int, d_inv: int) -> Tuple[int, int]:
+        """对消息摘要e签名，d_inv为预先计算好的(1 + d)^(-1) mod n"""
         while True:
             # 生成随机数k
             k = random.randint(1, self.n - 1)
@@ -238,7 +264,6 @@ class SM2Basic:
                 continue
             
             # 计算s = (1 + d)^(-1) * (k - r*d) mod n
-            d_inv = self._mod_inverse(1 + private_key, self.n)
             s = (d_inv * (k - r * private_key)) % self.n
             if s == 0:
                 continue
@@ -247,15 +272,19 @@ class SM2Basic:
     
     def verify(self, message: bytes, signature: Tuple[int, int], public_key: SM2Point) -> bool:
         """SM2签名验证"""
+        # 计算消息摘要
+        e = int.from_bytes(hashlib.sha256(message).digest(), 'big')
+        
+        return self._verify_digest(e, signature, public_key)
+    
+    def _verify_digest(self, e: int, signature: Tuple[int, int], public_key: SM2Point) -> bool:
+        """验证消息摘要e的签名"""
         r, s = signature
         
         # 检查r, s是否在有效范围内
         if not (1 <= r < self.n and 1 <= s < self.n):
             return False
         
-        # 计算消息摘要
-        e = int.from_bytes(hashlib.sha256(message).digest(), 'big')
-        
         # 计算t = (r + s) mod n
         t = (r + s) % self.n
         if t == 0:
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SM2签名密钥与验证密钥对象
+将与密钥绑定的常量（(1+d)^(-1)、序列化字节、预计算表）只计算一次，
+避免对同一密钥反复签名/验证时的重复开销
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from .sm2_basic import SM2Basic, SM2Point
+
+# 协议对象中验证密钥LRU缓存的默认容量
+VERIFYING_KEY_CACHE_SIZE = 128
+
+def encode_point(point: SM2Point) -> bytes:
+    """将点编码为未压缩格式 04||x||y"""
+    return b'\x04' + point.x.to_bytes(32, 'big') + point.y.to_bytes(32, 'big')
+
+def decode_point(data: bytes) -> SM2Point:
+    """从未压缩格式 04||x||y 解码点"""
+    if len(data) != 65 or data[0] != 0x04:
+        raise ValueError("Invalid point encoding")
+    return SM2Point(int.from_bytes(data[1:33], 'big'), int.from_bytes(data[33:65], 'big'))
+
+class SM2VerifyingKey:
+    """SM2验证密钥（公钥）及其缓存状态"""
+    
+    def __init__(self, public_key: SM2Point, sm2: Optional[SM2Basic] = None,
+                 precompute: bool = False):
+        self.sm2 = sm2 if sm2 is not None else SM2Basic()
+        self.public_key = public_key
+        self.public_key_bytes = encode_point(public_key)
+        
+        self._window_size = 4
+        self._table = None  # 公钥的窗口预计算表 [0P, 1P, ..., (2^w - 1)P]
+        
+        if precompute:
+            self.precompute()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes, sm2: Optional[SM2Basic] = None,
+                   precompute: bool = False) -> 'SM2VerifyingKey':
+        """从未压缩编码的公钥创建验证密钥"""
+        return cls(decode_point(data), sm2, precompute)
+    
+    def to_bytes(self) -> bytes:
+        """返回未压缩编码的公钥"""
+        return self.public_key_bytes
+    
+    def precompute(self):
+        """预计算公钥的窗口倍数表，适合被反复验证的热点公钥"""
+        if self._table is not None:
+            return
+        
+        table = [SM2Point(0, 0, True), self.public_key]
+        for _ in range(2, 1 << self._window_size):
+            table.append(self.sm2.point_add(table[-1], self.public_key))
+        self._table = table
+    
+    @property
+    def is_precomputed(self) -> bool:
+        return self._table is not None
+    
+    def _multiply_public_key(self, k: int) -> SM2Point:
+        """使用预计算表的固定窗口点乘 k*P"""
+        w = self._window_size
+        mask = (1 << w) - 1
+        windows = (k.bit_length() + w - 1) // w
+        
+        result = SM2Point(0, 0, True)
+        for i in range(windows - 1, -1, -1):
+            for _ in range(w):
+                result = self.sm2.point_double(result)
+            digit = (k >> (i * w)) & mask
+            if digit:
+                result = self.sm2.point_add(result, self._table[digit])
+        
+        return result
+    
+    def verify_digest(self, e: int, signature: Tuple[int, int]) -> bool:
+        """验证消息摘要e的签名"""
+        if self._table is None:
+            return self.sm2._verify_digest(e, signature, self.public_key)
+        
+        r, s = signature
+        if not (1 <= r < self.sm2.n and 1 <= s < self.sm2.n):
+            return False
+        
+        t = (r + s) % self.sm2.n
+        if t == 0:
+            return False
+        
+        point = self.sm2.point_add(
+            self.sm2.point_multiply(s, self.sm2.G),
+            self._multiply_public_key(t)
+        )
+        if point.is_infinity:
+            return False
+        
+        return (e + point.x) % self.sm2.n == r
+    
+    def verify(self, message: bytes, signature: Tuple[int, int]) -> bool:
+        """SM2签名验证，与 SM2Basic.verify 兼容"""
+        e = int.from_bytes(hashlib.sha256(message).digest(), 'big')
+        return self.verify_digest(e, signature)
+
+class SM2SigningKey:
+    """SM2签名密钥（私钥）及其缓存状态"""
+    
+    def __init__(self, private_key: int, sm2: Optional[SM2Basic] = None,
+                 public_key: Optional[SM2Point] = None):
+        self.sm2 = sm2 if sm2 is not None else SM2Basic()
+        
+        if not (1 <= private_key < self.sm2.n - 1):
+            raise ValueError("Private key out of range")
+        
+        self.private_key = private_key
+        # (1 + d)^(-1) mod n，n为素数，使用费马小定理
+        self.d_inv = pow(1 + private_key, self.sm2.n - 2, self.sm2.n)
+        
+        self._public_key = public_key
+        self._verifying_key = None
+    
+    @classmethod
+    def generate(cls, sm2: Optional[SM2Basic] = None) -> 'SM2SigningKey':
+        """生成新的签名密钥"""
+        sm2 = sm2 if sm2 is not None else SM2Basic()
+        private_key, public_key = sm2.generate_keypair()
+        return cls(private_key, sm2, public_key)
+    
+    @property
+    def public_key(self) -> SM2Point:
+        """公钥 P = d*G（按需计算并缓存）"""
+        if self._public_key is None:
+            self._public_key = self.sm2.point_multiply(self.private_key, self.sm2.G)
+        return self._public_key
+    
+    @property
+    def verifying_key(self) -> SM2VerifyingKey:
+        """对应的验证密钥"""
+        if self._verifying_key is None:
+            self._verifying_key = SM2VerifyingKey(self.public_key, self.sm2)
+        return self._verifying_key
+    
+    @property
+    def public_key_bytes(self) -> bytes:
+        return self.verifying_key.public_key_bytes
+    
+    def to_bytes(self) -> bytes:
+        """返回32字节大端编码的私钥"""
+        return self.private_key.to_bytes(32, 'big')
+    
+    def sign_digest(self, e: int) -> Tuple[int, int]:
+        """对消息摘要e签名"""
+        return self.sm2._sign_digest(e, self.private_key, self.d_inv)
+    
+    def sign(self, message: bytes) -> Tuple[int, int]:
+        """SM2数字签名，与 SM2Basic.sign 兼容"""
+        e = int.from_bytes(hashlib.sha256(message).digest(), 'big')
+        return self.sign_digest(e)
+
+class SM2VerifyingKeyCache:
+    """按公钥索引的验证密钥对象的有界LRU缓存，供协议对象复用热点公钥的缓存状态"""
+    
+    def __init__(self, sm2: SM2Basic, cache_size: int = VERIFYING_KEY_CACHE_SIZE):
+        self.sm2 = sm2
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # SM2Point -> SM2VerifyingKey
+        self._lock = threading.Lock()
+    
+    def get(self, public_key: SM2Point) -> SM2VerifyingKey:
+        """获取（缓存的）验证密钥对象，超出容量时淘汰最久未使用的公钥"""
+        with self._lock:
+            verifying_key = self._cache.get(public_key)
+            if verifying_key is not None:
+                self._cache.move_to_end(public_key)
+                return verifying_key
+        
+        verifying_key = SM2VerifyingKey(public_key, self.sm2)
+        with self._lock:
+            self._cache[public_key] = verifying_key
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verifying_key
+    
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -8,8 +8,10 @@ SM2椭圆曲线密码算法优化实现
 import hashlib
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, List, Dict, Optional
 from .sm2_basic import SM2Point, SM2Basic
+from .sm2_tables import get_base_table
 
 class SM2Optimized(SM2Basic):
     """SM2椭圆曲线密码算法优化实现"""
@@ -22,15 +24,12 @@ class SM2Optimized(SM2Basic):
         self._precomputed_multiples = {}
         self._window_size = 4  # 滑动窗口大小
         
-        # 初始化预计算表
-        self._init_precomputed_tables()
+        # 基点预计算表在首次使用时获取（进程内共享，可从缓存文件加载）
     
     def _init_precomputed_tables(self):
         """初始化预计算表（延迟初始化）"""
-        # 只预计算少量基本倍数，其他按需计算
-        self._precomputed_multiples[self.G] = {}
-        for i in range(1, min(16, 1 << self._window_size), 2):  # 只预计算前几个奇数倍数
-            self._precomputed_multiples[self.G][i] = self.point_multiply_basic(i, self.G)
+        if self.G not in self._precomputed_multiples:
+            self._precomputed_multiples[self.G] = get_base_table(self, self._window_size)
     
     def point_multiply_basic(self, k: int, P: SM2Point) -> SM2Point:
         """基础点乘法（用于预计算）"""
@@ -81,8 +80,9 @@ class SM2Optimized(SM2Basic):
         if k == 1:
             return P
         
-        # 如果P是基点G，使用预计算表
-        if P == self.G and P in self._precomputed_multiples:
+        # 如果P是基点G，使用共享的预计算表
+        if P == self.G:
+            self._init_precomputed_tables()
             return self._point_multiply_precomputed(k, P)
         
         # 预计算奇数倍数
@@ -175,20 +175,13 @@ class SM2Optimized(SM2Basic):
     
     def fast_mod_inverse(self, a: int, m: int) -> int:
         """快速模逆元计算（使用费马小定理）"""
-        if a in self._inv_cache:
-            return self._inv_cache[a]
-        
         # 对于素数模，使用费马小定理: a^(-1) = a^(p-2) mod p
         if m == self.p:
-            result = pow(a, m - 2, m)
-        else:
-            result = super()._mod_inverse(a, m)
-        
-        self._inv_cache[a] = result
-        return result
+            return pow(a, m - 2, m)
+        return super()._compute_mod_inverse(a, m)
     
-    def _mod_inverse(self, a: int, m: int) -> int:
-        """重写模逆元计算"""
+    def _compute_mod_inverse(self, a: int, m: int) -> int:
+        """重写模逆元计算（缓存由 _mod_inverse 负责）"""
         return self.fast_mod_inverse(a, m)
     
     def batch_point_multiply(self, scalars: List[int], points: List[SM2Point]) -> List[SM2Point]:
@@ -252,6 +245,160 @@ class SM2Optimized(SM2Basic):
         
         return R == r
 
+    def _jacobian_double(self, X1: int, Y1: int, Z1: int) -> Tuple[int, int, int]:
+        """Jacobian坐标下的点倍乘（Z=0表示无穷远点）"""
+        p = self.p
+        if Z1 == 0 or Y1 == 0:
+            return 1, 1, 0
+        
+        YY = Y1 * Y1 % p
+        ZZ = Z1 * Z1 % p
+        S = 4 * X1 * YY % p
+        M = (3 * X1 * X1 + self.a * ZZ * ZZ) % p
+        X3 = (M * M - 2 * S) % p
+        Y3 = (M * (S - X3) - 8 * YY * YY) % p
+        Z3 = 2 * Y1 * Z1 % p
+        return X3, Y3, Z3
+    
+    def _jacobian_add_affine(self, X1: int, Y1: int, Z1: int, x2: int, y2: int) -> Tuple[int, int, int]:
+        """Jacobian坐标点与仿射坐标点的混合加法"""
+        p = self.p
+        if Z1 == 0:
+            return x2, y2, 1
+        
+        ZZ = Z1 * Z1 % p
+        U2 = x2 * ZZ % p
+        S2 = y2 * ZZ * Z1 % p
+        H = (U2 - X1) % p
+        r = (S2 - Y1) % p
+        
+        if H == 0:
+            if r == 0:
+                return self._jacobian_double(X1, Y1, Z1)
+            return 1, 1, 0
+        
+        HH = H * H % p
+        HHH = HH * H % p
+        V = X1 * HH % p
+        X3 = (r * r - HHH - 2 * V) % p
+        Y3 = (r * (V - X3) - Y1 * HHH) % p
+        Z3 = Z1 * H % p
+        return X3, Y3, Z3
+    
+    def _jacobian_multiply_naf(self, naf: List[int], P: SM2Point) -> Tuple[int, int, int]:
+        """使用预先计算好的NAF表示在Jacobian坐标下计算 k*P，不做求逆"""
+        neg_y = (-P.y) % self.p
+        X, Y, Z = 1, 1, 0
+        
+        for i in reversed(range(len(naf))):
+            X, Y, Z = self._jacobian_double(X, Y, Z)
+            if naf[i] == 1:
+                X, Y, Z = self._jacobian_add_affine(X, Y, Z, P.x, P.y)
+            elif naf[i] == -1:
+                X, Y, Z = self._jacobian_add_affine(X, Y, Z, P.x, neg_y)
+        
+        return X, Y, Z
+    
+    def _batch_to_affine(self, points: List[Tuple[int, int, int]]) -> List[Optional[SM2Point]]:
+        """批量转换为仿射坐标（Montgomery技巧，只做一次模逆），无穷远点返回None"""
+        p = self.p
+        
+        # 前缀积
+        prefix = []
+        acc = 1
+        for _, _, Z in points:
+            prefix.append(acc)
+            if Z != 0:
+                acc = acc * Z % p
+        
+        inv = pow(acc, p - 2, p)
+        
+        results = [None] * len(points)
+        for i in range(len(points) - 1, -1, -1):
+            X, Y, Z = points[i]
+            if Z == 0:
+                continue
+            z_inv = inv * prefix[i] % p
+            inv = inv * Z % p
+            z_inv2 = z_inv * z_inv % p
+            results[i] = SM2Point(X * z_inv2 % p, Y * z_inv2 * z_inv % p)
+        
+        return results
+    
+    def _finish_decrypt(self, C2: bytes, C3: bytes, point: SM2Point) -> bytes:
+        """根据 d*C1 完成KDF、异或和C3校验"""
+        x2_bytes = point.x.to_bytes(32, 'big')
+        y2_bytes = point.y.to_bytes(32, 'big')
+        t = self._kdf(x2_bytes + y2_bytes, len(C2))
+        
+        # 整块异或
+        if C2:
+            M = (int.from_bytes(C2, 'big') ^ int.from_bytes(t, 'big')).to_bytes(len(C2), 'big')
+        else:
+            M = b''
+        
+        expected_C3 = hashlib.sha256(x2_bytes + M + y2_bytes).digest()
+        if C3 != expected_C3:
+            raise ValueError("Decryption failed: hash verification failed")
+        
+        return M
+    
+    def decrypt_batch(self, ciphertexts: List[bytes], private_key: int,
+                      max_workers: Optional[int] = None) -> List[Dict]:
+        """同一私钥的批量解密
+        
+        私钥的NAF表示只计算一次；所有 d*C1 在Jacobian坐标下计算并统一做一次批量求逆；
+        KDF/异或/C3校验在线程池中执行。单个密文出错不会中断整批，
+        每一项返回 {"success": True, "plaintext": ...} 或 {"success": False, "error": ...}。
+        """
+        results = [None] * len(ciphertexts)
+        naf = self._signed_binary_representation(private_key)
+        
+        # 解析并校验C1，计算Jacobian坐标的 d*C1
+        pending = []
+        for i, ciphertext in enumerate(ciphertexts):
+            try:
+                if len(ciphertext) < 97:
+                    raise ValueError("Invalid ciphertext length")
+                if ciphertext[0] != 0x04:
+                    raise ValueError("Invalid C1 format")
+                
+                C1 = SM2Point(int.from_bytes(ciphertext[1:33], 'big'),
+                              int.from_bytes(ciphertext[33:65], 'big'))
+                left = (C1.y * C1.y) % self.p
+                right = (C1.x * C1.x * C1.x + self.a * C1.x + self.b) % self.p
+                if left != right:
+                    raise ValueError("Invalid C1: point not on curve")
+                
+                pending.append((i, ciphertext, self._jacobian_multiply_naf(naf, C1)))
+            except ValueError as e:
+                results[i] = {"success": False, "error": str(e)}
+        
+        # 一次批量求逆得到所有仿射坐标
+        points = self._batch_to_affine([jacobian for _, _, jacobian in pending])
+        
+        def finish(item):
+            (i, ciphertext, _), point = item
+            if point is None:
+                return i, {"success": False, "error": "Decryption failed: point at infinity"}
+            try:
+                plaintext = self._finish_decrypt(ciphertext[65:-32], ciphertext[-32:], point)
+                return i, {"success": True, "plaintext": plaintext}
+            except ValueError as e:
+                return i, {"success": False, "error": str(e)}
+        
+        items = list(zip(pending, points))
+        if len(items) > 1 and max_workers != 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                finished = list(executor.map(finish, items))
+        else:
+            finished = [finish(item) for item in items]
+        
+        for i, result in finished:
+            results[i] = result
+        
+        return results
+
 def performance_comparison():
     """性能比较测试"""
     print("SM2 Performance Comparison")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SM2进程级共享实例与基点预计算表
+预计算表在首次使用时延迟构建，也可以从按曲线参数版本化的缓存文件（mmap）加载
+"""
+
+import hashlib
+import mmap
+import os
+import sys
+import threading
+from typing import Dict, Optional
+from .sm2_basic import SM2Basic, SM2Point
+
+# 缓存文件格式: MAGIC || fingerprint(32) || window_size(1) || count(2) || count * (multiple(2) || x(32) || y(32))
+TABLE_CACHE_MAGIC = b"SM2TBL01"
+TABLE_CACHE_ENV = "SM2_TABLE_CACHE"
+_HEADER_SIZE = len(TABLE_CACHE_MAGIC) + 32 + 1 + 2
+_ENTRY_SIZE = 2 + 32 + 32
+
+_lock = threading.Lock()
+_base_tables = {}      # fingerprint -> {multiple: point}
+_shared_instances = {}  # 'basic' / 'optimized' -> 实例
+
+def curve_fingerprint(sm2: SM2Basic, window_size: int) -> bytes:
+    """曲线参数与窗口大小的指纹，用于区分不同版本的预计算表"""
+    hasher = hashlib.sha256(TABLE_CACHE_MAGIC)
+    for value in (sm2.p, sm2.a, sm2.b, sm2.n, sm2.Gx, sm2.Gy):
+        hasher.update(value.to_bytes(32, 'big'))
+    hasher.update(window_size.to_bytes(1, 'big'))
+    return hasher.digest()
+
+def build_base_table(sm2: SM2Basic, window_size: int) -> Dict[int, SM2Point]:
+    """计算基点G的奇数倍数表 {1: G, 3: 3G, ..., (2^w - 1)G}"""
+    table = {1: sm2.G}
+    double_G = sm2.point_double(sm2.G)
+    for i in range(3, 1 << window_size, 2):
+        table[i] = sm2.point_add(table[i - 2], double_G)
+    return table
+
+def load_table_cache(path: str, fingerprint: bytes) -> Optional[Dict[int, SM2Point]]:
+    """从缓存文件加载预计算表，文件不存在或版本不匹配时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if len(data) < _HEADER_SIZE or data[:len(TABLE_CACHE_MAGIC)] != TABLE_CACHE_MAGIC:
+                    return None
+                
+                offset = len(TABLE_CACHE_MAGIC)
+                if data[offset:offset + 32] != fingerprint:
+                    return None
+                
+                count = int.from_bytes(data[_HEADER_SIZE - 2:_HEADER_SIZE], 'big')
+                if len(data) != _HEADER_SIZE + count * _ENTRY_SIZE:
+                    return None
+                
+                table = {}
+                for i in range(count):
+                    start = _HEADER_SIZE + i * _ENTRY_SIZE
+                    multiple = int.from_bytes(data[start:start + 2], 'big')
+                    x = int.from_bytes(data[start + 2:start + 34], 'big')
+                    y = int.from_bytes(data[start + 34:start + 66], 'big')
+                    table[multiple] = SM2Point(x, y)
+                return table
+    except (OSError, ValueError):
+        return None
+
+def save_table_cache(path: str, fingerprint: bytes, window_size: int,
+                     table: Dict[int, SM2Point]):
+    """将预计算表写入缓存文件（先写临时文件再原子替换）"""
+    parts = [
+        TABLE_CACHE_MAGIC,
+        fingerprint,
+        window_size.to_bytes(1, 'big'),
+        len(table).to_bytes(2, 'big')
+    ]
+    for multiple in sorted(table):
+        point = table[multiple]
+        parts.append(multiple.to_bytes(2, 'big'))
+        parts.append(point.x.to_bytes(32, 'big'))
+        parts.append(point.y.to_bytes(32, 'big'))
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(tmp_path, path)
+
+def get_base_table(sm2: SM2Basic, window_size: int,
+                   cache_path: Optional[str] = None) -> Dict[int, SM2Point]:
+    """获取进程内共享的基点预计算表
+    
+    首次调用时若指定了缓存文件（参数或环境变量 SM2_TABLE_CACHE）则尝试加载，
+    加载失败则计算并写回缓存文件；之后的调用直接返回同一张表。
+    """
+    fingerprint = curve_fingerprint(sm2, window_size)
+    table = _base_tables.get(fingerprint)
+    if table is not None:
+        return table
+    
+    with _lock:
+        table = _base_tables.get(fingerprint)
+        if table is not None:
+            return table
+        
+        cache_path = cache_path or os.environ.get(TABLE_CACHE_ENV)
+        if cache_path:
+            table = load_table_cache(cache_path, fingerprint)
+        
+        if table is None:
+            table = build_base_table(sm2, window_size)
+            if cache_path:
+                try:
+                    save_table_cache(cache_path, fingerprint, window_size, table)
+                except OSError:
+                    pass  # 缓存只是加速手段，写入失败不影响使用
+        
+        _base_tables[fingerprint] = table
+        return table
+
+def get_shared_sm2(optimized: bool = False) -> SM2Basic:
+    """获取进程内共享的SM2实例（延迟创建）"""
+    key = 'optimized' if optimized else 'basic'
+    instance = _shared_instances.get(key)
+    if instance is not None:
+        return instance
+    
+    with _lock:
+        instance = _shared_instances.get(key)
+        if instance is None:
+            if optimized:
+                from .sm2_optimized import SM2Optimized
+                instance = SM2Optimized()
+            else:
+                instance = SM2Basic()
+            _shared_instances[key] = instance
+        return instance
+
+def main():
+    """生成预计算表缓存文件"""
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.core.sm2_tables <cache_file>")
+        return
+    
+    from .sm2_optimized import SM2Optimized
+    sm2 = SM2Optimized()
+    path = sys.argv[1]
+    fingerprint = curve_fingerprint(sm2, sm2._window_size)
+    table = build_base_table(sm2, sm2._window_size)
+    save_table_cache(path, fingerprint, sm2._window_size, table)
+    print(f"Wrote {len(table)} precomputed points to {path}")
+    print(f"Curve fingerprint: {fingerprint.hex()}")
+
+if __name__ == "__main__":
+    main()
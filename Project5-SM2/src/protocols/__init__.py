@@ -7,8 +7,11 @@ SM2协议实现模块
 
 from .sm2_signature_protocol import SM2SignatureProtocol, SM2Certificate
 from .sm2_key_exchange import SM2KeyExchange, SM2KeyExchangeParty, SM2KeyExchangeSession
+from .sm2_cert_store import SM2CertificateStore
+from .sm2_hybrid_encryption import SM2HybridEncryption, SM2HybridReader
 
 __all__ = [
-    'SM2SignatureProtocol', 'SM2Certificate',
-    'SM2KeyExchange', 'SM2KeyExchangeParty', 'SM2KeyExchangeSession'
+    'SM2SignatureProtocol', 'SM2Certificate', 'SM2CertificateStore',
+    'SM2KeyExchange', 'SM2KeyExchangeParty', 'SM2KeyExchangeSession',
+    'SM2HybridEncryption', 'SM2HybridReader'
 ] 
\ No newline at end of file
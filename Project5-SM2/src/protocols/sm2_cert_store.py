@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SM2证书持久化存储
+基于SQLite，按主体和序列号建立索引，证书按需加载并在内存中保留有界的LRU缓存
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+from .sm2_signature_protocol import SM2Certificate
+
+class SM2CertificateStore:
+    """SM2证书存储
+    
+    支持与字典相同的按主体访问方式（store[subject]、subject in store），
+    可以直接作为 SM2SignatureProtocol 的 certificates 使用。
+    同一主体有多张证书时，按主体查询返回最后写入的一张。
+    """
+    
+    def __init__(self, path: str = ":memory:", cache_size: int = 1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (key_type, key) -> SM2Certificate
+        self._lock = threading.RLock()
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS certificates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                serial_number TEXT NOT NULL UNIQUE ON CONFLICT REPLACE,
+                subject TEXT NOT NULL,
+                issuer TEXT NOT NULL,
+                not_after INTEGER NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_certificates_subject ON certificates (subject, id)"
+        )
+        self._conn.commit()
+    
+    def _cache_get(self, key) -> Optional[SM2Certificate]:
+        cert = self._cache.get(key)
+        if cert is not None:
+            self._cache.move_to_end(key)
+        return cert
+    
+    def _cache_put(self, key, cert: SM2Certificate):
+        self._cache[key] = cert
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _row_values(cert: SM2Certificate):
+        return (cert.serial_number, cert.subject, cert.issuer, cert.not_after,
+                json.dumps(cert.to_dict(), sort_keys=True))
+    
+    def put(self, cert: SM2Certificate):
+        """存储一张证书（相同序列号的证书会被替换）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO certificates (serial_number, subject, issuer, not_after, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                self._row_values(cert)
+            )
+            self._conn.commit()
+            self._cache_put(("subject", cert.subject), cert)
+            self._cache_put(("serial", cert.serial_number), cert)
+    
+    def put_many(self, certs: Iterable[SM2Certificate], batch_size: int = 10000) -> int:
+        """批量导入证书，每批在一个事务中提交，返回导入数量"""
+        count = 0
+        batch = []
+        with self._lock:
+            for cert in certs:
+                batch.append(self._row_values(cert))
+                if len(batch) >= batch_size:
+                    count += self._insert_batch(batch)
+                    batch = []
+            if batch:
+                count += self._insert_batch(batch)
+            
+            # 批量导入可能覆盖缓存中的主体，直接清空缓存
+            self._cache.clear()
+        return count
+    
+    def _insert_batch(self, batch: List) -> int:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO certificates (serial_number, subject, issuer, not_after, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                batch
+            )
+        return len(batch)
+    
+    def import_files(self, filenames: Iterable[str], batch_size: int = 10000) -> int:
+        """从 export_certificate 导出的JSON文件批量导入证书"""
+        def load():
+            for filename in filenames:
+                with open(filename, 'r') as f:
+                    yield SM2Certificate.from_dict(json.load(f))
+        return self.put_many(load(), batch_size)
+    
+    def _load_one(self, query: str, params) -> Optional[SM2Certificate]:
+        row = self._conn.execute(query, params).fetchone()
+        if row is None:
+            return None
+        return SM2Certificate.from_dict(json.loads(row[0]))
+    
+    def get(self, subject: str, default=None) -> Optional[SM2Certificate]:
+        """按主体查询证书"""
+        with self._lock:
+            key = ("subject", subject)
+            cert = self._cache_get(key)
+            if cert is None:
+                cert = self._load_one(
+                    "SELECT data FROM certificates WHERE subject = ? ORDER BY id DESC LIMIT 1",
+                    (subject,)
+                )
+                if cert is None:
+                    return default
+                self._cache_put(key, cert)
+            return cert
+    
+    def get_by_serial(self, serial_number: str) -> Optional[SM2Certificate]:
+        """按序列号查询证书"""
+        with self._lock:
+            key = ("serial", serial_number)
+            cert = self._cache_get(key)
+            if cert is None:
+                cert = self._load_one(
+                    "SELECT data FROM certificates WHERE serial_number = ?",
+                    (serial_number,)
+                )
+                if cert is not None:
+                    self._cache_put(key, cert)
+            return cert
+    
+    def delete(self, serial_number: str) -> bool:
+        """按序列号删除证书"""
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM certificates WHERE serial_number = ?", (serial_number,)
+                )
+            self._cache.clear()
+            return cursor.rowcount > 0
+    
+    def __getitem__(self, subject: str) -> SM2Certificate:
+        cert = self.get(subject)
+        if cert is None:
+            raise KeyError(subject)
+        return cert
+    
+    def __setitem__(self, subject: str, cert: SM2Certificate):
+        if subject != cert.subject:
+            raise ValueError("Subject does not match certificate subject")
+        self.put(cert)
+    
+    def __contains__(self, subject: str) -> bool:
+        with self._lock:
+            if ("subject", subject) in self._cache:
+                return True
+            row = self._conn.execute(
+                "SELECT 1 FROM certificates WHERE subject = ? LIMIT 1", (subject,)
+            ).fetchone()
+            return row is not None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM certificates").fetchone()[0]
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+            self._cache.clear()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SM2混合加密（SM2-KEM + 对称流加密）
+SM2只用于封装随机对称密钥（每条消息一个C1），数据按固定大小分块加密，
+每块带认证标签，支持流式加解密和按块随机访问
+"""
+
+import hashlib
+import hmac
+import io
+import random
+import struct
+from typing import BinaryIO, Optional, Tuple
+from ..core.sm2_basic import SM2Basic, SM2Point
+from ..core.sm2_tables import get_shared_sm2
+
+# 容器格式:
+#   头部: MAGIC(4) || version(1) || chunk_size(4) || C1(65)
+#   数据块: 每块 ciphertext(chunk_size，最后一块可更短) || tag(32)
+# 块i的标签 = HMAC-SHA256(mac_key, H(头部) || i(8) || final(1) || ciphertext)，
+# final标记防止截断攻击，块序号防止重排
+HYBRID_MAGIC = b"SM2H"
+HYBRID_VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 32
+_HEADER_FORMAT = ">4sBI"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT) + 65
+
+def _xor_bytes(data: bytes, keystream: bytes) -> bytes:
+    """整块异或（按大整数运算，避免逐字节的Python循环）"""
+    n = len(data)
+    if n == 0:
+        return b''
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(keystream[:n], 'little')).to_bytes(n, 'little')
+
+def _read_full(stream: BinaryIO, size: int) -> bytes:
+    """读取size字节，只有到达流末尾时才返回更短的数据"""
+    data = stream.read(size)
+    if len(data) == size or not data:
+        return data
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        part = stream.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b''.join(parts)
+
+class _ChunkCipher:
+    """对称分块加密：SHAKE-256密钥流 + HMAC-SHA256标签"""
+    
+    def __init__(self, key_material: bytes, header: bytes):
+        self.enc_key = key_material[:32]
+        self.mac_key = key_material[32:64]
+        self.header_digest = hashlib.sha256(header).digest()
+    
+    def _keystream(self, index: int, length: int) -> bytes:
+        return hashlib.shake_256(self.enc_key + index.to_bytes(8, 'big')).digest(length)
+    
+    def _tag(self, index: int, final: bool, ciphertext: bytes) -> bytes:
+        mac = hmac.new(self.mac_key, self.header_digest, hashlib.sha256)
+        mac.update(index.to_bytes(8, 'big'))
+        mac.update(b'\x01' if final else b'\x00')
+        mac.update(ciphertext)
+        return mac.digest()
+    
+    def seal(self, index: int, final: bool, plaintext: bytes) -> bytes:
+        ciphertext = _xor_bytes(plaintext, self._keystream(index, len(plaintext)))
+        return ciphertext + self._tag(index, final, ciphertext)
+    
+    def open(self, index: int, final: bool, frame: bytes) -> bytes:
+        if len(frame) < TAG_SIZE:
+            raise ValueError("Decryption failed: truncated chunk")
+        ciphertext, tag = frame[:-TAG_SIZE], frame[-TAG_SIZE:]
+        if not hmac.compare_digest(tag, self._tag(index, final, ciphertext)):
+            raise ValueError(f"Decryption failed: authentication failed for chunk {index}")
+        return _xor_bytes(ciphertext, self._keystream(index, len(ciphertext)))
+
+class SM2HybridEncryption:
+    """SM2混合加密"""
+    
+    def __init__(self, sm2: Optional[SM2Basic] = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if not (0 < chunk_size < (1 << 32)):
+            raise ValueError("Invalid chunk size")
+        self.sm2 = sm2 if sm2 is not None else get_shared_sm2()
+        self.chunk_size = chunk_size
+    
+    def encapsulate(self, public_key: SM2Point) -> Tuple[bytes, bytes]:
+        """SM2密钥封装，返回 (64字节对称密钥材料, C1编码)"""
+        while True:
+            k = random.randint(1, self.sm2.n - 1)
+            C1 = self.sm2.point_multiply(k, self.sm2.G)
+            kPb = self.sm2.point_multiply(k, public_key)
+            
+            key_material = self.sm2._kdf(
+                kPb.x.to_bytes(32, 'big') + kPb.y.to_bytes(32, 'big'), 64
+            )
+            if any(key_material):
+                C1_bytes = b'\x04' + C1.x.to_bytes(32, 'big') + C1.y.to_bytes(32, 'big')
+                return key_material, C1_bytes
+    
+    def decapsulate(self, C1_bytes: bytes, private_key: int) -> bytes:
+        """SM2密钥解封装"""
+        if len(C1_bytes) != 65 or C1_bytes[0] != 0x04:
+            raise ValueError("Invalid C1 format")
+        
+        C1 = SM2Point(int.from_bytes(C1_bytes[1:33], 'big'), int.from_bytes(C1_bytes[33:65], 'big'))
+        left = (C1.y * C1.y) % self.sm2.p
+        right = (C1.x * C1.x * C1.x + self.sm2.a * C1.x + self.sm2.b) % self.sm2.p
+        if left != right:
+            raise ValueError("Invalid C1: point not on curve")
+        
+        dC1 = self.sm2.point_multiply(private_key, C1)
+        return self.sm2._kdf(dC1.x.to_bytes(32, 'big') + dC1.y.to_bytes(32, 'big'), 64)
+    
+    def _build_header(self, C1_bytes: bytes) -> bytes:
+        return struct.pack(_HEADER_FORMAT, HYBRID_MAGIC, HYBRID_VERSION, self.chunk_size) + C1_bytes
+    
+    @staticmethod
+    def _parse_header(header: bytes) -> Tuple[int, bytes]:
+        if len(header) != _HEADER_SIZE:
+            raise ValueError("Invalid hybrid ciphertext: truncated header")
+        magic, version, chunk_size = struct.unpack(_HEADER_FORMAT, header[:_HEADER_SIZE - 65])
+        if magic != HYBRID_MAGIC:
+            raise ValueError("Invalid hybrid ciphertext: bad magic")
+        if version != HYBRID_VERSION:
+            raise ValueError(f"Unsupported hybrid ciphertext version: {version}")
+        if chunk_size == 0:
+            raise ValueError("Invalid hybrid ciphertext: bad chunk size")
+        return chunk_size, header[_HEADER_SIZE - 65:]
+    
+    def encrypt_stream(self, in_stream: BinaryIO, out_stream: BinaryIO, public_key: SM2Point) -> int:
+        """流式加密，返回明文长度"""
+        key_material, C1_bytes = self.encapsulate(public_key)
+        header = self._build_header(C1_bytes)
+        cipher = _ChunkCipher(key_material, header)
+        out_stream.write(header)
+        
+        # 预读一块以判断当前块是否为最后一块
+        total = 0
+        index = 0
+        chunk = _read_full(in_stream, self.chunk_size)
+        while True:
+            next_chunk = _read_full(in_stream, self.chunk_size) if len(chunk) == self.chunk_size else b''
+            final = not next_chunk
+            out_stream.write(cipher.seal(index, final, chunk))
+            total += len(chunk)
+            if final:
+                return total
+            chunk = next_chunk
+            index += 1
+    
+    def decrypt_stream(self, in_stream: BinaryIO, out_stream: BinaryIO, private_key: int) -> int:
+        """流式解密，每块认证通过后才输出，篡改或截断时抛出ValueError，返回明文长度"""
+        header = _read_full(in_stream, _HEADER_SIZE)
+        chunk_size, C1_bytes = self._parse_header(header)
+        cipher = _ChunkCipher(self.decapsulate(C1_bytes, private_key), header)
+        
+        frame_size = chunk_size + TAG_SIZE
+        total = 0
+        index = 0
+        frame = _read_full(in_stream, frame_size)
+        while True:
+            next_frame = _read_full(in_stream, frame_size) if len(frame) == frame_size else b''
+            final = not next_frame
+            plaintext = cipher.open(index, final, frame)
+            out_stream.write(plaintext)
+            total += len(plaintext)
+            if final:
+                return total
+            frame = next_frame
+            index += 1
+    
+    def encrypt(self, message: bytes, public_key: SM2Point) -> bytes:
+        """加密字节串"""
+        out = io.BytesIO()
+        self.encrypt_stream(io.BytesIO(message), out, public_key)
+        return out.getvalue()
+    
+    def decrypt(self, ciphertext: bytes, private_key: int) -> bytes:
+        """解密字节串"""
+        out = io.BytesIO()
+        self.decrypt_stream(io.BytesIO(ciphertext), out, private_key)
+        return out.getvalue()
+    
+    def encrypt_file(self, in_filename: str, out_filename: str, public_key: SM2Point) -> int:
+        """加密文件"""
+        with open(in_filename, 'rb') as fin, open(out_filename, 'wb') as fout:
+            return self.encrypt_stream(fin, fout, public_key)
+    
+    def decrypt_file(self, in_filename: str, out_filename: str, private_key: int) -> int:
+        """解密文件"""
+        with open(in_filename, 'rb') as fin, open(out_filename, 'wb') as fout:
+            return self.decrypt_stream(fin, fout, private_key)
+    
+    def open_reader(self, container, private_key: int) -> 'SM2HybridReader':
+        """对完整密文（bytes或mmap）创建随机访问读取器"""
+        return SM2HybridReader(self, container, private_key)
+
+class SM2HybridReader:
+    """混合加密密文的随机访问读取器，只解密被访问的数据块"""
+    
+    def __init__(self, hybrid: SM2HybridEncryption, container, private_key: int):
+        header = bytes(container[:_HEADER_SIZE])
+        self.chunk_size, C1_bytes = hybrid._parse_header(header)
+        self._cipher = _ChunkCipher(hybrid.decapsulate(C1_bytes, private_key), header)
+        self._container = container
+        
+        frame_size = self.chunk_size + TAG_SIZE
+        body_size = len(container) - _HEADER_SIZE
+        if body_size < TAG_SIZE:
+            raise ValueError("Invalid hybrid ciphertext: no data chunks")
+        self.num_chunks = max(1, (body_size + frame_size - 1) // frame_size)
+        last_frame = body_size - (self.num_chunks - 1) * frame_size
+        if last_frame < TAG_SIZE:
+            raise ValueError("Invalid hybrid ciphertext: truncated chunk")
+        self.size = body_size - self.num_chunks * TAG_SIZE
+    
+    def decrypt_chunk(self, index: int) -> bytes:
+        """解密并认证第index块"""
+        if not (0 <= index < self.num_chunks):
+            raise IndexError("Chunk index out of range")
+        frame_size = self.chunk_size + TAG_SIZE
+        start = _HEADER_SIZE + index * frame_size
+        frame = bytes(self._container[start:start + frame_size])
+        return self._cipher.open(index, index == self.num_chunks - 1, frame)
+    
+    def read(self, offset: int, length: int) -> bytes:
+        """读取明文区间 [offset, offset + length)"""
+        if offset < 0 or length < 0:
+            raise ValueError("Invalid range")
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        
+        first = offset // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        data = b''.join(self.decrypt_chunk(i) for i in range(first, last + 1))
+        start = offset - first * self.chunk_size
+        return data[start:start + (end - offset)]
@@ -10,6 +10,8 @@ import random
 import time
 from typing import Tuple, Dict, Optional, List
 from ..core.sm2_basic import SM2Basic, SM2Point
+from ..core.sm2_keys import SM2VerifyingKey, SM2VerifyingKeyCache
+from ..core.sm2_tables import get_shared_sm2
 
 class SM2KeyExchangeParty:
     """SM2密钥交换参与方"""
@@ -23,10 +25,19 @@ class SM2KeyExchangeParty:
         self.temp_public_key = None
         self.shared_secret = None
         self.session_key = None
+        self._verifying_key = None
         
+    @property
+    def verifying_key(self) -> SM2VerifyingKey:
+        """长期公钥对应的验证密钥对象（只含公开数据，公钥被替换时自动重建）"""
+        if self._verifying_key is None or self._verifying_key.public_key != self.public_key:
+            self._verifying_key = SM2VerifyingKey(self.public_key, self.sm2)
+        return self._verifying_key
+    
     def generate_keypair(self) -> Tuple[int, SM2Point]:
         """生成长期密钥对"""
         self.private_key, self.public_key = self.sm2.generate_keypair()
+        self._verifying_key = SM2VerifyingKey(self.public_key, self.sm2)
         return self.private_key, self.public_key
     
     def generate_temp_keypair(self) -> Tuple[int, SM2Point]:
@@ -37,9 +48,15 @@ class SM2KeyExchangeParty:
 class SM2KeyExchange:
     """SM2密钥交换协议"""
     
-    def __init__(self):
-        self.sm2 = SM2Basic()
+    def __init__(self, sm2: Optional[SM2Basic] = None):
+        # 默认使用进程内共享的SM2实例，避免每个协议对象重复初始化
+        self.sm2 = sm2 if sm2 is not None else get_shared_sm2()
         self.key_length = 32  # 默认会话密钥长度（字节）
+        self._verifying_keys = SM2VerifyingKeyCache(self.sm2)  # 双方长期公钥的有界LRU缓存
+    
+    def get_verifying_key(self, public_key: SM2Point) -> SM2VerifyingKey:
+        """获取（缓存的）验证密钥对象"""
+        return self._verifying_keys.get(public_key)
     
     def _kdf(self, z: bytes, klen: int) -> bytes:
         """密钥派生函数KDF"""
@@ -63,6 +80,9 @@ class SM2KeyExchange:
                 hasher.update(arg)
             elif isinstance(arg, int):
                 hasher.update(arg.to_bytes(32, 'big'))
+            elif isinstance(arg, SM2VerifyingKey):
+                # 使用缓存的公钥编码（去掉04前缀）
+                hasher.update(arg.public_key_bytes[1:])
             elif isinstance(arg, SM2Point):
                 hasher.update(arg.x.to_bytes(32, 'big'))
                 hasher.update(arg.y.to_bytes(32, 'big'))
@@ -172,8 +192,8 @@ class SM2KeyExchange:
                 V.x, V.y,
                 party.party_id,
                 other_id,
-                party.public_key,
-                other_public_key,
+                party.verifying_key,
+                self.get_verifying_key(other_public_key),
                 party.temp_public_key,
                 other_temp_public_key
             )
@@ -182,8 +202,8 @@ class SM2KeyExchange:
                 V.x, V.y,
                 other_id,
                 party.party_id,
-                other_public_key,
-                party.public_key,
+                self.get_verifying_key(other_public_key),
+                party.verifying_key,
                 other_temp_public_key,
                 party.temp_public_key
             )
@@ -209,8 +229,8 @@ class SM2KeyExchange:
                 party.shared_secret,
                 party.party_id,
                 other_id,
-                party.public_key,
-                other_public_key,
+                self.get_verifying_key(party.public_key),
+                self.get_verifying_key(other_public_key),
                 party.temp_public_key,
                 other_temp_public_key
             )
@@ -221,8 +241,8 @@ class SM2KeyExchange:
                 party.shared_secret,
                 other_id,
                 party.party_id,
-                other_public_key,
-                party.public_key,
+                self.get_verifying_key(other_public_key),
+                self.get_verifying_key(party.public_key),
                 other_temp_public_key,
                 party.temp_public_key
             )
@@ -6,10 +6,20 @@ SM2数字签名协议实现
 """
 
 import hashlib
+import mmap
+import os
 import time
 import json
-from typing import Dict, List, Tuple, Optional, Union
+from typing import BinaryIO, Dict, List, Tuple, Optional, Union
 from ..core.sm2_basic import SM2Basic, SM2Point
+from ..core.sm2_keys import SM2SigningKey, SM2VerifyingKey, SM2VerifyingKeyCache
+from ..core.sm2_tables import get_shared_sm2
+
+# 流式签名时每次读取的块大小
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+# 私钥参数：整数私钥，或调用方持有的 SM2SigningKey（反复签名时复用其缓存状态）
+PrivateKey = Union[int, SM2SigningKey]
 
 class SM2Certificate:
     """SM2数字证书类"""
@@ -93,17 +103,34 @@ class SM2Certificate:
 class SM2SignatureProtocol:
     """SM2数字签名协议类"""
     
-    def __init__(self):
-        self.sm2 = SM2Basic()
-        self.certificates = {}  # 证书存储
+    def __init__(self, sm2: Optional[SM2Basic] = None, cert_store=None):
+        # 默认使用进程内共享的SM2实例，避免每个协议对象重复初始化
+        self.sm2 = sm2 if sm2 is not None else get_shared_sm2()
+        # 证书存储：默认为内存字典，也可以传入 SM2CertificateStore 等按主体索引的持久化存储
+        self.certificates = cert_store if cert_store is not None else {}
         self.ca_keys = {}       # CA密钥存储
+        
+        # 验证密钥对象的有界LRU缓存，热点公钥的编码、预计算表等只计算一次；
+        # 签名密钥不在这里缓存，反复签名时由调用方持有 SM2SigningKey 并传入
+        self._verifying_keys = SM2VerifyingKeyCache(self.sm2)
+    
+    def _signing_key(self, private_key: PrivateKey) -> SM2SigningKey:
+        """将私钥转换为签名密钥对象（传入 SM2SigningKey 时直接使用，复用其缓存状态）"""
+        if isinstance(private_key, SM2SigningKey):
+            return private_key
+        return SM2SigningKey(private_key, self.sm2)
+    
+    def get_verifying_key(self, public_key: SM2Point) -> SM2VerifyingKey:
+        """获取（缓存的）验证密钥对象"""
+        return self._verifying_keys.get(public_key)
     
     def generate_ca_keypair(self, ca_name: str) -> Tuple[int, SM2Point]:
         """生成CA密钥对"""
         private_key, public_key = self.sm2.generate_keypair()
         self.ca_keys[ca_name] = {
             "private_key": private_key,
-            "public_key": public_key
+            "public_key": public_key,
+            "signing_key": SM2SigningKey(private_key, self.sm2, public_key)
         }
         return private_key, public_key
     
@@ -129,9 +156,9 @@ class SM2SignatureProtocol:
         )
         
         # 使用CA私钥签名证书
-        ca_private_key = self.ca_keys[ca_name]["private_key"]
+        ca_key = self.ca_keys[ca_name]
         tbs_data = cert.get_tbs_data()
-        cert.signature = self.sm2.sign(tbs_data, ca_private_key)
+        cert.signature = self._signing_key(ca_key.get("signing_key", ca_key["private_key"])).sign(tbs_data)
         
         # 存储证书
         self.certificates[subject] = cert
@@ -147,28 +174,48 @@ class SM2SignatureProtocol:
             return False
         
         tbs_data = cert.get_tbs_data()
-        return self.sm2.verify(tbs_data, cert.signature, ca_public_key)
+        return self.get_verifying_key(ca_public_key).verify(tbs_data, cert.signature)
     
-    def create_signature_with_cert(self, message: bytes, private_key: int,
-                                  cert: SM2Certificate) -> Dict:
-        """使用证书创建签名"""
-        signature = self.sm2.sign(message, private_key)
+    def _sign_message_hash(self, message_hasher, private_key: PrivateKey,
+                           cert: SM2Certificate, timestamped: bool = False) -> Dict:
+        """根据已完成消息哈希的hasher创建签名（消息只需哈希一遍）"""
+        timestamp = int(time.time())
         
-        return {
-            "message_hash": hashlib.sha256(message).hexdigest(),
+        # 带时间戳的签名对 message||timestamp 签名，从消息哈希状态复制后继续更新即可
+        if timestamped:
+            signed_hasher = message_hasher.copy()
+            signed_hasher.update(timestamp.to_bytes(8, 'big'))
+        else:
+            signed_hasher = message_hasher
+        
+        e = int.from_bytes(signed_hasher.digest(), 'big')
+        signature = self._signing_key(private_key).sign_digest(e)
+        
+        signature_data = {
+            "message_hash": message_hasher.hexdigest(),
             "signature": {
                 "r": hex(signature[0]),
                 "s": hex(signature[1])
             },
             "certificate": cert.to_dict(),
-            "timestamp": int(time.time()),
+            "timestamp": timestamp,
             "algorithm": "SM2withSM3"
         }
+        if timestamped:
+            signature_data["type"] = "timestamped"
+        return signature_data
     
-    def verify_signature_with_cert(self, message: bytes, signature_data: Dict,
-                                  ca_public_key: SM2Point) -> bool:
-        """使用证书验证签名"""
+    def _verify_message_hash(self, message_hasher, signature_data: Dict,
+                             ca_public_key: SM2Point, timestamped: bool = False,
+                             max_age_seconds: int = 3600) -> bool:
+        """根据已完成消息哈希的hasher验证签名"""
         try:
+            signature_time = signature_data["timestamp"]
+            
+            # 检查时间戳
+            if timestamped and int(time.time()) - signature_time > max_age_seconds:
+                return False
+            
             # 重构证书
             cert = SM2Certificate.from_dict(signature_data["certificate"])
             
@@ -177,22 +224,38 @@ class SM2SignatureProtocol:
                 return False
             
             # 验证消息哈希
-            expected_hash = hashlib.sha256(message).hexdigest()
-            if signature_data["message_hash"] != expected_hash:
+            if signature_data["message_hash"] != message_hasher.hexdigest():
                 return False
             
+            if timestamped:
+                signed_hasher = message_hasher.copy()
+                signed_hasher.update(signature_time.to_bytes(8, 'big'))
+            else:
+                signed_hasher = message_hasher
+            
             # 验证签名
             signature = (
                 int(signature_data["signature"]["r"], 16),
                 int(signature_data["signature"]["s"], 16)
             )
+            e = int.from_bytes(signed_hasher.digest(), 'big')
             
-            return self.sm2.verify(message, signature, cert.public_key)
+            return self.get_verifying_key(cert.public_key).verify_digest(e, signature)
             
         except Exception:
             return False
     
-    def create_signature_chain(self, message: bytes, signers: List[Tuple[str, int]]) -> List[Dict]:
+    def create_signature_with_cert(self, message: bytes, private_key: PrivateKey,
+                                  cert: SM2Certificate) -> Dict:
+        """使用证书创建签名"""
+        return self._sign_message_hash(hashlib.sha256(message), private_key, cert)
+    
+    def verify_signature_with_cert(self, message: bytes, signature_data: Dict,
+                                  ca_public_key: SM2Point) -> bool:
+        """使用证书验证签名"""
+        return self._verify_message_hash(hashlib.sha256(message), signature_data, ca_public_key)
+    
+    def create_signature_chain(self, message: bytes, signers: List[Tuple[str, PrivateKey]]) -> List[Dict]:
         """创建签名链（多重签名）"""
         signature_chain = []
         
@@ -218,62 +281,59 @@ class SM2SignatureProtocol:
         
         return True
     
-    def create_timestamped_signature(self, message: bytes, private_key: int,
+    def create_timestamped_signature(self, message: bytes, private_key: PrivateKey,
                                    cert: SM2Certificate) -> Dict:
         """创建带时间戳的签名"""
-        timestamp = int(time.time())
-        timestamped_message = message + timestamp.to_bytes(8, 'big')
-        
-        signature = self.sm2.sign(timestamped_message, private_key)
-        
-        return {
-            "message_hash": hashlib.sha256(message).hexdigest(),
-            "signature": {
-                "r": hex(signature[0]),
-                "s": hex(signature[1])
-            },
-            "certificate": cert.to_dict(),
-            "timestamp": timestamp,
-            "algorithm": "SM2withSM3",
-            "type": "timestamped"
-        }
+        return self._sign_message_hash(hashlib.sha256(message), private_key, cert,
+                                       timestamped=True)
     
     def verify_timestamped_signature(self, message: bytes, signature_data: Dict,
                                    ca_public_key: SM2Point, max_age_seconds: int = 3600) -> bool:
         """验证带时间戳的签名"""
-        try:
-            # 检查时间戳
-            current_time = int(time.time())
-            signature_time = signature_data["timestamp"]
-            
-            if current_time - signature_time > max_age_seconds:
-                return False
-            
-            # 重构证书
-            cert = SM2Certificate.from_dict(signature_data["certificate"])
-            
-            # 验证证书
-            if not self.verify_certificate(cert, ca_public_key):
-                return False
-            
-            # 验证消息哈希
-            expected_hash = hashlib.sha256(message).hexdigest()
-            if signature_data["message_hash"] != expected_hash:
-                return False
-            
-            # 重构带时间戳的消息
-            timestamped_message = message + signature_time.to_bytes(8, 'big')
-            
-            # 验证签名
-            signature = (
-                int(signature_data["signature"]["r"], 16),
-                int(signature_data["signature"]["s"], 16)
-            )
-            
-            return self.sm2.verify(timestamped_message, signature, cert.public_key)
-            
-        except Exception:
-            return False
+        return self._verify_message_hash(hashlib.sha256(message), signature_data, ca_public_key,
+                                         timestamped=True, max_age_seconds=max_age_seconds)
+    
+    def _hash_stream(self, stream: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """按固定大小分块读取并哈希数据流，内存占用与数据大小无关"""
+        hasher = hashlib.sha256()
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            hasher.update(chunk)
+        return hasher
+    
+    def _hash_file(self, filename: str):
+        """通过mmap哈希文件，避免将整个文件读入内存"""
+        hasher = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hasher
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hasher.update(data)
+        return hasher
+    
+    def sign_stream(self, stream: BinaryIO, private_key: PrivateKey, cert: SM2Certificate,
+                    timestamped: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+        """对数据流签名（单遍读取），签名格式与 create_signature_with_cert 相同"""
+        return self._sign_message_hash(self._hash_stream(stream, chunk_size), private_key,
+                                       cert, timestamped)
+    
+    def verify_stream(self, stream: BinaryIO, signature_data: Dict, ca_public_key: SM2Point,
+                      max_age_seconds: int = 3600, chunk_size: int = DEFAULT_CHUNK_SIZE) -> bool:
+        """验证数据流的签名，根据签名类型自动处理时间戳"""
+        timestamped = signature_data.get("type") == "timestamped"
+        return self._verify_message_hash(self._hash_stream(stream, chunk_size), signature_data,
+                                         ca_public_key, timestamped, max_age_seconds)
+    
+    def sign_file(self, filename: str, private_key: PrivateKey, cert: SM2Certificate,
+                  timestamped: bool = False) -> Dict:
+        """对文件签名（mmap单遍哈希）"""
+        return self._sign_message_hash(self._hash_file(filename), private_key, cert, timestamped)
+    
+    def verify_file(self, filename: str, signature_data: Dict, ca_public_key: SM2Point,
+                    max_age_seconds: int = 3600) -> bool:
+        """验证文件的签名"""
+        timestamped = signature_data.get("type") == "timestamped"
+        return self._verify_message_hash(self._hash_file(filename), signature_data,
+                                         ca_public_key, timestamped, max_age_seconds)
     
     def export_certificate(self, subject: str, filename: str):
         """导出证书到文件"""
@@ -292,6 +352,18 @@ class SM2SignatureProtocol:
         cert = SM2Certificate.from_dict(cert_data)
         self.certificates[cert.subject] = cert
         return cert
+    
+    def import_certificates(self, filenames: List[str]) -> int:
+        """批量导入证书文件，返回导入数量"""
+        # 持久化存储支持按批次在单个事务中写入
+        if hasattr(self.certificates, "import_files"):
+            return self.certificates.import_files(filenames)
+        
+        count = 0
+        for filename in filenames:
+            self.import_certificate(filename)
+            count += 1
+        return count
 
 def demo_signature_protocol():
     """演示签名协议功能"""
@@ -10,8 +10,14 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.core.sm2_basic import SM2Basic
+from src.core.sm2_basic import SM2Basic, INV_CACHE_SIZE
 from src.core.sm2_optimized import SM2Optimized
+from src.core.sm2_keys import SM2SigningKey, SM2VerifyingKey, SM2VerifyingKeyCache
+from src.core import sm2_tables
+from src.protocols.sm2_signature_protocol import SM2SignatureProtocol
+from src.protocols.sm2_key_exchange import SM2KeyExchange, SM2KeyExchangeParty
+from src.protocols.sm2_cert_store import SM2CertificateStore
+from src.protocols.sm2_hybrid_encryption import SM2HybridEncryption
 
 def test_basic_functionality():
     """测试基础功能"""
@@ -124,6 +130,246 @@ def test_algorithm_consistency():
     assert result_basic == result_montgomery, "Basic vs Montgomery algorithm mismatch"
     print(f"Point multiplication algorithms consistency: OK")
 
+def test_key_objects():
+    """测试签名密钥/验证密钥对象"""
+    print("\nTesting signing/verifying key objects...")
+    
+    sm2 = SM2Basic()
+    private_key, public_key = sm2.generate_keypair()
+    message = b"Key object test"
+    
+    signing_key = SM2SigningKey(private_key, sm2)
+    assert signing_key.public_key == public_key, "Public key derivation failed"
+    assert signing_key.d_inv * (1 + private_key) % sm2.n == 1, "Cached (1+d)^-1 is wrong"
+    
+    # 与SM2Basic互相兼容
+    signature = signing_key.sign(message)
+    assert sm2.verify(message, signature, public_key), "Key sign -> Basic verify failed"
+    
+    verifying_key = SM2VerifyingKey.from_bytes(signing_key.public_key_bytes, sm2)
+    assert verifying_key.verify(message, sm2.sign(message, private_key)), "Basic sign -> Key verify failed"
+    assert not verifying_key.verify(b"Wrong message", signature), "Wrong signature detection failed"
+    
+    # 预计算表的验证结果应一致
+    verifying_key.precompute()
+    assert verifying_key.verify(message, signature), "Precomputed verify failed"
+    assert not verifying_key.verify(b"Wrong message", signature), "Precomputed wrong signature detection failed"
+    
+    assert verifying_key.to_bytes() == signing_key.public_key_bytes, "Public key encoding mismatch"
+    
+    # 验证密钥缓存有界，淘汰最久未使用的公钥
+    cache = SM2VerifyingKeyCache(sm2, cache_size=2)
+    public_keys = [sm2.generate_keypair()[1] for _ in range(3)]
+    first = cache.get(public_keys[0])
+    cache.get(public_keys[1])
+    assert cache.get(public_keys[0]) is first, "Cached verifying key should be reused"
+    cache.get(public_keys[2])
+    assert len(cache) == 2, "Verifying key cache should be bounded"
+    assert cache.get(public_keys[0]) is first, "Recently used key should stay cached"
+    
+    # 协议不隐式缓存签名密钥，调用方传入的 SM2SigningKey 直接使用
+    protocol = SM2SignatureProtocol(sm2)
+    ca_private_key, ca_public_key = protocol.generate_ca_keypair("TestCA")
+    cert = protocol.create_certificate("Alice", public_key, "TestCA")
+    for key in (signing_key, private_key):
+        signature_data = protocol.create_signature_with_cert(message, key, cert)
+        assert protocol.verify_signature_with_cert(message, signature_data, ca_public_key), \
+            "Protocol signature with key object failed"
+    assert not hasattr(protocol, "_signing_keys"), "Signing keys should not be cached implicitly"
+    
+    # 密钥交换参与方只持有公开数据的验证密钥对象
+    key_exchange = SM2KeyExchange(sm2)
+    alice, bob = SM2KeyExchangeParty("Alice", sm2), SM2KeyExchangeParty("Bob", sm2)
+    alice.generate_keypair()
+    bob.generate_keypair()
+    initiator_key, responder_key = key_exchange.complete_key_exchange(alice, bob)
+    assert initiator_key == responder_key, "Key exchange failed"
+    assert isinstance(alice.verifying_key, SM2VerifyingKey), "Party should hold a verifying key"
+    assert not hasattr(alice, "signing_key"), "Key exchange should not build signing keys"
+    print(f"Signing/verifying key objects: OK")
+
+def test_shared_tables():
+    """测试共享预计算表与缓存文件"""
+    print("\nTesting shared precomputed tables...")
+    
+    import tempfile
+    
+    sm2_a = SM2Optimized()
+    sm2_b = SM2Optimized()
+    sm2_a.point_multiply(12345, sm2_a.G)
+    sm2_b.point_multiply(54321, sm2_b.G)
+    assert sm2_a._precomputed_multiples[sm2_a.G] is sm2_b._precomputed_multiples[sm2_b.G], \
+        "Base table should be shared between instances"
+    assert sm2_tables.get_shared_sm2() is sm2_tables.get_shared_sm2(), "Shared instance mismatch"
+    
+    # 缓存文件读写
+    fingerprint = sm2_tables.curve_fingerprint(sm2_a, sm2_a._window_size)
+    table = sm2_tables.build_base_table(sm2_a, sm2_a._window_size)
+    for multiple, point in table.items():
+        assert point == sm2_a.point_multiply_basic(multiple, sm2_a.G), "Base table entry mismatch"
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "sm2_table.bin")
+        sm2_tables.save_table_cache(path, fingerprint, sm2_a._window_size, table)
+        assert sm2_tables.load_table_cache(path, fingerprint) == table, "Cache roundtrip failed"
+        
+        # 指纹不匹配（例如曲线参数变化）时不使用缓存
+        other = sm2_tables.curve_fingerprint(sm2_a, sm2_a._window_size + 1)
+        assert sm2_tables.load_table_cache(path, other) is None, "Stale cache should be rejected"
+    
+    # 共享实例的模逆元缓存有界，按 (a, m) 区分模p和模n，基点G的倍点链留在缓存中
+    shared = sm2_tables.get_shared_sm2()
+    for a in range(2, INV_CACHE_SIZE + 50):
+        shared._mod_inverse(a, shared.n)
+    assert len(shared._inv_cache) == INV_CACHE_SIZE, "Inverse cache should be bounded"
+    assert shared._mod_inverse(12345, shared.n) * 12345 % shared.n == 1, "Inverse mod n failed"
+    assert shared._mod_inverse(12345, shared.p) * 12345 % shared.p == 1, "Inverse mod p failed"
+    for _ in range(3):
+        shared.generate_keypair()
+    assert (2 * shared.G.y % shared.p, shared.p) in shared._inv_cache, "G doubling chain should be cached"
+    assert len(shared._inv_cache) == INV_CACHE_SIZE, "Inverse cache should stay bounded"
+    print(f"Shared precomputed tables: OK")
+
+def test_streaming_signature():
+    """测试流式/文件签名与内存签名的兼容性"""
+    print("\nTesting streaming signatures...")
+    
+    import io
+    import tempfile
+    
+    protocol = SM2SignatureProtocol()
+    ca_private_key, ca_public_key = protocol.generate_ca_keypair("TestCA")
+    private_key, public_key = protocol.sm2.generate_keypair()
+    cert = protocol.create_certificate("Alice", public_key, "TestCA")
+    
+    document = os.urandom(100000)
+    
+    # 流式签名可以被内存版本验证，反之亦然
+    stream_signature = protocol.sign_stream(io.BytesIO(document), private_key, cert, chunk_size=4096)
+    assert protocol.verify_signature_with_cert(document, stream_signature, ca_public_key), \
+        "Stream sign -> bytes verify failed"
+    bytes_signature = protocol.create_timestamped_signature(document, private_key, cert)
+    assert protocol.verify_stream(io.BytesIO(document), bytes_signature, ca_public_key, chunk_size=4096), \
+        "Timestamped bytes sign -> stream verify failed"
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "document.bin")
+        with open(path, 'wb') as f:
+            f.write(document)
+        
+        file_signature = protocol.sign_file(path, private_key, cert, timestamped=True)
+        assert protocol.verify_timestamped_signature(document, file_signature, ca_public_key), \
+            "File sign -> bytes verify failed"
+        assert protocol.verify_file(path, file_signature, ca_public_key), "File verify failed"
+        
+        with open(path, 'ab') as f:
+            f.write(b"tampered")
+        assert not protocol.verify_file(path, file_signature, ca_public_key), "Tampered file detection failed"
+    print(f"Streaming signatures: OK")
+
+def test_certificate_store():
+    """测试证书持久化存储"""
+    print("\nTesting certificate store...")
+    
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "certs.db")
+        store = SM2CertificateStore(db_path, cache_size=2)
+        protocol = SM2SignatureProtocol(cert_store=store)
+        ca_private_key, ca_public_key = protocol.generate_ca_keypair("TestCA")
+        
+        private_key, public_key = protocol.sm2.generate_keypair()
+        alice_cert = protocol.create_certificate("Alice", public_key, "TestCA")
+        assert "Alice" in store and "Bob" not in store, "Subject lookup failed"
+        
+        # 导出后批量导入
+        filenames = []
+        for i in range(5):
+            cert = protocol.create_certificate(f"User{i}", public_key, "TestCA")
+            filename = os.path.join(tmp_dir, f"user{i}.json")
+            protocol.export_certificate(cert.subject, filename)
+            filenames.append(filename)
+        store.close()
+        
+        # 重新打开后按需加载
+        store = SM2CertificateStore(db_path, cache_size=2)
+        assert len(store) == 6, "Persisted certificate count mismatch"
+        loaded = store.get_by_serial(alice_cert.serial_number)
+        assert loaded.to_dict() == alice_cert.to_dict(), "Loaded certificate mismatch"
+        assert protocol.verify_certificate(store["Alice"], ca_public_key), "Loaded certificate invalid"
+        
+        other_store = SM2CertificateStore(os.path.join(tmp_dir, "other.db"))
+        other_protocol = SM2SignatureProtocol(cert_store=other_store)
+        assert other_protocol.import_certificates(filenames) == 5, "Bulk import failed"
+        assert other_store["User3"].subject == "User3", "Bulk imported certificate missing"
+        
+        for i in range(5):
+            store.get(f"User{i}")
+        assert len(store._cache) <= 2, "LRU cache should be bounded"
+        
+        store.close()
+        other_store.close()
+    print(f"Certificate store: OK")
+
+def test_hybrid_encryption():
+    """测试SM2混合加密"""
+    print("\nTesting hybrid encryption...")
+    
+    hybrid = SM2HybridEncryption(chunk_size=1024)
+    private_key, public_key = hybrid.sm2.generate_keypair()
+    
+    for length in [0, 1, 1024, 3000]:
+        message = os.urandom(length)
+        ciphertext = hybrid.encrypt(message, public_key)
+        assert hybrid.decrypt(ciphertext, private_key) == message, "Hybrid encryption/decryption failed"
+        
+        # 随机访问
+        reader = hybrid.open_reader(ciphertext, private_key)
+        assert reader.size == length, "Reader size mismatch"
+        assert reader.read(100, 1500) == message[100:1600], "Random access read failed"
+    
+    # 篡改和截断检测
+    tampered = bytearray(ciphertext)
+    tampered[-100] ^= 1
+    truncated = ciphertext[:-(len(ciphertext) - 74 - 1024 - 32)]
+    for bad in (bytes(tampered), truncated):
+        try:
+            hybrid.decrypt(bad, private_key)
+            assert False, "Modified hybrid ciphertext was accepted"
+        except ValueError:
+            pass
+    print(f"Hybrid encryption: OK")
+
+def test_batch_decryption():
+    """测试同一私钥的批量解密"""
+    print("\nTesting batch decryption...")
+    
+    sm2 = SM2Optimized()
+    private_key, public_key = sm2.generate_keypair()
+    
+    messages = [os.urandom(i * 37 + 1) for i in range(6)]
+    ciphertexts = [sm2.encrypt(message, public_key) for message in messages]
+    
+    # 篡改C3、C1，以及长度非法的密文
+    tampered = bytearray(ciphertexts[2])
+    tampered[-1] ^= 1
+    ciphertexts[2] = bytes(tampered)
+    tampered = bytearray(ciphertexts[4])
+    tampered[10] ^= 1
+    ciphertexts[4] = bytes(tampered)
+    ciphertexts.append(b"\x04" * 10)
+    
+    results = sm2.decrypt_batch(ciphertexts, private_key)
+    assert len(results) == len(ciphertexts), "Result count mismatch"
+    for i, result in enumerate(results):
+        if i in (2, 4, 6):
+            assert not result["success"], f"Invalid ciphertext {i} was accepted"
+        else:
+            assert result["success"] and result["plaintext"] == messages[i], f"Batch decryption {i} failed"
+            assert sm2.decrypt(ciphertexts[i], private_key) == result["plaintext"], "Batch/single mismatch"
+    print(f"Batch decryption: OK")
+
 def performance_quick_test():
     """快速性能测试"""
     print("\nQuick performance test...")
@@ -184,6 +430,12 @@ def main():
         test_optimized_functionality()
         test_cross_compatibility()
         test_algorithm_consistency()
+        test_key_objects()
+        test_shared_tables()
+        test_streaming_signature()
+        test_certificate_store()
+        test_hybrid_encryption()
+        test_batch_decryption()
         performance_quick_test()
         
         print("\n" + "=" * 40)
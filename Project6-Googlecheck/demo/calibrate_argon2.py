@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Argon2参数校准工具
+
+在当前主机上测量候选参数配置的哈希耗时和峰值内存，
+推荐满足延迟目标的最强配置
+"""
+
+import sys
+import os
+import json
+import argparse
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.crypto.argon2_profiles import ARGON2_PROFILES, Argon2Profile, calibrate
+
+
+def parse_candidate(value: str) -> Argon2Profile:
+    """
+    解析候选配置：预定义配置名称，或 内存MB:迭代次数[:并行度]
+    
+    Args:
+        value: 命令行参数
+    
+    Returns:
+        参数配置
+    """
+    if value in ARGON2_PROFILES:
+        return ARGON2_PROFILES[value]
+    
+    try:
+        parts = [int(part) for part in value.split(":")]
+        memory_mb, time_cost = parts[0], parts[1]
+        parallelism = parts[2] if len(parts) > 2 else 1
+        return Argon2Profile(f"custom-{value}", memory_mb * 1024, time_cost, parallelism)
+    except (ValueError, IndexError):
+        raise argparse.ArgumentTypeError(
+            f"无效的候选配置: {value}（使用预定义名称或 内存MB:迭代次数[:并行度]）"
+        )
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='Argon2参数校准工具')
+    parser.add_argument('candidates', nargs='*', type=parse_candidate,
+                        help='候选配置（默认为所有预定义配置）')
+    parser.add_argument('--slo-ms', type=float, default=500.0, help='P95哈希耗时上限（毫秒）')
+    parser.add_argument('--memory-limit-mb', type=float, help='峰值常驻内存上限（MB）')
+    parser.add_argument('--samples', type=int, default=5, help='每组参数的哈希次数')
+    parser.add_argument('--output', help='JSON报告输出文件（默认输出到标准输出）')
+    
+    args = parser.parse_args()
+    candidates = args.candidates or list(ARGON2_PROFILES.values())
+    
+    for profile in candidates:
+        print(f"测量 {profile.name} ({profile.tag})...", file=sys.stderr)
+    report = calibrate(candidates, args.slo_ms, args.memory_limit_mb, args.samples)
+    
+    for result in report["results"]:
+        status = "满足" if result["meets_slo"] else "超出"
+        print(f"  {result['profile']['name']}: 中位数 {result['median_ms']:.1f}ms, "
+              f"P95 {result['p95_ms']:.1f}ms, 峰值内存 {result['peak_rss_mb']:.1f}MB ({status})",
+              file=sys.stderr)
+    
+    if report["recommended"]:
+        print(f"推荐配置: {report['recommended']['name']}", file=sys.stderr)
+    else:
+        print("没有满足目标的候选配置", file=sys.stderr)
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -139,6 +139,11 @@ def show_statistics(checker: PasswordChecker):
     print(f"泄露率: {stats['breach_rate']*100:.1f}%")
     print(f"总查询时间: {stats['total_query_time']:.2f}秒")
     print(f"平均查询时间: {stats['average_query_time']:.2f}秒")
+    
+    for stage, latency in stats["latency"].items():
+        if latency["count"]:
+            print(f"{stage} 耗时: P50 {latency['p50']*1000:.1f}ms, "
+                  f"P95 {latency['p95']*1000:.1f}ms, P99 {latency['p99']*1000:.1f}ms")
 
 
 def test_server_connection(checker: PasswordChecker):
@@ -53,6 +53,9 @@ def main():
     parser.add_argument('--host', default='localhost', help='服务器主机地址')
     parser.add_argument('--port', type=int, default=8080, help='服务器端口')
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
+    parser.add_argument('--workers', type=int, help='生产模式的工作进程数（不指定时使用开发服务器）')
+    parser.add_argument('--argon2-profile', help='Argon2参数配置（default/interactive/low-memory/sensitive），'
+                                                 '更换已有数据库的配置需要先清空数据库')
     parser.add_argument('--setup-demo', action='store_true', help='设置演示数据')
     parser.add_argument('--clear-db', action='store_true', help='清空数据库')
     
@@ -63,7 +66,11 @@ def main():
     print("=" * 60)
     
     # 创建服务器实例
-    server = CheckupServer(database_path="demo_breach_db")
+    try:
+        server = CheckupServer(database_path="demo_breach_db", argon2_profile=args.argon2_profile)
+    except ValueError as e:
+        print(f"创建服务器失败: {e}")
+        return
     
     # 处理命令行选项
     if args.clear_db:
@@ -81,12 +88,15 @@ def main():
     print(f"  总凭证数: {stats['shard_statistics']['total_credentials']}")
     print(f"  非空分片数: {stats['shard_statistics']['non_empty_shards']}")
     print(f"  平均分片大小: {stats['shard_statistics']['average_shard_size']:.2f}")
+    print(f"  分片前缀位数: {stats['shard_statistics']['prefix_bits']}")
+    print(f"  Argon2配置: {server.database.argon2_profile.tag}")
     
     # 显示API端点信息
     print("\n可用的API端点:")
     print(f"  健康检查: GET http://{args.host}:{args.port}/health")
     print(f"  服务器信息: GET http://{args.host}:{args.port}/info")
     print(f"  密码查询: POST http://{args.host}:{args.port}/query")
+    print(f"  批量查询: POST http://{args.host}:{args.port}/query_batch")
     print(f"  统计信息: GET http://{args.host}:{args.port}/statistics")
     print(f"  管理端点: POST http://{args.host}:{args.port}/admin/...")
     
@@ -102,7 +112,7 @@ def main():
     
     try:
         # 启动服务器
-        server.run(host=args.host, port=args.port, debug=args.debug)
+        server.run(host=args.host, port=args.port, debug=args.debug, workers=args.workers)
     except KeyboardInterrupt:
         print("\n正在停止服务器...")
         server.save_database()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+泄露数据文件导入工具
+
+流式导入纯文本、用户名:密码、CSV格式以及gzip/bz2/xz压缩的泄露数据文件，
+导入中断后重新运行同一命令会从最后一个检查点继续
+"""
+
+import sys
+import os
+import argparse
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.database.breach_db import BreachDatabase
+from src.database.breach_import import BREACH_FORMATS, DEFAULT_CHUNK_SIZE
+
+
+def parse_column(value: str):
+    """
+    列参数：数字为列号，其他为表头名称
+    """
+    return int(value) if value.isdigit() else value
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='泄露数据文件导入工具')
+    parser.add_argument('files', nargs='+', help='泄露数据文件（支持gzip/bz2/xz压缩）')
+    parser.add_argument('--database', default='demo_breach_db', help='数据库路径')
+    parser.add_argument('--name', default='', help='泄露事件名称（默认为文件名）')
+    parser.add_argument('--format', default='auto', choices=('auto',) + BREACH_FORMATS,
+                        help='文件格式')
+    parser.add_argument('--separator', default=':', help='用户名:密码格式的分隔符或CSV字段分隔符')
+    parser.add_argument('--username-column', type=parse_column, default=0,
+                        help='CSV用户名列（列号或表头名称）')
+    parser.add_argument('--password-column', type=parse_column, default=1,
+                        help='CSV密码列（列号或表头名称）')
+    parser.add_argument('--header', action='store_true', help='CSV第一行为表头')
+    parser.add_argument('--username-prefix', default='user', help='纯密码列表生成用户名的前缀')
+    parser.add_argument('--encoding', default='utf-8', help='文本编码')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='每个检查点之间的记录数')
+    parser.add_argument('--workers', type=int, help='哈希进程数上限')
+    parser.add_argument('--restart', action='store_true', help='忽略已有检查点重新导入')
+    
+    args = parser.parse_args()
+    
+    database = BreachDatabase(args.database)
+    
+    for path in args.files:
+        try:
+            stats = database.import_breach_file(
+                path, args.name, file_format=args.format, separator=args.separator,
+                username_column=args.username_column, password_column=args.password_column,
+                header=True if args.header else None, username_prefix=args.username_prefix,
+                encoding=args.encoding, chunk_size=args.chunk_size, resume=not args.restart,
+                max_workers=args.workers
+            )
+        except (OSError, ValueError) as e:
+            print(f"导入 {path} 失败: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            print("\n导入已中断，重新运行同一命令将从最后一个检查点继续")
+            sys.exit(130)
+        
+        print(f"{path}: 处理 {stats['processed']} 条，新增 {stats['added']} 条")
+
+
+if __name__ == "__main__":
+    main()
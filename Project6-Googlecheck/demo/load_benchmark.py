@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+查询负载基准测试工具
+
+在本机启动服务器（或连接本机已运行的服务器），发送离线生成的查询，
+以JSON格式报告吞吐量、延迟分位数和错误率
+"""
+
+import sys
+import os
+import json
+import contextlib
+import shutil
+import tempfile
+import argparse
+import requests
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.client.load_benchmark import (
+    ARRIVAL_PROCESSES, LoadGenerator, local_server, prepare_queries, seed_synthetic_database
+)
+from src.crypto.elliptic_curve import EllipticCurveBlinder
+
+
+def run(args, server_url: str) -> dict:
+    """
+    生成查询并对服务器施加负载
+    
+    Args:
+        args: 命令行参数
+        server_url: 服务器地址
+    
+    Returns:
+        测试报告
+    """
+    info = requests.get(f"{server_url}/info", timeout=10).json()["server_info"]
+    
+    print(f"生成 {args.queries} 个查询...", file=sys.stderr)
+    prepared_requests = prepare_queries(args.queries, info["shard_prefix_bits"], args.batch_size,
+                                        args.digest_length)
+    
+    generator = LoadGenerator(server_url, prepared_requests, args.concurrency,
+                              binary_responses=not args.json_responses)
+    try:
+        generator.warm_up(args.warmup)
+        
+        if args.rate:
+            print(f"开环压测: {args.rate} 请求/秒, {args.duration} 秒...", file=sys.stderr)
+            report = generator.run_open_loop(args.rate, args.duration, args.arrival, args.max_requests)
+        else:
+            print(f"闭环压测: 并发 {args.concurrency}, {args.duration} 秒...", file=sys.stderr)
+            report = generator.run_closed_loop(args.duration, args.max_requests)
+    finally:
+        generator.close()
+    
+    report["batch_size"] = args.batch_size
+    report["server"] = {
+        "workers": info["workers"],
+        "shard_prefix_bits": info["shard_prefix_bits"],
+        # 服务器端各处理阶段的延迟分位数（秒），连接已运行的服务器时包括测试之前的请求
+        "latency": requests.get(f"{server_url}/statistics", timeout=10).json()["latency"]
+    }
+    return report
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='查询负载基准测试工具')
+    parser.add_argument('--database', help='数据库路径（默认生成临时的随机数据库）')
+    parser.add_argument('--synthetic', type=int, default=20000,
+                        help='临时数据库的随机条目数')
+    parser.add_argument('--port', type=int, help='连接本机已运行的服务器端口（默认在本机启动服务器）')
+    parser.add_argument('--workers', type=int, default=1, help='启动的服务器工作进程数')
+    parser.add_argument('--queries', type=int, default=1000, help='预先生成的查询数（循环使用）')
+    parser.add_argument('--batch-size', type=int, default=1, help='每个请求的查询数（大于1时批量查询）')
+    parser.add_argument('--digest-length', type=int, help='截断摘要长度（字节）')
+    parser.add_argument('--json-responses', action='store_true', help='请求JSON格式的响应')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时在途的请求数')
+    parser.add_argument('--rate', type=float, help='开环模式的到达率（请求/秒），不指定时为闭环模式')
+    parser.add_argument('--arrival', default='poisson', choices=ARRIVAL_PROCESSES, help='开环模式的到达过程')
+    parser.add_argument('--duration', type=float, default=10.0, help='测试持续时间（秒）')
+    parser.add_argument('--max-requests', type=int, help='请求数上限')
+    parser.add_argument('--warmup', type=int, default=50, help='预热请求数（不计入统计）')
+    parser.add_argument('--output', help='JSON报告输出文件（默认输出到标准输出）')
+    
+    args = parser.parse_args()
+    
+    try:
+        if args.port:
+            report = run(args, f"http://127.0.0.1:{args.port}")
+        else:
+            temp_dir = None
+            database_path = args.database
+            server_private_key = None
+            if database_path is None:
+                temp_dir = tempfile.mkdtemp()
+                database_path = os.path.join(temp_dir, "breach_db")
+                server_private_key = EllipticCurveBlinder().get_private_key_bytes()
+                print(f"生成 {args.synthetic} 条随机数据库条目...", file=sys.stderr)
+                # 标准输出只输出JSON报告
+                with contextlib.redirect_stdout(sys.stderr):
+                    seed_synthetic_database(database_path, args.synthetic, server_private_key)
+            
+            try:
+                print(f"启动本地服务器（{args.workers} 个工作进程）...", file=sys.stderr)
+                with local_server(database_path, server_private_key, args.workers) as server_url:
+                    report = run(args, server_url)
+            finally:
+                if temp_dir:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+    except (ValueError, RuntimeError, requests.RequestException) as e:
+        print(f"基准测试失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    latency = report["latency_ms"]
+    if latency:
+        print(f"吞吐量: {report['queries_per_second']:.1f} 查询/秒, 错误率: {report['error_rate']*100:.2f}%, "
+              f"P50 {latency['p50']:.2f}ms, P99 {latency['p99']:.2f}ms", file=sys.stderr)
+    
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
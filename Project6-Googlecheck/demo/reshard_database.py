@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+泄露数据库重新分片工具
+
+按条目总数（或指定的位数）重写分片文件，
+多进程生产模式的服务器在完成后发送SIGHUP重新加载
+"""
+
+import sys
+import os
+import argparse
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.database.breach_db import BreachDatabase
+from src.utils.constants import TARGET_SHARD_SIZE
+from src.utils.sharding import choose_prefix_bits, get_shard_count
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='泄露数据库重新分片工具')
+    parser.add_argument('database', nargs='?', default='demo_breach_db', help='数据库路径')
+    parser.add_argument('--prefix-bits', type=int, help='新的分片前缀位数（默认按条目总数选择）')
+    parser.add_argument('--target-shard-size', type=int, default=TARGET_SHARD_SIZE,
+                        help='目标平均分片条目数')
+    parser.add_argument('--dry-run', action='store_true', help='只显示当前和建议的分片布局')
+    
+    args = parser.parse_args()
+    
+    database = BreachDatabase(args.database)
+    total_credentials = database.shard_manager.get_shard_statistics()["total_credentials"]
+    prefix_bits = args.prefix_bits or choose_prefix_bits(total_credentials, args.target_shard_size)
+    
+    print(f"条目总数: {total_credentials}")
+    print(f"当前分片前缀位数: {database.shard_prefix_bits} "
+          f"(平均分片大小 {total_credentials / get_shard_count(database.shard_prefix_bits):.1f})")
+    print(f"目标分片前缀位数: {prefix_bits} "
+          f"(平均分片大小 {total_credentials / get_shard_count(prefix_bits):.1f})")
+    
+    if args.dry_run:
+        return
+    if prefix_bits == database.shard_prefix_bits:
+        print("分片布局无需调整")
+        return
+    
+    try:
+        database.reshard(prefix_bits)
+    except (ValueError, RuntimeError) as e:
+        print(f"重新分片失败: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 # 客户端包
 from .password_checker import PasswordChecker
+from .async_checker import AsyncPasswordChecker
+from .hash_cache import CredentialHashCache
 
-__all__ = ['PasswordChecker'] 
\ No newline at end of file
+__all__ = ['PasswordChecker', 'AsyncPasswordChecker', 'CredentialHashCache']
\ No newline at end of file
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from .hash_cache import CredentialHashCache
+from ..crypto.argon2_profiles import Argon2Profile
+from .password_checker import PasswordChecker, STALE_PARAMETERS_RETRIES
+from ..database.ingest_pipeline import get_worker_count
+from ..utils.canonicalize import validate_credentials
+from ..utils.constants import DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT, QUERY_TIMEOUT
+
+
+# 默认同时在途的查询数
+DEFAULT_CONCURRENCY = 16
+
+
+class AsyncPasswordChecker(PasswordChecker):
+    """
+    基于asyncio的并发密码检查器
+    
+    Argon2哈希在有界线程池中执行（argon2-cffi计算期间释放GIL），
+    HTTP请求在另一个线程池中通过共享连接池发送，
+    事件循环在等待网络响应的同时继续为后续凭证安排哈希
+    """
+    
+    def __init__(self, server_host: str = DEFAULT_SERVER_HOST,
+                 server_port: int = DEFAULT_SERVER_PORT,
+                 binary_responses: bool = True,
+                 digest_length: Optional[int] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 hash_workers: Optional[int] = None,
+                 hash_cache: Optional[CredentialHashCache] = None,
+                 argon2_profile: Optional[Argon2Profile] = None):
+        """
+        初始化并发密码检查器
+        
+        Args:
+            server_host: 服务器主机地址
+            server_port: 服务器端口
+            binary_responses: 是否优先请求二进制格式的查询响应
+            digest_length: 请求截断摘要模式时的摘要长度（字节）
+            concurrency: 同时在途的查询数（包括正在哈希和等待响应的查询）
+            hash_workers: Argon2哈希线程数上限，实际线程数还受CPU核数和可用内存限制
+            hash_cache: 凭证哈希缓存，重复检查同一凭证时跳过Argon2计算
+            argon2_profile: Argon2参数配置，为None时在首次查询前从服务器获取
+        """
+        super().__init__(server_host, server_port, binary_responses, digest_length, hash_cache,
+                         argon2_profile)
+        
+        if concurrency <= 0:
+            raise ValueError("concurrency必须为正数")
+        
+        self.concurrency = concurrency
+        self.hash_workers = get_worker_count(hash_workers,
+                                             self.psi_protocol.argon2_profile.memory_cost)
+        
+        # 连接池大小与并发数一致，所有请求线程共享keep-alive连接
+        adapter = HTTPAdapter(pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        self._hash_executor = ThreadPoolExecutor(
+            max_workers=self.hash_workers, thread_name_prefix="argon2"
+        )
+        self._request_executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="query"
+        )
+    
+    async def check_credentials_async(self, username: str, password: str,
+                                      timeout: int = QUERY_TIMEOUT) -> bool:
+        """
+        异步检查单个凭证
+        
+        Args:
+            username: 用户名
+            password: 密码
+            timeout: 查询超时时间（秒）
+        
+        Returns:
+            是否在泄露数据库中找到匹配
+        """
+        if not validate_credentials(username, password):
+            return False
+        
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        
+        try:
+            if not self._server_parameters_synced:
+                await loop.run_in_executor(self._request_executor, self.sync_server_parameters)
+            
+            # Argon2哈希在有界线程池中执行
+            credential_hash = await loop.run_in_executor(
+                self._hash_executor, self._hash_credential, username, password
+            )
+            
+            for attempt in range(STALE_PARAMETERS_RETRIES + 1):
+                if attempt:
+                    # 分片前缀位数过时而被拒绝，重新同步服务器参数后重试
+                    await loop.run_in_executor(self._request_executor, self.sync_server_parameters)
+                
+                # 盲化只需一次椭圆曲线运算，直接在事件循环中完成
+                blinded_hash, shard_prefix, client_key = self.psi_protocol.client_blind_credential_hash(
+                    credential_hash
+                )
+                
+                response_data = await loop.run_in_executor(
+                    self._request_executor, self._send_query_request,
+                    blinded_hash, shard_prefix, timeout
+                )
+                if response_data is not None or self._server_parameters_synced:
+                    break
+            
+            if response_data is None:
+                return False
+            
+            is_breached = self.psi_protocol.client_process_response(
+                response_data["double_blinded_hash"],
+                response_data["blinded_shard_data"],
+                client_key,
+                response_data["digest_length"]
+            )
+        
+        except Exception as e:
+            print(f"查询凭证时发生错误: {e}")
+            return False
+        
+        # 更新统计信息（只在事件循环线程中修改）
+        self.query_count += 1
+        if is_breached:
+            self.breach_found_count += 1
+        elapsed_time = time.perf_counter() - start_time
+        self.total_query_time += elapsed_time
+        self.latency.observe("request", elapsed_time)
+        
+        return is_breached
+    
+    async def iter_check_credentials(self, credentials: Iterable[Tuple[str, str]],
+                                     timeout: int = QUERY_TIMEOUT
+                                     ) -> AsyncIterator[Tuple[str, str, bool]]:
+        """
+        并发检查凭证，按完成顺序逐个产出结果
+        
+        同时在途的查询不超过concurrency个，凭证按需从迭代器读取，
+        因此可以直接传入生成器处理大量凭证
+        
+        Args:
+            credentials: 凭证迭代器 [(username, password), ...]
+            timeout: 每个查询的超时时间（秒）
+        
+        Yields:
+            (username, password, 是否在泄露数据库中)
+        """
+        async def check(username: str, password: str) -> Tuple[str, str, bool]:
+            return username, password, await self.check_credentials_async(username, password, timeout)
+        
+        pending = set()
+        try:
+            for username, password in credentials:
+                pending.add(asyncio.ensure_future(check(username, password)))
+                
+                if len(pending) >= self.concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # 调用方提前停止迭代时取消剩余查询
+            for task in pending:
+                task.cancel()
+    
+    def close(self):
+        """
+        关闭线程池和HTTP会话
+        """
+        self._hash_executor.shutdown(wait=True)
+        self._request_executor.shutdown(wait=True)
+        super().close()
+    
+    async def __aenter__(self) -> "AsyncPasswordChecker":
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,188 @@
+import hashlib
+import hmac
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+
+# 缓存文件格式:
+#   MAGIC(8) || nonce(12) || AES-256-GCM(记录拼接)
+# 每条记录: 索引键(32) || 哈希长度(1) || 凭证哈希
+# 索引键 = HMAC-SHA256(索引密钥, 参数标识 || 0 || 标准化用户名 || 0 || 密码)，
+# 文件中不出现任何明文凭证；Argon2参数变化后参数标识不同，旧条目不会再命中，按LRU逐渐淘汰
+CACHE_MAGIC = b"GPCHASH1"
+NONCE_SIZE = 12
+INDEX_KEY_SIZE = 32
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class CredentialHashCache:
+    """
+    客户端凭证哈希缓存
+    
+    缓存标准化凭证到Argon2哈希的映射（分片前缀由哈希前缀得到），避免重复检查同一凭证时
+    重新计算Argon2；容量有限，按LRU淘汰，持久化文件使用AES-GCM加密
+    """
+    
+    def __init__(self, key: bytes, path: Optional[str] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        初始化凭证哈希缓存
+        
+        Args:
+            key: 32字节缓存主密钥（例如由密码管理器的保险库密钥派生）
+            path: 持久化文件路径，为None时只缓存在内存中
+            max_entries: 最多缓存的条目数
+        """
+        if len(key) != 32:
+            raise ValueError("缓存密钥必须为32字节")
+        if max_entries <= 0:
+            raise ValueError("max_entries必须为正数")
+        
+        # 从主密钥派生独立的加密密钥和索引密钥
+        self._aead = AESGCM(hmac.new(key, b"hash-cache-encryption", hashlib.sha256).digest())
+        self._index_key = hmac.new(key, b"hash-cache-index", hashlib.sha256).digest()
+        
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        
+        if path is not None and os.path.exists(path):
+            self.load()
+    
+    def _index(self, parameters_tag: str, canonical_username: str, password: str) -> bytes:
+        message = b"\x00".join(
+            value.encode('utf-8') for value in (parameters_tag, canonical_username, password)
+        )
+        return hmac.new(self._index_key, message, hashlib.sha256).digest()
+    
+    def get(self, parameters_tag: str, canonical_username: str, password: str) -> Optional[bytes]:
+        """
+        查找缓存的凭证哈希
+        
+        Args:
+            parameters_tag: Argon2参数标识
+            canonical_username: 标准化的用户名
+            password: 密码
+        
+        Returns:
+            凭证哈希，未命中时返回None
+        """
+        index = self._index(parameters_tag, canonical_username, password)
+        with self._lock:
+            credential_hash = self._entries.get(index)
+            if credential_hash is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(index)
+            self.hits += 1
+            return credential_hash
+    
+    def put(self, parameters_tag: str, canonical_username: str, password: str,
+            credential_hash: bytes):
+        """
+        缓存凭证哈希，超出容量时淘汰最久未使用的条目
+        
+        Args:
+            parameters_tag: Argon2参数标识
+            canonical_username: 标准化的用户名
+            password: 密码
+            credential_hash: 凭证哈希
+        """
+        index = self._index(parameters_tag, canonical_username, password)
+        with self._lock:
+            self._entries[index] = credential_hash
+            self._entries.move_to_end(index)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+    
+    def save(self):
+        """
+        加密保存缓存到磁盘（先写临时文件再原子替换）
+        """
+        if self.path is None:
+            return
+        
+        with self._lock:
+            if not self._dirty and os.path.exists(self.path):
+                return
+            
+            # 按LRU顺序保存，加载后保持相同的淘汰顺序
+            plaintext = b''.join(
+                index + struct.pack("B", len(credential_hash)) + credential_hash
+                for index, credential_hash in self._entries.items()
+            )
+            self._dirty = False
+        
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext = self._aead.encrypt(nonce, plaintext, CACHE_MAGIC)
+        
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(CACHE_MAGIC + nonce + ciphertext)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    def load(self):
+        """
+        从磁盘加载并解密缓存
+        
+        文件损坏或密钥不匹配时丢弃文件内容，使用空缓存
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            
+            if not data.startswith(CACHE_MAGIC):
+                raise ValueError("无效的缓存文件格式")
+            
+            nonce = data[len(CACHE_MAGIC):len(CACHE_MAGIC) + NONCE_SIZE]
+            plaintext = self._aead.decrypt(nonce, data[len(CACHE_MAGIC) + NONCE_SIZE:], CACHE_MAGIC)
+            
+            entries = OrderedDict()
+            offset = 0
+            while offset < len(plaintext):
+                index = plaintext[offset:offset + INDEX_KEY_SIZE]
+                hash_length = plaintext[offset + INDEX_KEY_SIZE]
+                start = offset + INDEX_KEY_SIZE + 1
+                entries[index] = plaintext[start:start + hash_length]
+                offset = start + hash_length
+            
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            
+            with self._lock:
+                self._entries = entries
+                self._dirty = False
+        
+        except (OSError, ValueError, IndexError, InvalidTag) as e:
+            print(f"警告: 加载凭证哈希缓存失败，使用空缓存: {e}")
+            with self._lock:
+                self._entries = OrderedDict()
+                self._dirty = True
@@ -0,0 +1,409 @@
+import contextlib
+import ipaddress
+import itertools
+import json
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from ..crypto.psi_protocol import PSIProtocol
+from ..utils.constants import ARGON2_HASH_LENGTH, MAX_QUERY_BATCH_SIZE, QUERY_TIMEOUT
+from ..utils.wire_format import BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE
+
+
+# 报告的延迟分位数
+BENCHMARK_PERCENTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+# 等待本地服务器启动的最长时间（秒），包括加载数据库和必要时的重新盲化
+SERVER_START_TIMEOUT = 120
+
+# 开环模式的到达过程: poisson为指数分布的到达间隔，uniform为固定间隔
+ARRIVAL_PROCESSES = ("poisson", "uniform")
+
+
+def check_loopback(url: str):
+    """
+    检查目标地址是本机回环地址，基准测试不向其他主机发送负载
+    
+    Args:
+        url: 服务器地址
+    
+    Raises:
+        ValueError: 不是回环地址
+    """
+    host = urlparse(url).hostname or ""
+    try:
+        address = ipaddress.ip_address(socket.gethostbyname(host))
+    except (socket.gaierror, ValueError):
+        raise ValueError(f"无法解析服务器地址: {url}")
+    if not address.is_loopback:
+        raise ValueError(f"基准测试只能连接本机服务器: {url}")
+
+
+def seed_synthetic_database(database_path: str, count: int, server_private_key: bytes) -> int:
+    """
+    向数据库写入随机凭证哈希，用于基准测试
+    
+    条目直接由随机哈希映射和盲化得到，不计算Argon2；服务器处理查询的开销只与分片大小有关，
+    与条目是否来自真实凭证无关
+    
+    Args:
+        database_path: 数据库路径
+        count: 条目数量
+        server_private_key: 服务器私钥（启动服务器时使用同一个私钥，避免重新盲化）
+    
+    Returns:
+        新增的条目数量
+    """
+    from ..database.breach_db import BreachDatabase
+    
+    database = BreachDatabase(database_path, server_private_key)
+    psi_protocol = database.psi_protocol
+    
+    credential_hashes = [os.urandom(ARGON2_HASH_LENGTH) for _ in range(count)]
+    mapped_points = [psi_protocol.map_database_entry(credential_hash)
+                     for credential_hash in credential_hashes]
+    blinded_hashes = psi_protocol.blind_mapped_entries(mapped_points)
+    
+    added = database.shard_manager.add_credentials(zip(credential_hashes, blinded_hashes, mapped_points))
+    database.save_database()
+    return added
+
+
+def prepare_queries(count: int, shard_prefix_bits: int, batch_size: int = 1,
+                    digest_length: Optional[int] = None) -> List[Tuple[str, bytes, int]]:
+    """
+    离线生成查询请求
+    
+    凭证哈希随机生成（不计算Argon2），盲化和JSON序列化也在这里完成，
+    测量期间只发送预先生成的请求体
+    
+    Args:
+        count: 查询数量
+        shard_prefix_bits: 服务器的分片前缀位数
+        batch_size: 每个请求包含的查询数，大于1时使用 /query_batch
+        digest_length: 请求截断摘要模式时的摘要长度（字节）
+    
+    Returns:
+        请求列表 [(端点路径, 请求体, 查询数), ...]
+    """
+    if count <= 0:
+        raise ValueError("查询数量必须为正数")
+    if not 1 <= batch_size <= MAX_QUERY_BATCH_SIZE:
+        raise ValueError(f"batch_size必须在1到{MAX_QUERY_BATCH_SIZE}之间")
+    
+    psi_protocol = PSIProtocol()
+    psi_protocol.set_shard_prefix_bits(shard_prefix_bits)
+    
+    queries = []
+    for _ in range(count):
+        blinded_hash, shard_prefix, _ = psi_protocol.client_blind_credential_hash(
+            os.urandom(ARGON2_HASH_LENGTH)
+        )
+        queries.append({"blinded_hash": blinded_hash.hex(), "shard_prefix": shard_prefix.hex()})
+    
+    options = {"prefix_bits": shard_prefix_bits}
+    if digest_length is not None:
+        options["digest_length"] = digest_length
+    
+    prepared = []
+    for start in range(0, count, batch_size):
+        batch = queries[start:start + batch_size]
+        if batch_size == 1:
+            prepared.append(("/query", json.dumps({**batch[0], **options}).encode(), 1))
+        else:
+            prepared.append(("/query_batch", json.dumps({"queries": batch, **options}).encode(),
+                             len(batch)))
+    return prepared
+
+
+def latency_percentiles(latencies: List[float]) -> Dict[str, float]:
+    """
+    计算延迟分位数（毫秒）
+    
+    Args:
+        latencies: 各请求的延迟（秒）
+    
+    Returns:
+        {"mean": ..., "p50": ..., "p90": ..., "p95": ..., "p99": ..., "p99.9": ..., "max": ...}
+    """
+    if not latencies:
+        return {}
+    
+    latencies = sorted(latencies)
+    result = {"mean": sum(latencies) / len(latencies) * 1000}
+    for percentile in BENCHMARK_PERCENTILES:
+        index = min(len(latencies) - 1, int(len(latencies) * percentile))
+        result[f"p{percentile * 100:g}"] = latencies[index] * 1000
+    result["max"] = latencies[-1] * 1000
+    return result
+
+
+class LoadGenerator:
+    """
+    查询负载生成器
+    
+    闭环模式下concurrency个线程各自连续发送请求，收到响应后立即发送下一个；
+    开环模式下请求按到达率定时发出，与响应快慢无关，同时在途的请求不超过concurrency个，
+    超出的请求排队等待。开环模式的延迟从计划发送时刻算起，服务器变慢时排队时间也计入延迟
+    """
+    
+    def __init__(self, server_url: str, prepared_requests: List[Tuple[str, bytes, int]],
+                 concurrency: int = 8, timeout: float = QUERY_TIMEOUT,
+                 binary_responses: bool = True):
+        """
+        初始化负载生成器
+        
+        Args:
+            server_url: 服务器地址（必须是本机地址）
+            prepared_requests: prepare_queries 生成的请求，循环使用
+            concurrency: 同时在途的请求数
+            timeout: 每个请求的超时时间（秒）
+            binary_responses: 是否请求二进制格式的响应
+        """
+        check_loopback(server_url)
+        if not prepared_requests:
+            raise ValueError("没有可发送的请求")
+        if concurrency <= 0:
+            raise ValueError("concurrency必须为正数")
+        
+        self.server_url = server_url.rstrip("/")
+        self.prepared_requests = prepared_requests
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.headers = {
+            "Content-Type": JSON_CONTENT_TYPE,
+            "Accept": BINARY_CONTENT_TYPE if binary_responses else JSON_CONTENT_TYPE
+        }
+        
+        # 每个线程使用自己的keep-alive连接
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._lock = threading.Lock()
+        self._reset_results()
+    
+    def _reset_results(self):
+        self._latencies: List[float] = []
+        self._service_latencies: List[float] = []
+        self._errors: Dict[str, int] = {}
+        self._requests = 0
+        self._queries = 0
+    
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_maxsize=1))
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+    
+    def _send(self, index: int, scheduled_time: float):
+        """
+        发送一个预先生成的请求并记录结果
+        
+        Args:
+            index: 请求序号
+            scheduled_time: 计划发送时刻（perf_counter）
+        """
+        path, body, query_count = self.prepared_requests[index % len(self.prepared_requests)]
+        
+        send_time = time.perf_counter()
+        try:
+            response = self._session().post(self.server_url + path, data=body,
+                                            headers=self.headers, timeout=self.timeout)
+            error = None if response.status_code == 200 else f"http_{response.status_code}"
+        except requests.RequestException as e:
+            error = type(e).__name__
+        end_time = time.perf_counter()
+        
+        with self._lock:
+            self._requests += 1
+            if error is None:
+                self._queries += query_count
+                self._latencies.append(end_time - scheduled_time)
+                self._service_latencies.append(end_time - send_time)
+            else:
+                self._errors[error] = self._errors.get(error, 0) + 1
+    
+    def warm_up(self, count: int):
+        """
+        依次发送若干请求（建立连接、预热分片页缓存），结果不计入统计
+        
+        Args:
+            count: 请求数
+        """
+        for index in range(count):
+            self._send(index, time.perf_counter())
+        self._reset_results()
+    
+    def run_closed_loop(self, duration: float, max_requests: Optional[int] = None) -> Dict:
+        """
+        闭环压测
+        
+        Args:
+            duration: 持续时间（秒）
+            max_requests: 请求数上限，达到后提前结束
+        
+        Returns:
+            测试报告
+        """
+        self._reset_results()
+        next_index = iter(range(max_requests)) if max_requests is not None else itertools.count()
+        index_lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        
+        def worker():
+            while time.perf_counter() < deadline:
+                with index_lock:
+                    index = next(next_index, None)
+                if index is None:
+                    return
+                self._send(index, time.perf_counter())
+        
+        start_time = time.perf_counter()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        return self._report("closed", time.perf_counter() - start_time)
+    
+    def run_open_loop(self, rate: float, duration: float, arrival: str = "poisson",
+                      max_requests: Optional[int] = None) -> Dict:
+        """
+        开环压测
+        
+        Args:
+            rate: 到达率（请求/秒）
+            duration: 发送请求的持续时间（秒），之后等待在途请求完成
+            arrival: 到达过程（poisson / uniform）
+            max_requests: 请求数上限，达到后提前结束
+        
+        Returns:
+            测试报告
+        """
+        if rate <= 0:
+            raise ValueError("到达率必须为正数")
+        if arrival not in ARRIVAL_PROCESSES:
+            raise ValueError(f"未知的到达过程: {arrival}（可选: {', '.join(ARRIVAL_PROCESSES)}）")
+        
+        self._reset_results()
+        start_time = time.perf_counter()
+        deadline = start_time + duration
+        scheduled_time = start_time
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix="load") as executor:
+            index = 0
+            while max_requests is None or index < max_requests:
+                scheduled_time += random.expovariate(rate) if arrival == "poisson" else 1 / rate
+                if scheduled_time >= deadline:
+                    break
+                
+                delay = scheduled_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._send, index, scheduled_time)
+                index += 1
+        
+        report = self._report("open", time.perf_counter() - start_time)
+        report["offered_rate"] = rate
+        report["arrival"] = arrival
+        report["service_latency_ms"] = latency_percentiles(self._service_latencies)
+        return report
+    
+    def _report(self, mode: str, elapsed: float) -> Dict:
+        """
+        汇总测试结果
+        """
+        errors = sum(self._errors.values())
+        return {
+            "mode": mode,
+            "concurrency": self.concurrency,
+            "elapsed_seconds": elapsed,
+            "requests": self._requests,
+            "successful_requests": self._requests - errors,
+            "queries": self._queries,
+            "errors": dict(self._errors),
+            "error_rate": errors / self._requests if self._requests else 0.0,
+            "requests_per_second": (self._requests - errors) / elapsed if elapsed > 0 else 0.0,
+            "queries_per_second": self._queries / elapsed if elapsed > 0 else 0.0,
+            "latency_ms": latency_percentiles(self._latencies)
+        }
+    
+    def close(self):
+        """
+        关闭所有HTTP会话
+        """
+        for session in self._sessions:
+            session.close()
+        self._sessions = []
+
+
+def _serve(database_path: str, server_private_key: Optional[bytes], port: int, workers: int):
+    """
+    在子进程中以多进程生产模式运行服务器（不输出访问日志）
+    """
+    from ..server.checkup_server import CheckupServer
+    
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        server = CheckupServer(database_path, server_private_key)
+        server.run("127.0.0.1", port, workers=workers)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_server(database_path: str, server_private_key: Optional[bytes] = None, workers: int = 1):
+    """
+    在本机启动服务器进程，退出时停止
+    
+    服务器在独立进程中以多进程生产模式运行，不与负载生成器争用GIL
+    
+    Args:
+        database_path: 数据库路径
+        server_private_key: 服务器私钥，为None时服务器启动时重新盲化
+        workers: 工作进程数
+    
+    Yields:
+        服务器地址
+    """
+    port = _free_port()
+    server_url = f"http://127.0.0.1:{port}"
+    process = get_context("spawn").Process(
+        target=_serve, args=(database_path, server_private_key, port, workers), daemon=True
+    )
+    process.start()
+    
+    try:
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while True:
+            if not process.is_alive():
+                raise RuntimeError(f"本地服务器启动失败（退出码 {process.exitcode}）")
+            if time.time() > deadline:
+                raise RuntimeError("等待本地服务器启动超时")
+            try:
+                if requests.get(f"{server_url}/health", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        
+        yield server_url
+    finally:
+        process.terminate()
+        process.join()
@@ -1,9 +1,27 @@
+import threading
 import time
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from ..crypto.argon2_profiles import Argon2Profile
 from ..crypto.psi_protocol import PSIProtocol
+from .hash_cache import CredentialHashCache
 from ..utils.canonicalize import canonicalize_username, validate_credentials
-from ..utils.constants import DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT, QUERY_TIMEOUT
+from ..utils.constants import (
+    DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT, QUERY_TIMEOUT, QUERY_BATCH_SIZE, MAX_DIGEST_LENGTH
+)
+from ..utils.latency_histogram import LatencyHistogram
+from ..utils.wire_format import (
+    BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE, KEY_EPOCH_HEADER, SHARD_PREFIX_BITS_HEADER,
+    decode_batch_response, decode_query_response
+)
+
+
+# 客户端记录延迟直方图的阶段: Argon2凭证哈希、HTTP请求往返，
+# 以及一次检查（批量检查时为一个批次）的总耗时
+CLIENT_STAGES = ("argon2", "network", "request")
+
+# 查询因分片前缀位数过时（服务器重新分片）被拒绝时，重新同步服务器参数后的重试次数
+STALE_PARAMETERS_RETRIES = 1
 
 
 class PasswordChecker:
@@ -13,26 +31,54 @@ class PasswordChecker:
     """
     
     def __init__(self, server_host: str = DEFAULT_SERVER_HOST, 
-                 server_port: int = DEFAULT_SERVER_PORT):
+                 server_port: int = DEFAULT_SERVER_PORT,
+                 binary_responses: bool = True,
+                 digest_length: Optional[int] = None,
+                 hash_cache: Optional[CredentialHashCache] = None,
+                 argon2_profile: Optional[Argon2Profile] = None):
         """
         初始化密码检查器
         
         Args:
             server_host: 服务器主机地址
             server_port: 服务器端口
+            binary_responses: 是否优先请求二进制格式的查询响应（服务器不支持时自动使用JSON）
+            digest_length: 请求截断摘要模式时的摘要长度（字节），为None时接收完整盲化点，
+                误报率约为 分片条目数 / 2^(8 * digest_length)
+            hash_cache: 凭证哈希缓存，重复检查同一凭证时跳过Argon2计算
+            argon2_profile: Argon2参数配置，为None时在首次查询前从服务器/info获取
+                （分片前缀位数总是从服务器获取）
         """
         self.server_host = server_host
         self.server_port = server_port
         self.server_url = f"http://{server_host}:{server_port}"
-        self.psi_protocol = PSIProtocol()
+        self.psi_protocol = PSIProtocol(hash_cache=hash_cache, argon2_profile=argon2_profile)
+        self.hash_cache = hash_cache
+        self.binary_responses = binary_responses
+        self.digest_length = digest_length
+        
+        # 复用HTTP连接（keep-alive），避免每次查询重新建立TCP连接
+        self.session = requests.Session()
+        
+        if digest_length is not None:
+            self.psi_protocol.validate_digest_length(digest_length)
+        
+        # 首次查询前从服务器获取参数，显式指定的Argon2配置不会被覆盖
+        self._explicit_argon2_profile = argon2_profile is not None
+        self._server_parameters_synced = False
+        self._server_parameters_lock = threading.Lock()
+        
+        # 最近一次响应中的服务器密钥版本
+        self.key_epoch: Optional[int] = None
         
         # 统计信息
         self.query_count = 0
         self.breach_found_count = 0
         self.total_query_time = 0.0
+        self.latency = LatencyHistogram(CLIENT_STAGES)
     
     def check_credentials(self, username: str, password: str, 
-                         timeout: int = QUERY_TIMEOUT) -> bool:
+                         timeout: int = QUERY_TIMEOUT, verbose: bool = True) -> bool:
         """
         检查凭证是否在泄露数据库中
         
@@ -40,40 +86,58 @@ class PasswordChecker:
             username: 用户名
             password: 密码
             timeout: 查询超时时间（秒）
+            verbose: 是否输出查询步骤和错误信息
             
         Returns:
             是否在泄露数据库中找到匹配
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             # 验证凭证格式
             if not validate_credentials(username, password):
-                print("凭证格式无效")
+                if verbose:
+                    print("凭证格式无效")
                 return False
             
-            print(f"正在检查凭证: {canonicalize_username(username)}")
+            if verbose:
+                print(f"正在检查凭证: {canonicalize_username(username)}")
+            self.sync_server_parameters()
             
             # 客户端准备查询
-            print("步骤1: 准备查询请求...")
-            blinded_hash, shard_prefix, client_key = self.psi_protocol.client_prepare_query(
-                username, password
-            )
+            if verbose:
+                print("步骤1: 准备查询请求...")
+            credential_hash = self._hash_credential(username, password)
             
-            # 发送查询请求到服务器
-            print("步骤2: 发送查询到服务器...")
-            response_data = self._send_query_request(blinded_hash, shard_prefix, timeout)
+            for attempt in range(STALE_PARAMETERS_RETRIES + 1):
+                # 重试时按重新同步的分片前缀位数重新盲化（凭证哈希不变）
+                self.sync_server_parameters()
+                blinded_hash, shard_prefix, client_key = self.psi_protocol.client_blind_credential_hash(
+                    credential_hash
+                )
+                
+                # 发送查询请求到服务器
+                if verbose:
+                    print("步骤2: 发送查询到服务器...")
+                response_data = self._send_query_request(blinded_hash, shard_prefix, timeout, verbose)
+                
+                # 查询失败且服务器参数已过时（分片前缀位数变化）时重试
+                if response_data is not None or self._server_parameters_synced:
+                    break
             
             if response_data is None:
-                print("服务器查询失败")
+                if verbose:
+                    print("服务器查询失败")
                 return False
             
             # 客户端处理响应
-            print("步骤3: 处理服务器响应...")
+            if verbose:
+                print("步骤3: 处理服务器响应...")
             is_breached = self.psi_protocol.client_process_response(
                 response_data["double_blinded_hash"],
                 response_data["blinded_shard_data"],
-                client_key
+                client_key,
+                response_data["digest_length"]
             )
             
             # 更新统计信息
@@ -81,19 +145,63 @@ class PasswordChecker:
             if is_breached:
                 self.breach_found_count += 1
             
-            elapsed_time = time.time() - start_time
+            elapsed_time = time.perf_counter() - start_time
             self.total_query_time += elapsed_time
+            self.latency.observe("request", elapsed_time)
             
-            print(f"查询完成，耗时: {elapsed_time:.2f}秒")
+            if verbose:
+                print(f"查询完成，耗时: {elapsed_time:.2f}秒")
             
             return is_breached
             
         except Exception as e:
-            print(f"查询凭证时发生错误: {e}")
+            if verbose:
+                print(f"查询凭证时发生错误: {e}")
             return False
     
+    def _hash_credential(self, username: str, password: str) -> bytes:
+        """
+        计算凭证哈希并记录Argon2阶段的耗时（命中哈希缓存时耗时接近0）
+        
+        Args:
+            username: 用户名
+            password: 密码
+            
+        Returns:
+            凭证哈希
+        """
+        start_time = time.perf_counter()
+        credential_hash = self.psi_protocol.client_hash_credential(username, password)
+        self.latency.observe("argon2", time.perf_counter() - start_time)
+        return credential_hash
+    
+    def _post(self, path: str, request_data: Dict[str, Any], timeout: int) -> requests.Response:
+        """
+        发送查询请求并记录网络阶段的耗时（包括服务器处理时间）
+        
+        Args:
+            path: 端点路径
+            request_data: 请求数据
+            timeout: 超时时间
+            
+        Returns:
+            服务器响应
+        """
+        start_time = time.perf_counter()
+        response = self.session.post(
+            f"{self.server_url}{path}",
+            json=request_data,
+            timeout=timeout,
+            headers={
+                "Content-Type": JSON_CONTENT_TYPE,
+                "Accept": self._accept_header()
+            }
+        )
+        self.latency.observe("network", time.perf_counter() - start_time)
+        return response
+    
     def _send_query_request(self, blinded_hash: bytes, shard_prefix: bytes, 
-                           timeout: int) -> Optional[Dict[str, Any]]:
+                           timeout: int, verbose: bool = True) -> Optional[Dict[str, Any]]:
         """
         发送查询请求到服务器
         
@@ -101,6 +209,7 @@ class PasswordChecker:
             blinded_hash: 盲化哈希
             shard_prefix: 分片前缀
             timeout: 超时时间
+            verbose: 是否输出错误信息
             
         Returns:
             服务器响应数据
@@ -109,41 +218,123 @@ class PasswordChecker:
             # 准备请求数据
             request_data = {
                 "blinded_hash": blinded_hash.hex(),
-                "shard_prefix": shard_prefix.hex()
+                "shard_prefix": shard_prefix.hex(),
+                "prefix_bits": self.psi_protocol.shard_prefix_bits
             }
+            if self.digest_length is not None:
+                request_data["digest_length"] = self.digest_length
             
             # 发送POST请求
-            response = requests.post(
-                f"{self.server_url}/query",
-                json=request_data,
-                timeout=timeout,
-                headers={"Content-Type": "application/json"}
-            )
+            response = self._post("/query", request_data, timeout)
+            self._check_shard_prefix_bits(response, verbose)
             
             if response.status_code == 200:
-                data = response.json()
-                
-                # 将十六进制字符串转换回字节
-                return {
-                    "double_blinded_hash": bytes.fromhex(data["double_blinded_hash"]),
-                    "blinded_shard_data": [
-                        bytes.fromhex(item) for item in data["blinded_shard_data"]
-                    ]
-                }
+                self._check_key_epoch(response, verbose)
+                return self._parse_query_response(response)
             else:
-                print(f"服务器返回错误: {response.status_code} - {response.text}")
+                if verbose:
+                    print(f"服务器返回错误: {response.status_code} - {response.text}")
                 return None
                 
         except requests.exceptions.Timeout:
-            print("查询超时")
+            if verbose:
+                print("查询超时")
             return None
         except requests.exceptions.ConnectionError:
-            print("无法连接到服务器")
+            if verbose:
+                print("无法连接到服务器")
             return None
         except Exception as e:
-            print(f"发送查询请求时发生错误: {e}")
+            if verbose:
+                print(f"发送查询请求时发生错误: {e}")
             return None
     
+    def _check_key_epoch(self, response: requests.Response, verbose: bool = True):
+        """
+        记录响应中的服务器密钥版本，版本变化（服务器轮换了密钥）时丢弃缓存的服务器参数，
+        下次查询前重新从/info获取
+        
+        Args:
+            response: 服务器响应
+            verbose: 是否输出提示信息
+        """
+        key_epoch = response.headers.get(KEY_EPOCH_HEADER)
+        if key_epoch is None:
+            return
+        
+        key_epoch = int(key_epoch)
+        with self._server_parameters_lock:
+            if self.key_epoch is not None and key_epoch != self.key_epoch:
+                if verbose:
+                    print(f"服务器密钥已轮换（版本 {self.key_epoch} -> {key_epoch}），将重新获取服务器参数")
+                self._server_parameters_synced = False
+            self.key_epoch = key_epoch
+    
+    def _check_shard_prefix_bits(self, response: requests.Response, verbose: bool = True):
+        """
+        检查响应（包括错误响应）中服务器当前的分片前缀位数，与客户端使用的位数不同
+        （服务器已重新分片）时丢弃缓存的服务器参数，下次查询前重新从/info获取
+        
+        前缀位数少于服务器太多时查询会被拒绝（400），调用方重新同步后重试
+        
+        Args:
+            response: 服务器响应
+            verbose: 是否输出提示信息
+        """
+        prefix_bits = response.headers.get(SHARD_PREFIX_BITS_HEADER)
+        if prefix_bits is None:
+            return
+        
+        prefix_bits = int(prefix_bits)
+        with self._server_parameters_lock:
+            if prefix_bits != self.psi_protocol.shard_prefix_bits and self._server_parameters_synced:
+                if verbose:
+                    print(f"服务器已重新分片（前缀位数 {self.psi_protocol.shard_prefix_bits} -> {prefix_bits}），"
+                          f"将重新获取服务器参数")
+                self._server_parameters_synced = False
+    
+    def _accept_header(self) -> str:
+        if self.binary_responses:
+            return f"{BINARY_CONTENT_TYPE}, {JSON_CONTENT_TYPE};q=0.5"
+        return JSON_CONTENT_TYPE
+    
+    @staticmethod
+    def _parse_query_response(response: requests.Response) -> Dict[str, Any]:
+        """
+        按响应的Content-Type解析查询响应
+        
+        Args:
+            response: 服务器响应
+            
+        Returns:
+            {"double_blinded_hash": bytes, "blinded_shard_data": 条目序列,
+             "digest_length": 截断摘要长度或None}
+        """
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        
+        if content_type == BINARY_CONTENT_TYPE:
+            # 二进制格式：条目视图直接引用响应数据，不逐条拷贝
+            double_blinded_hash, blinded_shard_data = decode_query_response(response.content)
+            
+            # 条目长度不超过x坐标长度时为截断摘要
+            digest_length = blinded_shard_data.width
+            return {
+                "double_blinded_hash": double_blinded_hash,
+                "blinded_shard_data": blinded_shard_data,
+                "digest_length": digest_length if digest_length <= MAX_DIGEST_LENGTH else None
+            }
+        
+        data = response.json()
+        
+        # 将十六进制字符串转换回字节
+        return {
+            "double_blinded_hash": bytes.fromhex(data["double_blinded_hash"]),
+            "blinded_shard_data": [
+                bytes.fromhex(item) for item in data["blinded_shard_data"]
+            ],
+            "digest_length": data.get("digest_length")
+        }
+    
     def check_password_only(self, password: str, username: str = "user") -> bool:
         """
         仅检查密码（使用默认用户名）
@@ -158,13 +349,20 @@ class PasswordChecker:
         return self.check_credentials(username, password)
     
     def batch_check_credentials(self, credentials: list, 
-                              show_progress: bool = True) -> Dict[str, bool]:
+                              show_progress: bool = True,
+                              batch_size: int = QUERY_BATCH_SIZE,
+                              timeout: int = QUERY_TIMEOUT) -> Dict[str, bool]:
         """
         批量检查凭证
         
+        凭证按批通过 /query_batch 端点查询，每批只需一次请求；
+        服务器不支持批量查询时逐条查询
+        
         Args:
             credentials: 凭证列表 [(username, password), ...]
-            show_progress: 是否显示进度
+            show_progress: 是否显示进度和错误信息，为False时不向标准输出打印任何内容
+            batch_size: 每个批量请求包含的凭证数量
+            timeout: 每个请求的超时时间（秒）
             
         Returns:
             检查结果字典
@@ -172,17 +370,164 @@ class PasswordChecker:
         results = {}
         total_count = len(credentials)
         
-        print(f"开始批量检查 {total_count} 个凭证...")
+        if show_progress:
+            print(f"开始批量检查 {total_count} 个凭证...")
         
-        for i, (username, password) in enumerate(credentials):
+        for start in range(0, total_count, batch_size):
+            batch = credentials[start:start + batch_size]
+            
+            batch_results = self._check_credentials_batch(batch, timeout, show_progress)
+            if batch_results is None:
+                # 服务器不支持批量查询，回退到逐条查询
+                batch_results = [self.check_credentials(username, password, timeout, show_progress)
+                                 for username, password in batch]
+            
+            for (username, password), is_breached in zip(batch, batch_results):
+                results[f"{username}:{password}"] = is_breached
+            
             if show_progress:
-                print(f"进度: {i+1}/{total_count}")
+                print(f"进度: {min(start + batch_size, total_count)}/{total_count}")
+        
+        return results
+    
+    def _check_credentials_batch(self, batch: List[Tuple[str, str]],
+                                 timeout: int, verbose: bool = True) -> Optional[List[bool]]:
+        """
+        通过一次批量请求检查一批凭证（分片前缀位数过时被拒绝时重新同步后重试）
+        
+        Args:
+            batch: 凭证列表 [(username, password), ...]
+            timeout: 超时时间
+            verbose: 是否输出错误信息
             
-            key = f"{username}:{password}"
-            results[key] = self.check_credentials(username, password)
+        Returns:
+            与输入一一对应的检查结果，服务器不支持批量查询时返回None
+        """
+        start_time = time.perf_counter()
+        results = [False] * len(batch)
+        self.sync_server_parameters()
+        
+        # 客户端计算凭证哈希（无效凭证不发送）
+        positions = []
+        credential_hashes = []
+        for position, (username, password) in enumerate(batch):
+            if not validate_credentials(username, password):
+                continue
+            
+            positions.append(position)
+            credential_hashes.append(self._hash_credential(username, password))
+        
+        if not credential_hashes:
+            return results
+        
+        for attempt in range(STALE_PARAMETERS_RETRIES + 1):
+            # 按当前的分片前缀位数盲化，重试时按重新同步的位数重新盲化
+            self.sync_server_parameters()
+            client_keys = []
+            queries = []
+            for credential_hash in credential_hashes:
+                blinded_hash, shard_prefix, client_key = self.psi_protocol.client_blind_credential_hash(
+                    credential_hash
+                )
+                client_keys.append(client_key)
+                queries.append({
+                    "blinded_hash": blinded_hash.hex(),
+                    "shard_prefix": shard_prefix.hex()
+                })
+            
+            request_data = {"queries": queries, "prefix_bits": self.psi_protocol.shard_prefix_bits}
+            if self.digest_length is not None:
+                request_data["digest_length"] = self.digest_length
+            
+            try:
+                response = self._post("/query_batch", request_data, timeout)
+                self._check_shard_prefix_bits(response, verbose)
+                
+                if response.status_code == 404:
+                    return None
+                if response.status_code != 200:
+                    # 分片前缀位数过时而被拒绝时重新同步服务器参数后重试
+                    if attempt < STALE_PARAMETERS_RETRIES and not self._server_parameters_synced:
+                        continue
+                    if verbose:
+                        print(f"服务器返回错误: {response.status_code} - {response.text}")
+                    return results
+                
+                self._check_key_epoch(response, verbose)
+                responses = self._parse_batch_response(response)
+                break
+                
+            except requests.exceptions.Timeout:
+                if verbose:
+                    print("查询超时")
+                return results
+            except requests.exceptions.ConnectionError:
+                if verbose:
+                    print("无法连接到服务器")
+                return results
+            except Exception as e:
+                if verbose:
+                    print(f"发送批量查询请求时发生错误: {e}")
+                return results
+        
+        # 客户端处理响应
+        for position, client_key, response_data in zip(positions, client_keys, responses):
+            results[position] = self.psi_protocol.client_process_response(
+                response_data["double_blinded_hash"],
+                response_data["blinded_shard_data"],
+                client_key,
+                response_data["digest_length"]
+            )
+        
+        # 更新统计信息
+        self.query_count += len(queries)
+        self.breach_found_count += sum(results)
+        elapsed_time = time.perf_counter() - start_time
+        self.total_query_time += elapsed_time
+        self.latency.observe("request", elapsed_time)
         
         return results
     
+    @staticmethod
+    def _parse_batch_response(response: requests.Response) -> List[Dict[str, Any]]:
+        """
+        按响应的Content-Type解析批量查询响应
+        
+        Args:
+            response: 服务器响应
+            
+        Returns:
+            与查询一一对应的响应数据列表，格式同 _parse_query_response
+        """
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        
+        if content_type == BINARY_CONTENT_TYPE:
+            # 二进制格式：相同分片的查询共享同一个条目视图
+            parsed = []
+            for double_blinded_hash, blinded_shard_data in decode_batch_response(response.content):
+                digest_length = blinded_shard_data.width
+                parsed.append({
+                    "double_blinded_hash": double_blinded_hash,
+                    "blinded_shard_data": blinded_shard_data,
+                    "digest_length": digest_length if digest_length <= MAX_DIGEST_LENGTH else None
+                })
+            return parsed
+        
+        data = response.json()
+        digest_length = data.get("digest_length")
+        
+        # 每个分片只转换一次
+        shards = [[bytes.fromhex(item) for item in shard] for shard in data["shards"]]
+        
+        return [
+            {
+                "double_blinded_hash": bytes.fromhex(result["double_blinded_hash"]),
+                "blinded_shard_data": shards[result["shard"]],
+                "digest_length": digest_length
+            }
+            for result in data["results"]
+        ]
+    
     def get_statistics(self) -> Dict[str, Any]:
         """
         获取客户端统计信息
@@ -199,7 +544,9 @@ class PasswordChecker:
             "breach_rate": (self.breach_found_count / self.query_count 
                            if self.query_count > 0 else 0),
             "total_query_time": self.total_query_time,
-            "average_query_time": avg_query_time
+            "average_query_time": avg_query_time,
+            # 各阶段的次数、平均耗时和P50/P95/P99（秒）
+            "latency": self.latency.summary()
         }
     
     def reset_statistics(self):
@@ -209,6 +556,7 @@ class PasswordChecker:
         self.query_count = 0
         self.breach_found_count = 0
         self.total_query_time = 0.0
+        self.latency.reset()
     
     def test_connection(self) -> bool:
         """
@@ -218,7 +566,7 @@ class PasswordChecker:
             是否连接成功
         """
         try:
-            response = requests.get(f"{self.server_url}/health", timeout=5)
+            response = self.session.get(f"{self.server_url}/health", timeout=5)
             return response.status_code == 200
         except Exception:
             return False
@@ -231,9 +579,45 @@ class PasswordChecker:
             服务器信息字典
         """
         try:
-            response = requests.get(f"{self.server_url}/info", timeout=5)
+            response = self.session.get(f"{self.server_url}/info", timeout=5)
             if response.status_code == 200:
                 return response.json()
             return None
         except Exception:
-            return None 
\ No newline at end of file
+            return None 
+    
+    def sync_server_parameters(self) -> bool:
+        """
+        从服务器/info获取Argon2参数配置和分片前缀位数（只获取一次，服务器密钥版本变化后重新获取）
+        
+        服务器未公布的参数（旧版本服务器）使用默认值
+        
+        Returns:
+            是否已与服务器同步
+        """
+        with self._server_parameters_lock:
+            if self._server_parameters_synced:
+                return True
+            
+            info = self.get_server_info()
+            if info is None:
+                return False
+            
+            server_info = info.get("server_info", {})
+            profile_data = server_info.get("argon2_profile")
+            if profile_data and not self._explicit_argon2_profile:
+                self.psi_protocol.set_argon2_profile(Argon2Profile.from_dict(profile_data))
+            prefix_bits = server_info.get("shard_prefix_bits")
+            if prefix_bits is not None:
+                self.psi_protocol.set_shard_prefix_bits(prefix_bits)
+            self.key_epoch = server_info.get("key_epoch", self.key_epoch)
+            self._server_parameters_synced = True
+            return True
+    
+    def close(self):
+        """
+        关闭HTTP会话并保存凭证哈希缓存
+        """
+        self.session.close()
+        if self.hash_cache is not None:
+            self.hash_cache.save()
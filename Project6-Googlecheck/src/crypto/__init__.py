@@ -1,6 +1,7 @@
 # 加密功能包
 from .argon2_hash import Argon2Hasher
+from .argon2_profiles import Argon2Profile
 from .elliptic_curve import EllipticCurveBlinder
 from .psi_protocol import PSIProtocol
 
-__all__ = ['Argon2Hasher', 'EllipticCurveBlinder', 'PSIProtocol'] 
\ No newline at end of file
+__all__ = ['Argon2Hasher', 'Argon2Profile', 'EllipticCurveBlinder', 'PSIProtocol'] 
\ No newline at end of file
@@ -1,10 +1,9 @@
 import argon2
 import os
 from typing import Union
-from ..utils.constants import (
-    ARGON2_MEMORY_COST, ARGON2_TIME_COST, 
-    ARGON2_PARALLELISM, ARGON2_HASH_LENGTH
-)
+from .argon2_profiles import Argon2Profile, get_profile
+from ..utils.constants import DEFAULT_SHARD_PREFIX_BITS
+from ..utils.sharding import get_shard_index, get_shard_prefix
 
 
 class Argon2Hasher:
@@ -12,15 +11,16 @@ class Argon2Hasher:
     Argon2哈希器，用于安全哈希凭证
     """
     
-    def __init__(self):
-        """初始化Argon2哈希器"""
-        self.hasher = argon2.PasswordHasher(
-            memory_cost=ARGON2_MEMORY_COST,
-            time_cost=ARGON2_TIME_COST,
-            parallelism=ARGON2_PARALLELISM,
-            hash_len=ARGON2_HASH_LENGTH,
-            salt_len=16
-        )
+    def __init__(self, profile: Union[str, Argon2Profile, None] = None):
+        """
+        初始化Argon2哈希器
+        
+        凭证哈希只需要原始哈希值，直接使用低级API（hash_secret_raw）计算
+        
+        Args:
+            profile: 参数配置名称或配置对象，默认使用"default"配置
+        """
+        self.profile = get_profile(profile)
     
     def hash_credential(self, username: str, password: str, salt: bytes = None) -> bytes:
         """
@@ -46,10 +46,10 @@ class Argon2Hasher:
             hash_result = argon2.low_level.hash_secret_raw(
                 secret=credential.encode('utf-8'),
                 salt=salt,
-                time_cost=ARGON2_TIME_COST,
-                memory_cost=ARGON2_MEMORY_COST,
-                parallelism=ARGON2_PARALLELISM,
-                hash_len=ARGON2_HASH_LENGTH,
+                time_cost=self.profile.time_cost,
+                memory_cost=self.profile.memory_cost,
+                parallelism=self.profile.parallelism,
+                hash_len=self.profile.hash_length,
                 type=argon2.Type.ID
             )
             return hash_result
@@ -74,28 +74,39 @@ class Argon2Hasher:
         
         return self.hash_credential(username, password, salt)
     
-    def get_shard_prefix(self, credential_hash: bytes) -> bytes:
+    def get_parameters_tag(self) -> str:
+        """
+        获取哈希参数标识，参数变化时标识随之变化（用于使缓存的哈希失效）
+        
+        Returns:
+            参数标识字符串
+        """
+        return self.profile.tag
+    
+    def get_shard_prefix(self, credential_hash: bytes,
+                         prefix_bits: int = DEFAULT_SHARD_PREFIX_BITS) -> bytes:
         """
         获取用于分片的前缀
         
         Args:
             credential_hash: 凭证哈希
+            prefix_bits: 分片前缀位数
             
         Returns:
-            前缀字节（2字节）
+            前缀字节（只保留前prefix_bits位，默认16位即2字节）
         """
-        from ..utils.constants import SHARD_PREFIX_LENGTH
-        return credential_hash[:SHARD_PREFIX_LENGTH]
+        return get_shard_prefix(credential_hash, prefix_bits)
     
-    def get_shard_index(self, credential_hash: bytes) -> int:
+    def get_shard_index(self, credential_hash: bytes,
+                        prefix_bits: int = DEFAULT_SHARD_PREFIX_BITS) -> int:
         """
         获取分片索引
         
         Args:
             credential_hash: 凭证哈希
+            prefix_bits: 分片前缀位数
             
         Returns:
-            分片索引（0-65535）
+            分片索引（0 到 2^prefix_bits - 1）
         """
-        prefix = self.get_shard_prefix(credential_hash)
-        return int.from_bytes(prefix, byteorder='big') 
\ No newline at end of file
+        return get_shard_index(credential_hash, prefix_bits)
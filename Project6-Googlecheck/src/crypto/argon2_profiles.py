@@ -0,0 +1,189 @@
+import os
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Union
+import argon2
+from ..utils.constants import (
+    ARGON2_MEMORY_COST, ARGON2_TIME_COST, ARGON2_PARALLELISM, ARGON2_HASH_LENGTH,
+    DEFAULT_ARGON2_PROFILE
+)
+
+
+class Argon2Profile:
+    """
+    Argon2哈希参数配置
+    
+    哈希长度由分片文件的记录格式固定，配置只包含内存、迭代次数和并行度
+    """
+    
+    def __init__(self, name: str, memory_cost: int, time_cost: int, parallelism: int):
+        """
+        初始化参数配置
+        
+        Args:
+            name: 配置名称
+            memory_cost: 内存开销（KB）
+            time_cost: 迭代次数
+            parallelism: 并行度
+        """
+        if memory_cost < 8 * parallelism or time_cost < 1 or parallelism < 1:
+            raise ValueError(f"无效的Argon2参数: m={memory_cost}, t={time_cost}, p={parallelism}")
+        
+        self.name = name
+        self.memory_cost = memory_cost
+        self.time_cost = time_cost
+        self.parallelism = parallelism
+        self.hash_length = ARGON2_HASH_LENGTH
+    
+    @property
+    def tag(self) -> str:
+        """
+        参数标识，只由参数决定，与名称无关
+        """
+        return (f"argon2id:m={self.memory_cost}:t={self.time_cost}:"
+                f"p={self.parallelism}:len={self.hash_length}")
+    
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "memory_cost": self.memory_cost,
+            "time_cost": self.time_cost,
+            "parallelism": self.parallelism,
+            "hash_length": self.hash_length
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Argon2Profile":
+        if data.get("hash_length", ARGON2_HASH_LENGTH) != ARGON2_HASH_LENGTH:
+            raise ValueError(f"不支持的哈希长度: {data['hash_length']}")
+        return cls(data["name"], data["memory_cost"], data["time_cost"], data["parallelism"])
+    
+    def same_parameters(self, other: "Argon2Profile") -> bool:
+        return self.tag == other.tag
+    
+    def __repr__(self) -> str:
+        return f"Argon2Profile({self.name!r}, {self.tag!r})"
+
+
+# 预定义的参数配置，"default" 与早期版本的固定参数一致
+ARGON2_PROFILES = {
+    "default": Argon2Profile("default", ARGON2_MEMORY_COST, ARGON2_TIME_COST, ARGON2_PARALLELISM),
+    "interactive": Argon2Profile("interactive", 64 * 1024, 3, 1),
+    "low-memory": Argon2Profile("low-memory", 19 * 1024, 2, 1),
+    "sensitive": Argon2Profile("sensitive", 1024 * 1024, 4, 1),
+}
+
+
+def get_profile(profile: Union[str, Argon2Profile, None] = None) -> Argon2Profile:
+    """
+    按名称获取参数配置
+    
+    Args:
+        profile: 配置名称或配置对象，为None时返回默认配置
+    
+    Returns:
+        参数配置
+    """
+    if isinstance(profile, Argon2Profile):
+        return profile
+    name = profile or DEFAULT_ARGON2_PROFILE
+    if name not in ARGON2_PROFILES:
+        raise ValueError(f"未知的Argon2配置: {name}（可选: {', '.join(ARGON2_PROFILES)}）")
+    return ARGON2_PROFILES[name]
+
+
+def _measure_in_process(profile_data: Dict, samples: int) -> Dict:
+    """
+    在独立进程中测量一组参数的哈希耗时和峰值常驻内存
+    """
+    profile = Argon2Profile.from_dict(profile_data)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    latencies = []
+    for _ in range(samples):
+        start_time = time.perf_counter()
+        argon2.low_level.hash_secret_raw(
+            secret=os.urandom(32),
+            salt=os.urandom(16),
+            time_cost=profile.time_cost,
+            memory_cost=profile.memory_cost,
+            parallelism=profile.parallelism,
+            hash_len=profile.hash_length,
+            type=argon2.Type.ID
+        )
+        latencies.append(time.perf_counter() - start_time)
+    
+    # Linux下ru_maxrss的单位为KB
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies.sort()
+    return {
+        "profile": profile.to_dict(),
+        "samples": samples,
+        "median_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "peak_rss_mb": peak_rss / 1024,
+        "hash_rss_mb": (peak_rss - baseline_rss) / 1024
+    }
+
+
+def measure_profile(profile: Argon2Profile, samples: int = 5) -> Dict:
+    """
+    测量一组参数在当前主机上的哈希耗时和峰值常驻内存
+    
+    每组参数在新启动的进程中测量，峰值内存不受之前测量的影响
+    
+    Args:
+        profile: 参数配置
+        samples: 哈希次数
+    
+    Returns:
+        测量结果（中位数/P95耗时毫秒数、峰值常驻内存MB）
+    """
+    if samples <= 0:
+        raise ValueError("samples必须为正数")
+    
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(_measure_in_process, profile.to_dict(), samples).result()
+
+
+def calibrate(candidates: List[Argon2Profile], latency_slo_ms: float,
+              memory_limit_mb: Optional[float] = None, samples: int = 5) -> Dict:
+    """
+    测量候选参数并选出满足延迟目标的最强配置
+    
+    满足 P95耗时 <= latency_slo_ms（以及峰值内存限制）的候选中，
+    选择 内存开销 x 迭代次数 最大的一组
+    
+    Args:
+        candidates: 候选参数配置
+        latency_slo_ms: P95哈希耗时上限（毫秒）
+        memory_limit_mb: 峰值常驻内存上限（MB），为None时不限制
+        samples: 每组参数的哈希次数
+    
+    Returns:
+        {"results": 各候选的测量结果, "recommended": 推荐的配置字典或None}
+    """
+    results = []
+    for profile in candidates:
+        result = measure_profile(profile, samples)
+        result["meets_slo"] = (
+            result["p95_ms"] <= latency_slo_ms
+            and (memory_limit_mb is None or result["peak_rss_mb"] <= memory_limit_mb)
+        )
+        results.append(result)
+    
+    passing = [result for result in results if result["meets_slo"]]
+    recommended = max(
+        passing, key=lambda result: result["profile"]["memory_cost"] * result["profile"]["time_cost"],
+        default=None
+    )
+    
+    return {
+        "latency_slo_ms": latency_slo_ms,
+        "memory_limit_mb": memory_limit_mb,
+        "results": results,
+        "recommended": recommended["profile"] if recommended else None
+    }
@@ -1,13 +1,70 @@
 import os
 import hashlib
 from typing import Tuple, Optional
-from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from cryptography.hazmat.backends import default_backend
 from ..utils.constants import CURVE_NAME, CURVE_POINT_SIZE
 
 
+# secp224r1曲线参数: y^2 = x^3 - 3x + b (mod p)，阶为素数n（余因子为1）
+CURVE_FIELD_PRIME = 2**224 - 2**96 + 1
+CURVE_B = 0xB4050A850C04B3ABF54132565044B0B7D7BFD8BA270B39432355FFB4
+CURVE_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFF16A2E0B8F03E13DD29455C5C2A3D
+
+# 哈希到曲线的域分隔标签
+HASH_TO_CURVE_DST = b"GPC-secp224r1-TAI-SHA256"
+
+# 尝试次数上限：每次尝试约有一半概率成功，256次都失败的概率可忽略
+HASH_TO_CURVE_MAX_ATTEMPTS = 256
+
+
+def hash_to_curve_x(data: bytes) -> bytes:
+    """
+    确定性地将数据映射到曲线点的x坐标（try-and-increment）
+    
+    x = SHA-256(标签 || 计数器 || data) 的前28字节，x^3 - 3x + b 为模p二次剩余时
+    x即为曲线点的横坐标；只需要哈希和一次模幂运算，不需要标量乘法
+    
+    Args:
+        data: 要映射的数据
+    
+    Returns:
+        28字节x坐标（对应的点取y为偶数的一个）
+    """
+    for counter in range(HASH_TO_CURVE_MAX_ATTEMPTS):
+        digest = hashlib.sha256(HASH_TO_CURVE_DST + bytes([counter]) + data).digest()
+        x = int.from_bytes(digest[:CURVE_POINT_SIZE], byteorder='big')
+        if x >= CURVE_FIELD_PRIME:
+            continue
+        
+        # 欧拉判别法；secp224r1的阶为素数，曲线上没有y=0的点
+        rhs = (x * x * x - 3 * x + CURVE_B) % CURVE_FIELD_PRIME
+        if pow(rhs, (CURVE_FIELD_PRIME - 1) // 2, CURVE_FIELD_PRIME) == 1:
+            return x.to_bytes(CURVE_POINT_SIZE, byteorder='big')
+    
+    raise RuntimeError("哈希到曲线映射失败")
+
+
+def hash_to_curve_bytes(data: bytes) -> bytes:
+    """
+    将数据映射到曲线点，返回未压缩坐标 x || y
+    
+    由x坐标求y（点解压缩）是映射中最耗时的一步，结果以未压缩坐标保存后，
+    再次构造该点只需检查是否在曲线上
+    
+    Args:
+        data: 要映射的数据
+    
+    Returns:
+        56字节未压缩坐标（不含0x04前缀）
+    """
+    point = ec.EllipticCurvePublicKey.from_encoded_point(
+        ec.SECP224R1(), b"\x02" + hash_to_curve_x(data)
+    )
+    return point.public_bytes(Encoding.X962, PublicFormat.UncompressedPoint)[1:]
+
+
 class EllipticCurveBlinder:
     """
     椭圆曲线盲化器，实现私有集合交集协议的核心加密功能
@@ -53,47 +110,76 @@ class EllipticCurveBlinder:
         Returns:
             椭圆曲线点
         """
-        # 使用SHA-256哈希数据
-        digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-        digest.update(data)
-        hash_bytes = digest.finalize()
-        
-        # 尝试将哈希映射到曲线点
-        # 这是一个简化的实现，实际中可能需要更复杂的映射方法
-        attempts = 0
-        while attempts < 256:  # 最多尝试256次
-            try:
-                # 使用哈希值作为x坐标，尝试计算对应的y坐标
-                x_bytes = hash_bytes[:28]  # 取前28字节作为x坐标
-                
-                # 确保x坐标在有效范围内
-                x_int = int.from_bytes(x_bytes, byteorder='big')
-                if x_int >= self.curve.key_size // 8:
-                    # 如果x坐标太大，重新哈希
-                    digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-                    digest.update(hash_bytes)
-                    hash_bytes = digest.finalize()
-                    attempts += 1
-                    continue
-                
-                # 尝试构造点
-                # 这里使用一个简化的方法：直接使用哈希值构造私钥，然后获取对应的公钥点
-                temp_private_key = ec.derive_private_key(
-                    x_int % (2**224 - 1),  # 确保在曲线阶数范围内
-                    self.curve,
-                    default_backend()
-                )
-                return temp_private_key.public_key()
-                
-            except Exception:
-                # 如果构造失败，重新哈希
-                digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-                digest.update(hash_bytes)
-                hash_bytes = digest.finalize()
-                attempts += 1
-        
-        # 如果所有尝试都失败，使用生成器点
-        return self.public_key
+        return self.point_from_x(hash_to_curve_x(data))
+    
+    def point_from_xy(self, xy_bytes: bytes) -> ec.EllipticCurvePublicKey:
+        """
+        由未压缩坐标 x || y 构造曲线点（不需要解压缩）
+        
+        Args:
+            xy_bytes: 56字节未压缩坐标
+            
+        Returns:
+            椭圆曲线点
+        """
+        return ec.EllipticCurvePublicKey.from_encoded_point(self.curve, b"\x04" + xy_bytes)
+    
+    def point_from_x(self, x_bytes: bytes) -> ec.EllipticCurvePublicKey:
+        """
+        由x坐标构造曲线点（取y为偶数的一个）
+        
+        Args:
+            x_bytes: 28字节x坐标
+            
+        Returns:
+            椭圆曲线点
+        """
+        return ec.EllipticCurvePublicKey.from_encoded_point(self.curve, b"\x02" + x_bytes)
+    
+    @staticmethod
+    def blinding_scalar(blinding_factor: bytes) -> int:
+        """
+        将盲化因子转换为 [1, n-1] 内的标量
+        """
+        scalar = int.from_bytes(blinding_factor, byteorder='big') % CURVE_ORDER
+        return scalar if scalar != 0 else 1
+    
+    def blind_point_to_bytes(self, point: ec.EllipticCurvePublicKey, blinding_factor: bytes) -> bytes:
+        """
+        对椭圆曲线点进行盲化（标量乘法），直接返回压缩格式
+        
+        ECDH只给出 k*P 的x坐标，结果统一取y为偶数的点；x(k*P) = x(k*(-P))，
+        因此只依赖x坐标的盲化结果与点的正负无关，多次盲化可以交换顺序
+        
+        Args:
+            point: 要盲化的点
+            blinding_factor: 盲化因子
+            
+        Returns:
+            盲化点的压缩格式（0x02 || x）
+        """
+        blinding_key = ec.derive_private_key(
+            self.blinding_scalar(blinding_factor),
+            self.curve,
+            default_backend()
+        )
+        
+        # ECDH共享密钥即标量乘法结果的x坐标
+        return b"\x02" + blinding_key.exchange(ec.ECDH(), point)
+    
+    def blind_with_private_key_to_bytes(self, point: ec.EllipticCurvePublicKey) -> bytes:
+        """
+        用盲化器自身的私钥盲化点，直接返回压缩格式
+        
+        复用构造时派生的私钥对象，不需要每次重新派生（服务器盲化使用）
+        
+        Args:
+            point: 要盲化的点
+            
+        Returns:
+            盲化点的压缩格式（0x02 || x）
+        """
+        return b"\x02" + self.private_key.exchange(ec.ECDH(), point)
     
     def blind_point(self, point: ec.EllipticCurvePublicKey, blinding_factor: bytes) -> ec.EllipticCurvePublicKey:
         """
@@ -106,31 +192,25 @@ class EllipticCurveBlinder:
         Returns:
             盲化后的点
         """
-        try:
-            # 将盲化因子转换为私钥
-            blinding_int = int.from_bytes(blinding_factor, byteorder='big') % (2**224 - 1)
-            if blinding_int == 0:
-                blinding_int = 1
-            
-            blinding_key = ec.derive_private_key(
-                blinding_int,
-                self.curve,
-                default_backend()
-            )
-            
-            # 使用ECDH计算共享密钥，这实际上是点乘法的结果
-            shared_key = blinding_key.exchange(ec.ECDH(), point)
+        return self.bytes_to_point(self.blind_point_to_bytes(point, blinding_factor))
+    
+    def unblind_point_to_bytes(self, blinded_point: ec.EllipticCurvePublicKey, blinding_factor: bytes) -> bytes:
+        """
+        对椭圆曲线点进行解盲化，直接返回压缩格式
+        
+        Args:
+            blinded_point: 盲化的点
+            blinding_factor: 盲化因子
             
-            # 将共享密钥映射回曲线点
-            return self.hash_to_curve(shared_key)
-        except Exception as e:
-            # 如果盲化失败，返回一个基于输入的确定性点
-            # 使用哈希而不是点序列化来避免递归错误
-            digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-            digest.update(blinding_factor)
-            digest.update(b"fallback_blinding")
-            fallback_hash = digest.finalize()
-            return self.hash_to_curve(fallback_hash)
+        Returns:
+            解盲化点的压缩格式
+        """
+        # 盲化标量在曲线阶n上的逆元
+        inverse_blinding = pow(self.blinding_scalar(blinding_factor), -1, CURVE_ORDER)
+        inverse_bytes = inverse_blinding.to_bytes(CURVE_POINT_SIZE, byteorder='big')
+        
+        # 使用逆元进行盲化（实际上是解盲化）
+        return self.blind_point_to_bytes(blinded_point, inverse_bytes)
     
     def unblind_point(self, blinded_point: ec.EllipticCurvePublicKey, blinding_factor: bytes) -> ec.EllipticCurvePublicKey:
         """
@@ -143,22 +223,7 @@ class EllipticCurveBlinder:
         Returns:
             解盲化后的点
         """
-        try:
-            # 计算盲化因子的逆元
-            blinding_int = int.from_bytes(blinding_factor, byteorder='big') % (2**224 - 1)
-            if blinding_int == 0:
-                blinding_int = 1
-            
-            curve_order = 2**224 - 1  # secp224r1的近似阶数
-            inverse_blinding = pow(blinding_int, -1, curve_order)
-            
-            inverse_bytes = inverse_blinding.to_bytes(28, byteorder='big')
-            
-            # 使用逆元进行盲化（实际上是解盲化）
-            return self.blind_point(blinded_point, inverse_bytes)
-        except Exception:
-            # 如果解盲化失败，返回原点
-            return blinded_point
+        return self.bytes_to_point(self.unblind_point_to_bytes(blinded_point, blinding_factor))
     
     def point_to_bytes(self, point: ec.EllipticCurvePublicKey) -> bytes:
         """
@@ -191,14 +256,16 @@ class EllipticCurveBlinder:
             
         Returns:
             椭圆曲线点
+        
+        Raises:
+            ValueError: 字节不是曲线上有效点的编码
         """
         try:
             return ec.EllipticCurvePublicKey.from_encoded_point(
                 self.curve, point_bytes
             )
-        except Exception:
-            # 如果解析失败，返回一个默认点
-            return self.public_key
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"无效的椭圆曲线点编码: {e}") from e
     
     def get_private_key_bytes(self) -> bytes:
         """
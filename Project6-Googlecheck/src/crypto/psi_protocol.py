@@ -1,26 +1,64 @@
-from typing import List, Tuple, Optional
-from .elliptic_curve import EllipticCurveBlinder
+import hashlib
+from typing import Iterable, List, Tuple, Optional, Union
+from .elliptic_curve import EllipticCurveBlinder, hash_to_curve_bytes
 from .argon2_hash import Argon2Hasher
+from .argon2_profiles import Argon2Profile
 from ..utils.canonicalize import canonicalize_username
+from ..utils.constants import MIN_DIGEST_LENGTH, MAX_DIGEST_LENGTH, DEFAULT_SHARD_PREFIX_BITS
+from ..utils.sharding import validate_prefix_bits
 from cryptography.hazmat.primitives.asymmetric import ec
 
 
+# 盲化方案标识，计入密钥标识：方案变化后旧的预盲化分片会被自动重新盲化
+BLINDING_SCHEME = b"secp224r1-tai-sha256-v2"
+
+
 class PSIProtocol:
     """
     私有集合交集协议实现
     遵循Google Password Checkup协议规范
     """
     
-    def __init__(self, server_private_key: Optional[bytes] = None):
+    def __init__(self, server_private_key: Optional[bytes] = None, hash_cache=None,
+                 argon2_profile: Union[str, Argon2Profile, None] = None):
         """
         初始化PSI协议
         
         Args:
             server_private_key: 服务器私钥，如果不提供则生成随机私钥
+            hash_cache: 客户端凭证哈希缓存（CredentialHashCache），为None时不缓存
+            argon2_profile: Argon2参数配置，客户端和服务器必须一致
         """
-        self.hasher = Argon2Hasher()
+        self.hasher = Argon2Hasher(argon2_profile)
         self.blinder = EllipticCurveBlinder(server_private_key)
+        self.hash_cache = hash_cache
+        
+        # 客户端分片前缀位数，按服务器公布的数据库分片布局调整
+        self.shard_prefix_bits = DEFAULT_SHARD_PREFIX_BITS
+        
+    @property
+    def argon2_profile(self) -> Argon2Profile:
+        return self.hasher.profile
+    
+    def set_argon2_profile(self, argon2_profile: Union[str, Argon2Profile]):
+        """
+        切换Argon2参数配置（客户端按服务器公布的配置调整）
         
+        Args:
+            argon2_profile: 参数配置名称或配置对象
+        """
+        self.hasher = Argon2Hasher(argon2_profile)
+    
+    def set_shard_prefix_bits(self, prefix_bits: int):
+        """
+        设置客户端分片前缀位数（客户端按服务器公布的位数调整）
+        
+        Args:
+            prefix_bits: 分片前缀位数
+        """
+        validate_prefix_bits(prefix_bits)
+        self.shard_prefix_bits = prefix_bits
+    
     def client_prepare_query(self, username: str, password: str) -> Tuple[bytes, bytes, bytes]:
         """
         客户端准备查询请求
@@ -32,16 +70,52 @@ class PSIProtocol:
         Returns:
             (盲化哈希, 分片前缀, 客户端盲化密钥)
         """
+        credential_hash = self.client_hash_credential(username, password)
+        return self.client_blind_credential_hash(credential_hash)
+    
+    def client_hash_credential(self, username: str, password: str) -> bytes:
+        """
+        客户端计算凭证哈希（查询准备中耗时的Argon2部分）
+        
+        Args:
+            username: 用户名
+            password: 密码
+            
+        Returns:
+            凭证哈希
+        """
         # 标准化用户名
         canonical_username = canonicalize_username(username)
         
+        # 命中缓存时跳过Argon2计算（缓存键包含哈希参数，参数变化后不会命中旧条目）
+        if self.hash_cache is not None:
+            parameters_tag = self.hasher.get_parameters_tag()
+            credential_hash = self.hash_cache.get(parameters_tag, canonical_username, password)
+            if credential_hash is not None:
+                return credential_hash
+        
         # 使用Argon2哈希凭证
         credential_hash = self.hasher.hash_credential_with_fixed_salt(
             canonical_username, password
         )
         
+        if self.hash_cache is not None:
+            self.hash_cache.put(parameters_tag, canonical_username, password, credential_hash)
+        
+        return credential_hash
+    
+    def client_blind_credential_hash(self, credential_hash: bytes) -> Tuple[bytes, bytes, bytes]:
+        """
+        客户端盲化凭证哈希
+        
+        Args:
+            credential_hash: 凭证哈希
+            
+        Returns:
+            (盲化哈希, 分片前缀, 客户端盲化密钥)
+        """
         # 获取分片前缀
-        shard_prefix = self.hasher.get_shard_prefix(credential_hash)
+        shard_prefix = self.hasher.get_shard_prefix(credential_hash, self.shard_prefix_bits)
         
         # 将哈希映射到椭圆曲线点
         hash_point = self.blinder.hash_to_curve(credential_hash)
@@ -49,16 +123,14 @@ class PSIProtocol:
         # 生成客户端盲化密钥
         client_blinding_key = self.blinder.generate_random_key()
         
-        # 使用客户端密钥盲化点
-        blinded_point = self.blinder.blind_point(hash_point, client_blinding_key)
-        
-        # 将盲化点转换为字节
-        blinded_hash = self.blinder.point_to_bytes(blinded_point)
+        # 使用客户端密钥盲化点（直接得到压缩格式）
+        blinded_hash = self.blinder.blind_point_to_bytes(hash_point, client_blinding_key)
         
         return blinded_hash, shard_prefix, client_blinding_key
     
     def server_process_query(self, blinded_hash: bytes, shard_prefix: bytes, 
-                           shard_data: List[bytes]) -> Tuple[bytes, List[bytes]]:
+                           shard_data: List[bytes],
+                           digest_length: Optional[int] = None) -> Tuple[bytes, List[bytes]]:
         """
         服务器处理查询请求
         
@@ -66,39 +138,120 @@ class PSIProtocol:
             blinded_hash: 客户端盲化的哈希
             shard_prefix: 分片前缀
             shard_data: 对应分片的所有数据
-            
+            digest_length: 截断摘要长度（字节），为None时返回完整的盲化点
+        
         Returns:
             (双重盲化哈希, 盲化的分片数据)
         """
+        # 使用服务器私钥进行双重盲化
+        double_blinded_hash = self.server_blind_query(blinded_hash)
+        
+        # 对分片数据进行服务器盲化
+        blinded_shard_data = [
+            self.blind_database_entry(credential_hash) for credential_hash in shard_data
+        ]
+        
+        if digest_length is not None:
+            blinded_shard_data = self.truncate_blinded_entries(blinded_shard_data, digest_length)
+        
+        return double_blinded_hash, blinded_shard_data
+    
+    def server_blind_query(self, blinded_hash: bytes) -> bytes:
+        """
+        服务器对客户端盲化的哈希进行双重盲化
+        
+        分片数据已预先盲化时，服务器处理一次查询只需要这一次椭圆曲线运算
+        
+        Args:
+            blinded_hash: 客户端盲化的哈希
+            
+        Returns:
+            双重盲化哈希
+        """
         # 将盲化哈希转换为椭圆曲线点
         client_blinded_point = self.blinder.bytes_to_point(blinded_hash)
         
         # 使用服务器私钥进行双重盲化
-        server_blinding_key = self.blinder.get_private_key_bytes()
-        double_blinded_point = self.blinder.blind_point(
-            client_blinded_point, server_blinding_key
-        )
+        return self.blinder.blind_with_private_key_to_bytes(client_blinded_point)
+    
+    def get_key_id(self) -> str:
+        """
+        获取服务器盲化密钥的标识（盲化方案和公钥的SHA-256摘要）
         
-        # 转换为字节
-        double_blinded_hash = self.blinder.point_to_bytes(double_blinded_point)
+        用于判断预先盲化的分片数据是否由当前密钥和盲化方案生成
         
-        # 对分片数据进行服务器盲化
-        blinded_shard_data = []
-        for credential_hash in shard_data:
-            # 将凭证哈希映射到椭圆曲线点
-            hash_point = self.blinder.hash_to_curve(credential_hash)
-            
-            # 使用服务器私钥盲化
-            blinded_point = self.blinder.blind_point(hash_point, server_blinding_key)
-            
-            # 转换为字节并添加到结果
-            blinded_shard_data.append(self.blinder.point_to_bytes(blinded_point))
+        Returns:
+            十六进制密钥标识
+        """
+        public_key_bytes = self.blinder.point_to_bytes(self.blinder.public_key)
+        return hashlib.sha256(BLINDING_SCHEME + public_key_bytes).hexdigest()[:32]
+    
+    @staticmethod
+    def validate_digest_length(digest_length: int):
+        """
+        检查截断摘要长度是否在允许范围内
         
-        return double_blinded_hash, blinded_shard_data
+        Args:
+            digest_length: 截断摘要长度（字节）
+        """
+        if not MIN_DIGEST_LENGTH <= digest_length <= MAX_DIGEST_LENGTH:
+            raise ValueError(
+                f"截断摘要长度必须在 {MIN_DIGEST_LENGTH} 到 {MAX_DIGEST_LENGTH} 字节之间"
+            )
+    
+    @staticmethod
+    def truncate_blinded_entry(blinded_entry: bytes, digest_length: int) -> bytes:
+        """
+        将服务器盲化点截断为短摘要
+        
+        压缩点的首字节只表示y坐标奇偶，x坐标已近似均匀分布，
+        因此直接截取x坐标的前若干字节，无需额外哈希
+        
+        Args:
+            blinded_entry: 压缩格式的盲化点
+            digest_length: 截断摘要长度（字节）
+        
+        Returns:
+            截断摘要
+        """
+        return blinded_entry[1:1 + digest_length]
+    
+    @classmethod
+    def truncate_blinded_entries(cls, blinded_entries, digest_length: int) -> List[bytes]:
+        """
+        批量截断服务器盲化点
+        
+        Args:
+            blinded_entries: 压缩格式的盲化点序列
+            digest_length: 截断摘要长度（字节）
+        
+        Returns:
+            截断摘要列表
+        """
+        cls.validate_digest_length(digest_length)
+        return [cls.truncate_blinded_entry(entry, digest_length) for entry in blinded_entries]
+    
+    @staticmethod
+    def false_positive_rate(shard_size: int, digest_length: int) -> float:
+        """
+        估算截断模式下单次查询的误报率
+        
+        分片中每个截断摘要与查询摘要偶然相同的概率为 2^(-8t)，
+        分片共n条时误报率约为 n / 2^(8t)
+        
+        Args:
+            shard_size: 分片条目数
+            digest_length: 截断摘要长度（字节）
+        
+        Returns:
+            误报率
+        """
+        return min(1.0, shard_size / 2 ** (8 * digest_length))
     
     def client_process_response(self, double_blinded_hash: bytes, 
                               blinded_shard_data: List[bytes],
-                              client_blinding_key: bytes) -> bool:
+                              client_blinding_key: bytes,
+                              digest_length: Optional[int] = None) -> bool:
         """
         客户端处理服务器响应
         
@@ -106,20 +259,22 @@ class PSIProtocol:
             double_blinded_hash: 双重盲化的查询哈希
             blinded_shard_data: 盲化的分片数据
             client_blinding_key: 客户端盲化密钥
-            
+            digest_length: 分片数据为截断摘要时的摘要长度，为None表示完整盲化点
+        
         Returns:
             是否在泄露数据库中找到匹配
         """
         # 将双重盲化哈希转换为椭圆曲线点
         double_blinded_point = self.blinder.bytes_to_point(double_blinded_hash)
         
-        # 使用客户端密钥解盲化，得到仅服务器盲化的哈希
-        server_blinded_point = self.blinder.unblind_point(
+        # 使用客户端密钥解盲化，得到仅服务器盲化的哈希（压缩格式，用于比较）
+        server_blinded_hash = self.blinder.unblind_point_to_bytes(
             double_blinded_point, client_blinding_key
         )
         
-        # 转换为字节进行比较
-        server_blinded_hash = self.blinder.point_to_bytes(server_blinded_point)
+        # 截断模式下按相同规则截断后比较
+        if digest_length is not None:
+            server_blinded_hash = self.truncate_blinded_entry(server_blinded_hash, digest_length)
         
         # 检查是否在分片数据中
         return server_blinded_hash in blinded_shard_data
@@ -144,10 +299,53 @@ class PSIProtocol:
         )
         
         # 获取分片前缀
-        shard_prefix = self.hasher.get_shard_prefix(credential_hash)
+        shard_prefix = self.hasher.get_shard_prefix(credential_hash, self.shard_prefix_bits)
         
         return credential_hash, shard_prefix
     
+    @staticmethod
+    def map_database_entry(credential_hash: bytes) -> bytes:
+        """
+        将数据库条目映射到曲线点
+        
+        映射与服务器密钥无关，结果随分片记录保存，重新盲化时不需要再次映射
+        
+        Args:
+            credential_hash: 凭证哈希
+            
+        Returns:
+            曲线点的未压缩坐标 x || y（56字节）
+        """
+        return hash_to_curve_bytes(credential_hash)
+    
+    def blind_mapped_entry(self, mapped_point: bytes) -> bytes:
+        """
+        用服务器私钥盲化已映射的数据库条目
+        
+        Args:
+            mapped_point: map_database_entry 的结果
+            
+        Returns:
+            盲化后的哈希（压缩格式）
+        """
+        return self.blinder.blind_with_private_key_to_bytes(self.blinder.point_from_xy(mapped_point))
+    
+    def blind_mapped_entries(self, mapped_points: Iterable[bytes]) -> List[bytes]:
+        """
+        批量盲化已映射的数据库条目（共用同一个服务器私钥对象）
+        
+        Args:
+            mapped_points: map_database_entry 的结果序列
+            
+        Returns:
+            与输入一一对应的盲化哈希列表
+        """
+        blinder = self.blinder
+        return [
+            blinder.blind_with_private_key_to_bytes(blinder.point_from_xy(mapped_point))
+            for mapped_point in mapped_points
+        ]
+    
     def blind_database_entry(self, credential_hash: bytes) -> bytes:
         """
         对数据库条目进行服务器盲化
@@ -158,12 +356,4 @@ class PSIProtocol:
         Returns:
             盲化后的哈希
         """
-        # 将哈希映射到椭圆曲线点
-        hash_point = self.blinder.hash_to_curve(credential_hash)
-        
-        # 使用服务器私钥盲化
-        server_blinding_key = self.blinder.get_private_key_bytes()
-        blinded_point = self.blinder.blind_point(hash_point, server_blinding_key)
-        
-        # 转换为字节
-        return self.blinder.point_to_bytes(blinded_point) 
\ No newline at end of file
+        return self.blind_mapped_entry(self.map_database_entry(credential_hash))
@@ -1,5 +1,7 @@
 # 数据库管理包
 from .breach_db import BreachDatabase
 from .shard_manager import ShardManager
+from .ingest_pipeline import IngestionPipeline
+from .breach_import import BreachFileReader
 
-__all__ = ['BreachDatabase', 'ShardManager'] 
\ No newline at end of file
+__all__ = ['BreachDatabase', 'ShardManager', 'IngestionPipeline', 'BreachFileReader'] 
\ No newline at end of file
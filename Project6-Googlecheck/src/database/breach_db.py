@@ -1,10 +1,26 @@
 import os
 import json
+import shutil
+import threading
 import time
-from typing import List, Dict, Tuple, Optional
+from typing import Iterable, List, Dict, Tuple, Optional, Union
 from .shard_manager import ShardManager
+from .ingest_pipeline import IngestionPipeline, DEFAULT_BATCH_SIZE
+from .bulk_blinding import BulkBlinder
+from .breach_import import BreachFileReader, ImportCheckpoint, DEFAULT_CHUNK_SIZE, iter_chunks
+from ..crypto.argon2_profiles import Argon2Profile, get_profile
 from ..crypto.psi_protocol import PSIProtocol
 from ..utils.canonicalize import canonicalize_username, validate_credentials
+from ..utils.constants import TARGET_SHARD_SIZE
+from ..utils.latency_histogram import timed_stage
+from ..utils.sharding import choose_prefix_bits
+
+# 服务器私钥文件（权限0600），未指定私钥时从这里加载，避免每次打开都重新盲化
+SERVER_KEY_FILE = "server_key"
+
+
+# 文件导入检查点所在的子目录
+IMPORT_CHECKPOINT_DIR = "import_checkpoints"
 
 
 class BreachDatabase:
@@ -13,80 +29,314 @@ class BreachDatabase:
     负责管理和查询泄露凭证数据库
     """
     
-    def __init__(self, storage_path: str = "breach_db", server_private_key: Optional[bytes] = None):
+    def __init__(self, storage_path: str = "breach_db", server_private_key: Optional[bytes] = None,
+                 argon2_profile: Union[str, Argon2Profile, None] = None):
         """
         初始化泄露数据库
         
         Args:
             storage_path: 数据库存储路径
-            server_private_key: 服务器私钥
+            server_private_key: 服务器私钥，为None时使用存储目录中保存的私钥（没有时随机生成）；
+                与保存的私钥不同时重新盲化所有分片，并保存为新的私钥
+            argon2_profile: Argon2参数配置，为None时使用元数据中记录的配置（旧数据库为"default"）
         """
         self.storage_path = storage_path
-        self.shard_manager = ShardManager(os.path.join(storage_path, "shards"))
-        self.psi_protocol = PSIProtocol(server_private_key)
+        
+        # 分片前缀位数随数据量自动调整，使单次查询的响应大小保持在目标范围内
+        self.shard_manager = ShardManager(os.path.join(storage_path, "shards"),
+                                          target_shard_size=TARGET_SHARD_SIZE)
         
         # 创建存储目录
         os.makedirs(storage_path, exist_ok=True)
         
         # 加载元数据
         self.metadata = self._load_metadata()
+        
+        # 导入和查询必须使用同一组Argon2参数，配置记录在元数据中
+        psi_protocol = PSIProtocol(
+            server_private_key or self._load_server_key(),
+            argon2_profile=self._resolve_argon2_profile(argon2_profile)
+        )
+        self._save_server_key(psi_protocol)
+        
+        # 查询使用的 (PSI协议实例, 密钥版本)，密钥轮换时整体替换
+        self._serving = (psi_protocol, self.shard_manager.key_epoch)
+        
+        # 导入、重新分片、清空和密钥轮换互斥；查询不需要这个锁
+        self._write_lock = threading.RLock()
+        self._rotation_thread: Optional[threading.Thread] = None
+        
+        # 检查预先盲化的分片是否由当前服务器密钥生成
+        self._check_blinded_shards()
+    
+    @property
+    def psi_protocol(self) -> PSIProtocol:
+        return self._serving[0]
     
-    def add_breach_data(self, credentials: List[Tuple[str, str]], breach_name: str = ""):
+    @property
+    def key_epoch(self) -> int:
         """
-        添加泄露数据到数据库
+        当前服务器密钥的版本，每次轮换（或更换密钥后重新盲化）加一
+        """
+        return self._serving[1]
+    
+    @property
+    def key_rotation_in_progress(self) -> bool:
+        thread = self._rotation_thread
+        return thread is not None and thread.is_alive()
+    
+    @property
+    def argon2_profile(self) -> Argon2Profile:
+        return self.psi_protocol.argon2_profile
+    
+    @property
+    def shard_prefix_bits(self) -> int:
+        return self.shard_manager.prefix_bits
+    
+    def _resolve_argon2_profile(self, requested: Union[str, Argon2Profile, None]) -> Argon2Profile:
+        """
+        确定数据库使用的Argon2参数配置并记录到元数据
+        
+        已有凭证时不能更换参数，否则已导入的哈希与新查询的哈希不一致
         
         Args:
-            credentials: 凭证列表 [(username, password), ...]
-            breach_name: 泄露事件名称
+            requested: 指定的配置，为None时沿用元数据中的配置
+            
+        Returns:
+            参数配置
+        """
+        stored = self.metadata.get("argon2_profile")
+        stored_profile = Argon2Profile.from_dict(stored) if stored else get_profile()
+        
+        profile = stored_profile if requested is None else get_profile(requested)
+        if not profile.same_parameters(stored_profile) and self.shard_manager.has_credentials():
+            raise ValueError(
+                f"数据库已使用Argon2配置 {stored_profile.name} 导入凭证，"
+                f"更换为 {profile.name} 需要清空数据库后重新导入"
+            )
+        
+        if stored != profile.to_dict():
+            self.metadata["argon2_profile"] = profile.to_dict()
+            self._save_metadata()
+        
+        return profile
+    
+    def _load_server_key(self) -> Optional[bytes]:
+        """
+        读取保存的服务器私钥
+        
+        Returns:
+            私钥，没有保存时返回None
+        """
+        key_file = os.path.join(self.storage_path, SERVER_KEY_FILE)
+        if not os.path.exists(key_file):
+            return None
+        with open(key_file, 'rb') as f:
+            return f.read()
+    
+    def _stage_server_key(self, psi_protocol: PSIProtocol) -> str:
+        """
+        把服务器私钥写入权限为0600的临时文件并刷盘，之后原子替换为私钥文件
+        
+        Args:
+            psi_protocol: 使用该私钥的PSI协议实例
+        
+        Returns:
+            临时文件路径
+        """
+        tmp_file = os.path.join(self.storage_path, SERVER_KEY_FILE + ".tmp")
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(psi_protocol.blinder.get_private_key_bytes())
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_file
+    
+    def _save_server_key(self, psi_protocol: PSIProtocol):
+        """
+        保存服务器私钥（与已保存的相同时不重写）
+        
+        Args:
+            psi_protocol: 使用该私钥的PSI协议实例
+        """
+        if self._load_server_key() == psi_protocol.blinder.get_private_key_bytes():
+            return
+        os.replace(self._stage_server_key(psi_protocol),
+                   os.path.join(self.storage_path, SERVER_KEY_FILE))
+    
+    def _check_blinded_shards(self):
+        """
+        服务器密钥变更（或旧版本数据没有密钥标识）时重新盲化所有分片
+        """
+        key_id = self.psi_protocol.get_key_id()
+        if self.shard_manager.blinding_key_id != key_id and self.shard_manager.has_credentials():
+            print("服务器密钥与盲化分片不一致，正在重新盲化分片数据...")
+            self.rebuild_blinded_shards()
+            return
+        
+        self.shard_manager.blinding_key_id = key_id
+        # 重新加载后使用清单中记录的密钥版本
+        self._serving = (self.psi_protocol, self.shard_manager.key_epoch)
+    
+    def rebuild_blinded_shards(self, max_workers: Optional[int] = None):
         """
-        print(f"正在处理泄露数据: {breach_name}")
-        print(f"凭证数量: {len(credentials)}")
+        用当前服务器密钥重新盲化整个数据库
+        
+        分片记录按批分给多个工作进程并行盲化（每个进程只派生一次私钥对象），
+        结果按分片顺序流式写入新的分片文件
         
+        Args:
+            max_workers: 盲化进程数，默认为CPU核数
+        """
+        with self._write_lock:
+            self._rebuild_blinded_shards(self.psi_protocol, max_workers)
+    
+    def _rebuild_blinded_shards(self, psi_protocol: PSIProtocol, max_workers: Optional[int]):
+        """
+        用psi_protocol的密钥重新盲化整个数据库，完成后查询切换到该密钥（调用方持有写锁）
+        """
         start_time = time.time()
-        processed_count = 0
+        record_count = self.shard_manager.get_shard_statistics()["total_credentials"]
+        
+        # 新私钥先写入临时文件，与分片文件同时切换，重启后直接使用新私钥
+        staged_key_file = self._stage_server_key(psi_protocol)
+        
+        def switch_key_epoch():
+            os.replace(staged_key_file, os.path.join(self.storage_path, SERVER_KEY_FILE))
+            self._serving = (psi_protocol, self.shard_manager.key_epoch)
+        
+        try:
+            with BulkBlinder(psi_protocol.blinder.get_private_key_bytes(), max_workers) as bulk_blinder:
+                self.shard_manager.rebuild_blinded_shards(bulk_blinder.blind_shards,
+                                                          psi_protocol.get_key_id(), switch_key_epoch)
+        finally:
+            if os.path.exists(staged_key_file):
+                os.remove(staged_key_file)
+        self.shard_manager.save_shards()
+        
+        elapsed = time.time() - start_time
+        rate = record_count / elapsed if elapsed > 0 else 0
+        print(f"分片重新盲化完成: {record_count} 条记录，{bulk_blinder.workers} 个进程，"
+              f"耗时 {elapsed:.2f} 秒 ({rate:.1f} 条/秒)，密钥版本 {self.key_epoch}")
+    
+    def rotate_server_key(self, server_private_key: Optional[bytes] = None,
+                          max_workers: Optional[int] = None, background: bool = True) -> bytes:
+        """
+        轮换服务器密钥
+        
+        新密钥的盲化分片写入新的分片文件，期间查询继续使用旧密钥和旧分片文件；
+        完成后查询原子切换到新密钥，密钥版本加一。查询响应中带有密钥版本，
+        客户端发现版本变化时丢弃缓存的服务器参数。轮换期间的导入会等待轮换完成
+        
+        新私钥在切换时保存到数据库目录的私钥文件中，之后不指定私钥打开数据库时直接使用
+        
+        Args:
+            server_private_key: 新的服务器私钥，为None时随机生成
+            max_workers: 盲化进程数，默认为CPU核数
+            background: 是否在后台线程中执行（用 wait_for_key_rotation 等待完成）
+        
+        Returns:
+            新的服务器私钥（已保存，返回值只用于备份）
+        
+        Raises:
+            RuntimeError: 已有密钥轮换正在进行
+        """
+        psi_protocol = PSIProtocol(server_private_key, argon2_profile=self.argon2_profile)
         
-        for username, password in credentials:
-            # 验证凭证格式
-            if not validate_credentials(username, password):
-                continue
+        with self._write_lock:
+            if self.key_rotation_in_progress:
+                raise RuntimeError("已有密钥轮换正在进行")
             
-            try:
-                # 创建数据库条目
-                credential_hash, shard_prefix = self.psi_protocol.create_breach_database_entry(
-                    username, password
+            if background:
+                self._rotation_thread = threading.Thread(
+                    target=self._run_key_rotation, args=(psi_protocol, max_workers),
+                    name="key-rotation", daemon=True
                 )
-                
-                # 对条目进行盲化
-                blinded_hash = self.psi_protocol.blind_database_entry(credential_hash)
-                
-                # 添加到分片
-                self.shard_manager.add_credential(credential_hash, blinded_hash)
-                
-                processed_count += 1
-                
-                # 每处理1000条记录显示进度
-                if processed_count % 1000 == 0:
-                    elapsed = time.time() - start_time
-                    print(f"已处理 {processed_count}/{len(credentials)} 条记录 ({elapsed:.2f}秒)")
-                    
-            except Exception as e:
-                print(f"处理凭证失败 {username}: {e}")
-                continue
+                self._rotation_thread.start()
+            else:
+                self._rebuild_blinded_shards(psi_protocol, max_workers)
         
-        # 更新元数据
-        self.metadata["breaches"].append({
-            "name": breach_name,
-            "credential_count": processed_count,
-            "added_time": time.time()
-        })
+        return psi_protocol.blinder.get_private_key_bytes()
+    
+    def _run_key_rotation(self, psi_protocol: PSIProtocol, max_workers: Optional[int]):
+        print(f"开始轮换服务器密钥: 版本 {self.key_epoch} -> {self.key_epoch + 1}")
+        try:
+            with self._write_lock:
+                self._rebuild_blinded_shards(psi_protocol, max_workers)
+        except Exception as e:
+            print(f"警告: 轮换服务器密钥失败，继续使用当前密钥: {e}")
+    
+    def wait_for_key_rotation(self):
+        """
+        等待正在进行的后台密钥轮换完成
+        """
+        thread = self._rotation_thread
+        if thread is not None:
+            thread.join()
+    
+    def reload(self):
+        """
+        重新加载磁盘上的数据库
         
-        self.metadata["total_credentials"] += processed_count
+        用于服务进程在其他进程离线导入数据后刷新分片和元数据
+        """
+        with self._write_lock:
+            self.shard_manager.reload_shards()
+            self.metadata = self._load_metadata()
+            self.psi_protocol.set_argon2_profile(self._resolve_argon2_profile(None))
+            self._check_blinded_shards()
+    
+    def add_breach_data(self, credentials: Iterable[Tuple[str, str]], breach_name: str = "",
+                        max_workers: Optional[int] = None,
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+        """
+        添加泄露数据到数据库
         
-        # 保存数据
-        self.save_database()
+        凭证由多进程流水线并行哈希，主进程同时进行盲化并批量写入分片
         
-        elapsed = time.time() - start_time
-        print(f"泄露数据处理完成: {processed_count} 条记录，耗时 {elapsed:.2f} 秒")
+        Args:
+            credentials: 凭证列表或迭代器 [(username, password), ...]
+            breach_name: 泄露事件名称
+            max_workers: 哈希进程数上限（默认CPU核数，并受可用内存限制）
+            batch_size: 每个哈希任务的凭证数量
+            
+        Returns:
+            导入统计信息（处理数、新增数、跳过数、吞吐量等）
+        """
+        with self._write_lock:
+            total = len(credentials) if hasattr(credentials, '__len__') else None
+            
+            pipeline = IngestionPipeline(
+                self.psi_protocol, self.shard_manager,
+                max_workers=max_workers, batch_size=batch_size
+            )
+            
+            print(f"正在处理泄露数据: {breach_name}")
+            if total is not None:
+                print(f"凭证数量: {total}")
+            print(f"哈希进程数: {pipeline.workers}")
+            
+            stats = pipeline.run(credentials, total)
+            processed_count = stats["processed"]
+            
+            # 更新元数据
+            self.metadata["breaches"].append({
+                "name": breach_name,
+                "credential_count": processed_count,
+                "added_time": time.time()
+            })
+            
+            self.metadata["total_credentials"] += processed_count
+            
+            # 保存数据
+            self.save_database()
+            
+            if stats["failed"]:
+                print(f"处理失败的凭证: {stats['failed']} 条")
+            print(f"泄露数据处理完成: {processed_count} 条记录，耗时 {stats['elapsed']:.2f} 秒 "
+                  f"({stats['rows_per_second']:.1f} 条/秒)")
+            
+            return stats
     
     def query_credential(self, username: str, password: str) -> bool:
         """
@@ -103,17 +353,15 @@ class BreachDatabase:
             return False
         
         try:
-            # 客户端准备查询
+            # 客户端准备查询（使用数据库当前的分片前缀位数）
+            self.psi_protocol.set_shard_prefix_bits(self.shard_prefix_bits)
             blinded_hash, shard_prefix, client_key = self.psi_protocol.client_prepare_query(
                 username, password
             )
             
-            # 获取对应分片的数据
-            shard_data = self.shard_manager.get_shard_data(shard_prefix)
-            
             # 服务器处理查询
-            double_blinded_hash, blinded_shard_data = self.psi_protocol.server_process_query(
-                blinded_hash, shard_prefix, shard_data
+            double_blinded_hash, blinded_shard_data, _ = self.process_query(
+                blinded_hash, shard_prefix, prefix_bits=self.psi_protocol.shard_prefix_bits
             )
             
             # 客户端处理响应
@@ -127,21 +375,141 @@ class BreachDatabase:
             print(f"查询凭证失败: {e}")
             return False
     
+    def process_query(self, blinded_hash: bytes, shard_prefix: bytes,
+                      digest_length: Optional[int] = None,
+                      prefix_bits: Optional[int] = None,
+                      stage_times: Optional[Dict[str, float]] = None) -> Tuple[bytes, List[bytes], int]:
+        """
+        服务器处理查询请求
+        
+        分片数据在导入时已用服务器密钥盲化，每次查询只需对客户端的盲化哈希
+        做一次双重盲化，再直接返回存储的盲化分片；双重盲化哈希和分片数据总是属于同一个密钥版本
+        
+        Args:
+            blinded_hash: 客户端盲化的哈希
+            shard_prefix: 分片前缀
+            digest_length: 截断摘要长度（字节），为None时返回完整的盲化点
+            prefix_bits: 分片前缀的有效位数，为None时按前缀字节数计算
+            stage_times: 不为None时累加 "blinding"（服务器盲化）和 "shard_lookup"（分片查找和截断）的耗时
+        
+        Returns:
+            (双重盲化哈希, 盲化的分片数据, 实际使用的密钥版本)
+        """
+        while True:
+            psi_protocol, key_epoch = self._serving
+            with timed_stage(stage_times, "blinding"):
+                double_blinded_hash = psi_protocol.server_blind_query(blinded_hash)
+            with timed_stage(stage_times, "shard_lookup"):
+                blinded_shard_data = self.shard_manager.get_blinded_shard_data(shard_prefix, prefix_bits)
+            
+            # 期间切换了密钥版本时分片数据可能已由新密钥盲化，按新密钥重做
+            if self.shard_manager.key_epoch == key_epoch:
+                break
+        
+        if digest_length is not None:
+            with timed_stage(stage_times, "shard_lookup"):
+                blinded_shard_data = psi_protocol.truncate_blinded_entries(
+                    blinded_shard_data, digest_length
+                )
+        
+        return double_blinded_hash, blinded_shard_data, key_epoch
+    
+    def process_query_batch(self, queries: List[Tuple[bytes, bytes]],
+                            digest_length: Optional[int] = None,
+                            prefix_bits: Optional[int] = None,
+                            stage_times: Optional[Dict[str, float]] = None
+                            ) -> Tuple[List[bytes], List[int], List[List[bytes]], int]:
+        """
+        服务器批量处理查询请求
+        
+        批次中落在同一分片的查询只查找和截断一次分片，响应中也只包含一份分片数据
+        
+        Args:
+            queries: 查询列表 [(客户端盲化的哈希, 分片前缀), ...]
+            digest_length: 截断摘要长度（字节），为None时返回完整的盲化点
+            prefix_bits: 分片前缀的有效位数，为None时按前缀字节数计算
+            stage_times: 不为None时累加 "blinding" 和 "shard_lookup" 的耗时（整个批次的合计）
+            
+        Returns:
+            (每个查询的双重盲化哈希, 每个查询对应的分片下标, 去重后的盲化分片数据, 实际使用的密钥版本)
+        """
+        while True:
+            psi_protocol, key_epoch = self._serving
+            double_blinded_hashes = []
+            shard_indices = []
+            shards = []
+            shard_positions = {}
+            
+            for blinded_hash, shard_prefix in queries:
+                with timed_stage(stage_times, "blinding"):
+                    double_blinded_hashes.append(psi_protocol.server_blind_query(blinded_hash))
+                
+                position = shard_positions.get(shard_prefix)
+                if position is None:
+                    with timed_stage(stage_times, "shard_lookup"):
+                        blinded_shard_data = self.shard_manager.get_blinded_shard_data(
+                            shard_prefix, prefix_bits
+                        )
+                        if digest_length is not None:
+                            blinded_shard_data = psi_protocol.truncate_blinded_entries(
+                                blinded_shard_data, digest_length
+                            )
+                    
+                    position = len(shards)
+                    shard_positions[shard_prefix] = position
+                    shards.append(blinded_shard_data)
+                
+                shard_indices.append(position)
+            
+            # 整个批次使用同一个密钥版本
+            if self.shard_manager.key_epoch == key_epoch:
+                return double_blinded_hashes, shard_indices, shards, key_epoch
+    
     def get_database_statistics(self) -> Dict:
         """
         获取数据库统计信息
         
+        分片统计和大小分布使用保存或合并分片时缓存的结果（不包括未保存的条目），
+        /info 等频繁请求不必遍历所有分片
+        
         Returns:
             数据库统计信息
         """
-        shard_stats = self.shard_manager.get_shard_statistics()
+        statistics = self.shard_manager.get_cached_statistics()
+        shard_stats = statistics["shard_statistics"]
         
         return {
             "metadata": self.metadata,
             "shard_statistics": shard_stats,
-            "size_distribution": self.shard_manager.get_shard_size_distribution()
+            "recommended_prefix_bits": choose_prefix_bits(shard_stats["total_credentials"]),
+            "size_distribution": statistics["size_distribution"]
         }
     
+    def reshard(self, prefix_bits: Optional[int] = None) -> int:
+        """
+        按新的分片前缀位数重写分片文件
+        
+        保存数据库时会按数据量自动调整位数，本方法用于立即调整或指定位数
+        
+        Args:
+            prefix_bits: 新的分片前缀位数，为None时按条目总数选择
+            
+        Returns:
+            重新分片后的分片前缀位数
+        """
+        with self._write_lock:
+            if prefix_bits is None:
+                total_credentials = self.shard_manager.get_shard_statistics()["total_credentials"]
+                prefix_bits = choose_prefix_bits(total_credentials)
+            
+            start_time = time.time()
+            old_prefix_bits = self.shard_prefix_bits
+            self.shard_manager.reshard(prefix_bits)
+            print(f"重新分片完成: {old_prefix_bits} 位 -> {prefix_bits} 位，"
+                  f"耗时 {time.time() - start_time:.2f} 秒")
+            
+            return prefix_bits
+    
     def save_database(self):
         """
         保存数据库到磁盘
@@ -193,17 +561,23 @@ class BreachDatabase:
         """
         清空整个数据库
         """
-        self.shard_manager.clear_all_shards()
-        
-        # 删除元数据文件
-        metadata_file = os.path.join(self.storage_path, "metadata.json")
-        if os.path.exists(metadata_file):
-            os.remove(metadata_file)
-        
-        # 重新初始化元数据
-        self.metadata = self._load_metadata()
-        
-        print("数据库已清空")
+        with self._write_lock:
+            self.shard_manager.clear_all_shards()
+            
+            # 删除元数据文件
+            metadata_file = os.path.join(self.storage_path, "metadata.json")
+            if os.path.exists(metadata_file):
+                os.remove(metadata_file)
+            
+            # 删除文件导入检查点，之后可以重新导入同一文件
+            shutil.rmtree(os.path.join(self.storage_path, IMPORT_CHECKPOINT_DIR), ignore_errors=True)
+            
+            # 重新初始化元数据（保留当前的Argon2配置）
+            self.metadata = self._load_metadata()
+            self._resolve_argon2_profile(self.argon2_profile)
+            self._check_blinded_shards()
+            
+            print("数据库已清空")
     
     def export_statistics(self, output_file: str):
         """
@@ -219,34 +593,143 @@ class BreachDatabase:
         
         print(f"统计信息已导出到: {output_file}")
     
-    def import_common_passwords(self, password_file: str, username_prefix: str = "user"):
+    def import_breach_file(self, path: str, breach_name: str = "", file_format: str = "auto",
+                           separator: str = ":", username_column: Union[int, str] = 0,
+                           password_column: Union[int, str] = 1, header: Optional[bool] = None,
+                           username_prefix: str = "user", encoding: str = "utf-8",
+                           chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = True,
+                           max_workers: Optional[int] = None,
+                           batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+        """
+        流式导入泄露数据文件
+        
+        文件（可以是gzip/bz2/xz压缩）边读取边解析，按块过滤无效凭证并去重后送入导入流水线，
+        每块写入完成后保存数据库并更新检查点；导入中断后再次调用会从最后一个检查点继续
+        
+        Args:
+            path: 泄露数据文件路径
+            breach_name: 泄露事件名称，默认为文件名
+            file_format: "plain"（每行一个密码）/ "combo"（用户名:密码）/ "csv"，"auto" 时自动判断
+            separator: combo格式的分隔符或csv格式的字段分隔符
+            username_column: csv格式的用户名列号或表头名称
+            password_column: csv格式的密码列号或表头名称
+            header: csv文件第一行是否为表头，为None时按列是否用名称指定判断
+            username_prefix: plain格式生成用户名时使用的前缀
+            encoding: 文本编码，无法解码的行会被跳过
+            chunk_size: 每块读取的记录数（决定内存占用和检查点间隔）
+            resume: 是否从已有检查点继续，为False时重新开始导入
+            max_workers: 哈希进程数上限
+            batch_size: 每个哈希任务的凭证数量
+        
+        Returns:
+            导入统计信息（读取、格式错误、无效、重复、处理、新增、失败数量和吞吐量）
+        """
+        with self._write_lock:
+            reader = BreachFileReader(path, file_format, separator, username_column, password_column,
+                                      header, username_prefix, encoding)
+            checkpoint = ImportCheckpoint(
+                os.path.join(self.storage_path, IMPORT_CHECKPOINT_DIR), path,
+                {
+                    "format": reader.file_format,
+                    "separator": reader.separator,
+                    "username_column": username_column,
+                    "password_column": password_column,
+                    "header": reader.has_header,
+                    "username_prefix": username_prefix,
+                    "encoding": encoding
+                }
+            )
+            breach_name = breach_name or os.path.basename(path)
+            
+            if resume and checkpoint.load():
+                if checkpoint.completed:
+                    print(f"文件已导入，跳过: {path}")
+                    return checkpoint.stats
+                print(f"从检查点继续导入: 第 {checkpoint.position['line_number']} 行之后")
+            
+            stats = {
+                "read": 0, "malformed": 0, "invalid": 0, "duplicates": 0,
+                "processed": 0, "added": 0, "failed": 0
+            }
+            stats.update(checkpoint.stats)
+            malformed_before = stats["malformed"]
+            
+            print(f"正在导入泄露数据文件: {path} (格式: {reader.file_format})")
+            
+            start_time = time.time()
+            processed_before = stats["processed"]
+            
+            with IngestionPipeline(self.psi_protocol, self.shard_manager, max_workers=max_workers,
+                                   batch_size=batch_size, progress_interval=0) as pipeline:
+                print(f"哈希进程数: {pipeline.workers}")
+                stats["workers"] = pipeline.workers
+                
+                for chunk in iter_chunks(reader.read(**checkpoint.position), chunk_size, stats):
+                    chunk_stats = pipeline.run(chunk)
+                    for key in ("processed", "added", "failed"):
+                        stats[key] += chunk_stats[key]
+                    stats["read"] = reader.records
+                    stats["malformed"] = malformed_before + reader.malformed
+                    
+                    self.metadata["total_credentials"] += chunk_stats["processed"]
+                    self.save_database()
+                    
+                    # 数据库保存之后才推进检查点，中断时最多重新处理一块（重复条目会被去重）
+                    checkpoint.position = reader.position()
+                    checkpoint.stats = stats
+                    checkpoint.save()
+                    
+                    elapsed = time.time() - start_time
+                    rate = (stats["processed"] - processed_before) / elapsed if elapsed > 0 else 0
+                    print(f"已读取 {reader.line_number} 行，处理 {stats['processed']} 条，"
+                          f"新增 {stats['added']} 条 ({rate:.1f} 条/秒)")
+            
+            stats["read"] = reader.records
+            stats["malformed"] = malformed_before + reader.malformed
+            
+            self.metadata["breaches"].append({
+                "name": breach_name,
+                "credential_count": stats["processed"],
+                "added_time": time.time()
+            })
+            self._save_metadata()
+            
+            elapsed = time.time() - start_time
+            stats["elapsed"] = elapsed
+            stats["rows_per_second"] = (stats["processed"] - processed_before) / elapsed if elapsed > 0 else 0
+            
+            checkpoint.position = reader.position()
+            checkpoint.stats = stats
+            checkpoint.completed = True
+            checkpoint.save()
+            
+            print(f"泄露数据导入完成: 读取 {stats['read']} 条，处理 {stats['processed']} 条，"
+                  f"新增 {stats['added']} 条，无效 {stats['invalid'] + stats['malformed']} 条，"
+                  f"重复 {stats['duplicates']} 条")
+            
+            return stats
+    
+    def import_common_passwords(self, password_file: str, username_prefix: str = "user") -> Optional[Dict]:
         """
         导入常见密码列表
         
+        密码文件（每行一个密码，可以是压缩文件）流式读取，不会整体载入内存
+        
         Args:
             password_file: 密码文件路径
             username_prefix: 用户名前缀
-        """
-        passwords = []
         
+        Returns:
+            导入统计信息，读取文件失败时返回None
+        """
         try:
-            with open(password_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    password = line.strip()
-                    if password:
-                        passwords.append(password)
-        except Exception as e:
+            return self.import_breach_file(
+                password_file, f"常见密码列表 ({password_file})",
+                file_format="plain", username_prefix=username_prefix
+            )
+        except OSError as e:
             print(f"读取密码文件失败: {e}")
-            return
-        
-        # 创建凭证列表
-        credentials = []
-        for i, password in enumerate(passwords):
-            username = f"{username_prefix}{i}"
-            credentials.append((username, password))
-        
-        # 添加到数据库
-        self.add_breach_data(credentials, f"常见密码列表 ({password_file})")
+            return None
     
     def simulate_breach_data(self, count: int = 1000):
         """
@@ -0,0 +1,360 @@
+import bz2
+import csv
+import gzip
+import hashlib
+import json
+import lzma
+import os
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+from ..utils.canonicalize import canonicalize_username, validate_credentials
+
+
+# 每个导入块包含的记录数：一块处理完成后保存数据库并写入检查点
+DEFAULT_CHUNK_SIZE = 50000
+
+# 压缩格式的文件头，按内容而不是扩展名识别
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+)
+
+COMPRESSED_OPENERS = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "xz": lzma.open,
+}
+
+# 支持的文件格式:
+#   plain: 每行一个密码，用户名按 username_prefix + 序号生成
+#   combo: 每行 "用户名<分隔符>密码"，按第一个分隔符切分（密码中可以包含分隔符）
+#   csv: CSV/TSV，用户名和密码列由列号或表头名称指定
+BREACH_FORMATS = ("plain", "combo", "csv")
+
+CHECKPOINT_VERSION = 1
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """
+    根据文件头检测压缩格式
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        "gzip" / "bz2" / "xz"，未压缩时返回None
+    """
+    with open(path, 'rb') as f:
+        header = f.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def open_breach_file(path: str) -> BinaryIO:
+    """
+    以二进制流方式打开（可能压缩的）泄露数据文件
+    
+    压缩文件边读取边解压，内存占用与文件大小无关
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        解压后内容的二进制流
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb')
+    return COMPRESSED_OPENERS[compression](path, 'rb')
+
+
+def _strip_compression_suffix(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return root if ext.lower() in (".gz", ".bz2", ".xz") else path
+
+
+class BreachFileReader:
+    """
+    泄露数据文件的流式读取器
+    
+    逐行解码解析，产生 (username, password)；无法解码或解析的行计入malformed后跳过。
+    读取位置（解压后的字节偏移）和已产生的记录数可随时取出，
+    保存到检查点后用于从中断处继续读取
+    """
+    
+    def __init__(self, path: str, file_format: str = "auto", separator: str = ":",
+                 username_column: Union[int, str] = 0, password_column: Union[int, str] = 1,
+                 header: Optional[bool] = None, username_prefix: str = "user",
+                 encoding: str = "utf-8"):
+        """
+        初始化读取器
+        
+        Args:
+            path: 文件路径（支持gzip/bz2/xz压缩）
+            file_format: "plain" / "combo" / "csv"，"auto" 时按扩展名和首行内容判断
+            separator: combo格式的分隔符，csv格式的字段分隔符（.tsv文件默认为制表符）
+            username_column: csv格式的用户名列号或表头名称
+            password_column: csv格式的密码列号或表头名称
+            header: csv文件第一行是否为表头，为None时按列是否用名称指定判断
+            username_prefix: plain格式生成用户名时使用的前缀
+            encoding: 文本编码
+        """
+        self.path = path
+        self.separator = separator
+        self.username_column = username_column
+        self.password_column = password_column
+        self.username_prefix = username_prefix
+        self.encoding = encoding
+        
+        self.file_format = self._detect_format() if file_format == "auto" else file_format
+        if self.file_format not in BREACH_FORMATS:
+            raise ValueError(f"不支持的文件格式: {file_format}（可选: auto, {', '.join(BREACH_FORMATS)}）")
+        if self.file_format == "csv" and separator == ":":
+            self.separator = "\t" if _strip_compression_suffix(path).lower().endswith(".tsv") else ","
+        if self.file_format == "combo" and not separator:
+            raise ValueError("combo格式需要非空的分隔符")
+        
+        # 表头只在csv格式下使用，用名称指定列时必须有表头
+        uses_names = isinstance(username_column, str) or isinstance(password_column, str)
+        if header is False and uses_names:
+            raise ValueError("用名称指定列时CSV文件必须包含表头")
+        self.has_header = self.file_format == "csv" and (uses_names if header is None else header)
+        
+        # 读取进度
+        self.offset = 0
+        self.line_number = 0
+        self.records = 0
+        self.malformed = 0
+    
+    def _detect_format(self) -> str:
+        """
+        按扩展名和第一个非空行判断文件格式
+        """
+        if _strip_compression_suffix(self.path).lower().endswith((".csv", ".tsv")):
+            return "csv"
+        
+        with open_breach_file(self.path) as stream:
+            for raw_line in stream:
+                line = raw_line.decode(self.encoding, errors="replace").strip()
+                if line:
+                    return "combo" if self.separator in line else "plain"
+        return "plain"
+    
+    def _lines(self, stream: BinaryIO) -> Iterator[str]:
+        """
+        逐行解码，同时记录读取位置
+        """
+        for raw_line in stream:
+            self.offset += len(raw_line)
+            self.line_number += 1
+            try:
+                yield raw_line.decode(self.encoding).rstrip("\r\n")
+            except UnicodeDecodeError:
+                self.malformed += 1
+    
+    def _resolve_columns(self, header: List[str]) -> Tuple[int, int]:
+        """
+        将表头名称解析为列号（名称不区分大小写）
+        """
+        names = [name.strip().lower() for name in header]
+        columns = []
+        for column in (self.username_column, self.password_column):
+            if isinstance(column, str):
+                if column.lower() not in names:
+                    raise ValueError(f"CSV表头中没有列: {column}")
+                column = names.index(column.lower())
+            columns.append(column)
+        return columns[0], columns[1]
+    
+    def _parse(self, lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+        """
+        按文件格式从文本行解析凭证
+        """
+        if self.file_format == "plain":
+            for line in lines:
+                password = line.strip()
+                if password:
+                    yield f"{self.username_prefix}{self.records}", password
+        
+        elif self.file_format == "combo":
+            for line in lines:
+                if not line.strip():
+                    continue
+                username, separator, password = line.partition(self.separator)
+                if not separator:
+                    self.malformed += 1
+                    continue
+                yield username.strip(), password
+        
+        else:
+            username_index, password_index = self.username_column, self.password_column
+            for row in csv.reader(lines, delimiter=self.separator):
+                if not row:
+                    continue
+                if max(username_index, password_index) >= len(row):
+                    self.malformed += 1
+                    continue
+                yield row[username_index].strip(), row[password_index]
+    
+    def read(self, offset: int = 0, line_number: int = 0, records: int = 0) -> Iterator[Tuple[str, str]]:
+        """
+        从指定位置开始流式读取凭证
+        
+        Args:
+            offset: 开始读取的字节偏移（解压后），来自之前保存的检查点
+            line_number: 该位置之前的行数
+            records: 该位置之前已产生的记录数（plain格式据此继续生成用户名）
+        
+        Yields:
+            (username, password)
+        """
+        with open_breach_file(self.path) as stream:
+            self.offset, self.line_number, self.records = 0, 0, records
+            lines = self._lines(stream)
+            
+            if self.has_header:
+                header = next(csv.reader(lines, delimiter=self.separator), None)
+                if header is None:
+                    return
+                self.username_column, self.password_column = self._resolve_columns(header)
+            
+            # 压缩流的seek通过解压跳过前面的内容实现，同样不需要把数据读入内存
+            if offset > self.offset:
+                stream.seek(offset)
+                self.offset, self.line_number = offset, line_number
+            
+            for credential in self._parse(lines):
+                self.records += 1
+                yield credential
+    
+    def position(self) -> Dict:
+        """
+        当前读取位置（已产生的记录之后）
+        """
+        return {"offset": self.offset, "line_number": self.line_number, "records": self.records}
+
+
+def iter_chunks(credentials: Iterator[Tuple[str, str]], chunk_size: int,
+                stats: Dict) -> Iterator[List[Tuple[str, str]]]:
+    """
+    按块收集凭证，块内过滤无效凭证并按标准化后的凭证去重
+    
+    泄露数据中同一凭证经常重复出现，去重后不再为重复条目计算Argon2哈希
+    
+    Args:
+        credentials: 凭证迭代器
+        chunk_size: 每块的记录数
+        stats: 统计信息，累加 "invalid" 和 "duplicates"
+    
+    Yields:
+        去重后的凭证列表
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size必须为正数")
+    
+    chunk = {}
+    read_count = 0
+    for username, password in credentials:
+        read_count += 1
+        if not validate_credentials(username, password):
+            stats["invalid"] += 1
+        else:
+            key = (canonicalize_username(username), password)
+            if key in chunk:
+                stats["duplicates"] += 1
+            else:
+                chunk[key] = (username, password)
+        
+        if read_count >= chunk_size:
+            yield list(chunk.values())
+            chunk = {}
+            read_count = 0
+    
+    if read_count:
+        yield list(chunk.values())
+
+
+class ImportCheckpoint:
+    """
+    导入检查点
+    
+    记录源文件的标识（路径、大小、修改时间和读取选项）、已写入数据库的读取位置
+    以及累计统计，每个导入块保存数据库后原子更新
+    """
+    
+    def __init__(self, directory: str, source_path: str, options: Dict):
+        """
+        初始化检查点
+        
+        Args:
+            directory: 检查点目录
+            source_path: 源文件路径
+            options: 影响解析结果的读取选项
+        """
+        source_path = os.path.abspath(source_path)
+        file_stat = os.stat(source_path)
+        self.source = {
+            "path": source_path,
+            "size": file_stat.st_size,
+            "mtime": int(file_stat.st_mtime),
+            "options": options
+        }
+        
+        name = hashlib.sha256(source_path.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(directory, f"{name}.json")
+        self.position = {"offset": 0, "line_number": 0, "records": 0}
+        self.stats: Dict = {}
+        self.completed = False
+    
+    def load(self) -> bool:
+        """
+        加载已有的检查点
+        
+        Returns:
+            是否存在同一源文件的检查点
+        
+        Raises:
+            ValueError: 检查点对应的源文件已被修改或读取选项不同
+        """
+        if not os.path.exists(self.path):
+            return False
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"不支持的检查点版本: {data.get('version')}")
+        if data["source"] != self.source:
+            raise ValueError(f"源文件或读取选项与检查点不一致，无法继续导入: {self.path}")
+        
+        self.position = data["position"]
+        self.stats = data["stats"]
+        self.completed = data["completed"]
+        return True
+    
+    def save(self):
+        """
+        原子写入检查点
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "source": self.source,
+                "position": self.position,
+                "stats": self.stats,
+                "completed": self.completed
+            }, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    def remove(self):
+        """
+        删除检查点
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,160 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional
+from ..crypto.elliptic_curve import EllipticCurveBlinder, hash_to_curve_bytes
+from .shard_file import HASH_SIZE, POINT_SIZE, RECORD_SIZE, NO_MAPPED_POINT
+
+
+# 每个盲化任务包含的记录数（多个小分片合并为一个任务，减少进程间通信次数）
+DEFAULT_BLIND_BATCH_RECORDS = 4096
+
+# 工作进程内的盲化器（由进程初始化函数用服务器私钥创建，私钥对象只派生一次）
+_worker_blinder: Optional[EllipticCurveBlinder] = None
+
+
+def _init_worker(server_private_key: bytes):
+    """
+    工作进程初始化
+    
+    Args:
+        server_private_key: 服务器私钥
+    """
+    global _worker_blinder
+    _worker_blinder = EllipticCurveBlinder(server_private_key)
+
+
+def blind_records(blinder: EllipticCurveBlinder, records: bytes) -> bytes:
+    """
+    用服务器私钥重新盲化一段分片记录
+    
+    盲化结果直接写入记录数组的盲化哈希列；没有缓存映射点的记录先映射，
+    映射点同时写回记录
+    
+    Args:
+        blinder: 持有服务器私钥的盲化器
+        records: 按当前记录格式拼接的分片记录
+    
+    Returns:
+        重新盲化后的记录
+    """
+    buffer = bytearray(records)
+    for offset in range(0, len(buffer), RECORD_SIZE):
+        point_offset = offset + HASH_SIZE + POINT_SIZE
+        mapped_point = bytes(buffer[point_offset:offset + RECORD_SIZE])
+        if mapped_point == NO_MAPPED_POINT:
+            mapped_point = hash_to_curve_bytes(bytes(buffer[offset:offset + HASH_SIZE]))
+            buffer[point_offset:offset + RECORD_SIZE] = mapped_point
+        
+        buffer[offset + HASH_SIZE:point_offset] = blinder.blind_with_private_key_to_bytes(
+            blinder.point_from_xy(mapped_point)
+        )
+    return bytes(buffer)
+
+
+def blind_shard_batch(shards: List[bytes]) -> List[bytes]:
+    """
+    在工作进程中重新盲化一批分片的记录
+    
+    Args:
+        shards: 各分片的记录
+    
+    Returns:
+        与输入一一对应的重新盲化后的记录
+    """
+    return [blind_records(_worker_blinder, records) for records in shards]
+
+
+class BulkBlinder:
+    """
+    分片记录的批量盲化器
+    
+    按顺序读入各分片的记录，合并成固定大小的任务分给多个工作进程盲化，
+    按原顺序产出结果；同时在途的任务数有上限，内存占用与数据库大小无关。
+    只有一个任务的小数据量直接在当前进程中处理，不启动进程池
+    """
+    
+    def __init__(self, server_private_key: bytes, max_workers: Optional[int] = None,
+                 batch_records: int = DEFAULT_BLIND_BATCH_RECORDS):
+        """
+        初始化批量盲化器
+        
+        Args:
+            server_private_key: 服务器私钥
+            max_workers: 工作进程数，默认为CPU核数
+            batch_records: 每个任务的记录数
+        """
+        if batch_records <= 0:
+            raise ValueError("batch_records必须为正数")
+        
+        self.server_private_key = server_private_key
+        self.blinder = EllipticCurveBlinder(server_private_key)
+        self.workers = max(1, max_workers if max_workers is not None else (os.cpu_count() or 1))
+        self.batch_records = batch_records
+        
+        # 同时在途的任务数：保证主进程写入结果期间每个工作进程都有任务排队
+        self.max_in_flight = self.workers * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def __enter__(self) -> "BulkBlinder":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.server_private_key,))
+        return self._executor
+    
+    def _iter_batches(self, shards: Iterable[bytes]) -> Iterator[List[bytes]]:
+        """
+        将连续的分片合并为记录数不少于batch_records的任务（空分片随相邻任务一起返回）
+        """
+        batch = []
+        record_count = 0
+        for records in shards:
+            batch.append(records)
+            record_count += len(records) // RECORD_SIZE
+            if record_count >= self.batch_records:
+                yield batch
+                batch = []
+                record_count = 0
+        
+        if batch:
+            yield batch
+    
+    def blind_shards(self, shards: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        按顺序重新盲化各分片的记录
+        
+        Args:
+            shards: 各分片的记录（按分片索引顺序）
+        
+        Yields:
+            与输入一一对应的重新盲化后的记录
+        """
+        batches = self._iter_batches(shards)
+        head = list(islice(batches, 2))
+        
+        if len(head) < 2 or self.workers == 1:
+            for batch in chain(head, batches):
+                for records in batch:
+                    yield blind_records(self.blinder, records)
+            return
+        
+        executor = self._get_executor()
+        pending = deque()
+        for batch in chain(head, batches):
+            pending.append(executor.submit(blind_shard_batch, batch))
+            
+            # 按提交顺序取回最早的任务，其余任务在工作进程中继续计算
+            if len(pending) >= self.max_in_flight:
+                yield from pending.popleft().result()
+        
+        while pending:
+            yield from pending.popleft().result()
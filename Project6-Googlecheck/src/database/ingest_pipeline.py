@@ -0,0 +1,281 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..crypto.argon2_hash import Argon2Hasher
+from ..crypto.argon2_profiles import Argon2Profile
+from ..crypto.elliptic_curve import hash_to_curve_bytes
+from ..crypto.psi_protocol import PSIProtocol
+from ..utils.canonicalize import canonicalize_username, validate_credentials
+from ..utils.constants import ARGON2_MEMORY_COST
+from .shard_manager import ShardManager
+
+
+# 每个任务包含的凭证数量（减少进程间通信次数）
+DEFAULT_BATCH_SIZE = 32
+
+# 累积多少条盲化结果后批量写入分片
+DEFAULT_COMMIT_SIZE = 1000
+
+# 每处理多少条记录输出一次进度
+DEFAULT_PROGRESS_INTERVAL = 1000
+
+# 计算工作进程数时最多使用的可用内存比例
+MEMORY_USAGE_RATIO = 0.8
+
+# 工作进程内的哈希器（由进程初始化函数创建，避免每个任务重复构造）
+_worker_hasher: Optional[Argon2Hasher] = None
+
+
+def get_available_memory() -> Optional[int]:
+    """
+    获取系统当前可用内存
+    
+    Returns:
+        可用内存字节数，无法获取时返回None
+    """
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_worker_count(max_workers: Optional[int] = None,
+                     memory_cost: int = ARGON2_MEMORY_COST) -> int:
+    """
+    计算哈希工作进程数
+    
+    每个Argon2哈希需要 memory_cost KB 内存，进程数不超过CPU核数，
+    也不超过可用内存所能同时容纳的哈希数量
+    
+    Args:
+        max_workers: 期望的进程数上限，默认为CPU核数
+        memory_cost: 每个哈希的Argon2内存开销（KB）
+    
+    Returns:
+        实际使用的进程数（至少为1）
+    """
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    
+    available_memory = get_available_memory()
+    if available_memory is not None:
+        per_worker = memory_cost * 1024
+        workers = min(workers, int(available_memory * MEMORY_USAGE_RATIO) // per_worker)
+    
+    return max(1, workers)
+
+
+def _init_worker(profile_data: Optional[Dict] = None):
+    """
+    工作进程初始化
+    
+    Args:
+        profile_data: 数据库使用的Argon2参数配置（字典形式，便于传给子进程）
+    """
+    global _worker_hasher
+    _worker_hasher = Argon2Hasher(Argon2Profile.from_dict(profile_data) if profile_data else None)
+
+
+def hash_credential_batch(batch: List[Tuple[str, str]]) -> List[Optional[bytes]]:
+    """
+    在工作进程中对一批凭证进行标准化和Argon2哈希
+    
+    Args:
+        batch: 凭证列表 [(username, password), ...]
+    
+    Returns:
+        与输入一一对应的凭证哈希列表，哈希失败的位置为None
+    """
+    hasher = _worker_hasher if _worker_hasher is not None else Argon2Hasher()
+    
+    results = []
+    for username, password in batch:
+        try:
+            results.append(hasher.hash_credential_with_fixed_salt(
+                canonicalize_username(username), password
+            ))
+        except Exception:
+            results.append(None)
+    return results
+
+
+def prepare_credential_batch(batch: List[Tuple[str, str]]) -> List[Optional[Tuple[bytes, bytes]]]:
+    """
+    在工作进程中对一批凭证进行Argon2哈希并映射到曲线点
+    
+    映射与服务器密钥无关，放在工作进程中计算，主进程只需要做盲化
+    
+    Args:
+        batch: 凭证列表 [(username, password), ...]
+    
+    Returns:
+        与输入一一对应的 (凭证哈希, 映射点) 列表，失败的位置为None
+    """
+    results = []
+    for credential_hash in hash_credential_batch(batch):
+        try:
+            results.append((credential_hash, hash_to_curve_bytes(credential_hash))
+                           if credential_hash is not None else None)
+        except Exception:
+            results.append(None)
+    return results
+
+
+class IngestionPipeline:
+    """
+    多进程泄露数据导入流水线
+    
+    凭证按批流式送入进程池做Argon2哈希和哈希到曲线映射，主进程在等待后续批次的同时
+    对已完成的批次进行服务器盲化，结果（连同映射点）累积后批量写入分片
+    """
+    
+    def __init__(self, psi_protocol: PSIProtocol, shard_manager: ShardManager,
+                 max_workers: Optional[int] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 commit_size: int = DEFAULT_COMMIT_SIZE,
+                 progress_interval: int = DEFAULT_PROGRESS_INTERVAL):
+        """
+        初始化导入流水线
+        
+        Args:
+            psi_protocol: 用于盲化的PSI协议实例（持有服务器私钥）
+            shard_manager: 结果写入的分片管理器
+            max_workers: 哈希进程数上限，实际进程数还受可用内存限制
+            batch_size: 每个哈希任务的凭证数量
+            commit_size: 每次批量写入分片的条目数量
+            progress_interval: 进度输出间隔（条）
+        """
+        if batch_size <= 0 or commit_size <= 0:
+            raise ValueError("batch_size和commit_size必须为正数")
+        
+        self.psi_protocol = psi_protocol
+        self.shard_manager = shard_manager
+        self.workers = get_worker_count(max_workers, psi_protocol.argon2_profile.memory_cost)
+        self.batch_size = batch_size
+        self.commit_size = commit_size
+        self.progress_interval = progress_interval
+        
+        # 同时在途的批次数：保证主进程盲化期间每个工作进程都有任务排队
+        self.max_in_flight = self.workers * 2
+        
+        # 作为上下文管理器使用时，多次run共用同一个进程池
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.psi_protocol.argon2_profile.to_dict(),))
+    
+    def __enter__(self) -> "IngestionPipeline":
+        self._executor = self._create_executor()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown()
+        self._executor = None
+    
+    def _iter_batches(self, credentials: Iterable[Tuple[str, str]],
+                      stats: Dict) -> Iterator[List[Tuple[str, str]]]:
+        """
+        过滤无效凭证并按批切分
+        """
+        batch = []
+        for username, password in credentials:
+            if not validate_credentials(username, password):
+                stats["skipped"] += 1
+                continue
+            
+            batch.append((username, password))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        
+        if batch:
+            yield batch
+    
+    def run(self, credentials: Iterable[Tuple[str, str]],
+            total: Optional[int] = None) -> Dict:
+        """
+        执行导入
+        
+        Args:
+            credentials: 凭证迭代器 [(username, password), ...]，可以是生成器
+            total: 凭证总数（仅用于进度显示）
+        
+        Returns:
+            导入统计信息
+        """
+        stats = {
+            "processed": 0,
+            "added": 0,
+            "skipped": 0,
+            "failed": 0,
+            "workers": self.workers
+        }
+        
+        start_time = time.time()
+        pending = deque()
+        commit_buffer = []
+        next_report = self.progress_interval
+        
+        def handle(future):
+            nonlocal next_report
+            batch_results = future.result()
+            results = [result for result in batch_results if result is not None]
+            stats["failed"] += len(batch_results) - len(results)
+            
+            blinded_hashes = self.psi_protocol.blind_mapped_entries(
+                mapped_point for _, mapped_point in results
+            )
+            for (credential_hash, mapped_point), blinded_hash in zip(results, blinded_hashes):
+                commit_buffer.append((credential_hash, blinded_hash, mapped_point))
+            stats["processed"] += len(results)
+            
+            if len(commit_buffer) >= self.commit_size:
+                stats["added"] += self.shard_manager.add_credentials(commit_buffer)
+                commit_buffer.clear()
+            
+            if self.progress_interval and stats["processed"] >= next_report:
+                self._report_progress(stats["processed"], total, start_time)
+                next_report = (stats["processed"] // self.progress_interval + 1) * self.progress_interval
+        
+        executor = self._executor if self._executor is not None else self._create_executor()
+        try:
+            for batch in self._iter_batches(credentials, stats):
+                pending.append(executor.submit(prepare_credential_batch, batch))
+                
+                # 按提交顺序处理最早的批次，其余批次在工作进程中继续哈希
+                if len(pending) >= self.max_in_flight:
+                    handle(pending.popleft())
+            
+            while pending:
+                handle(pending.popleft())
+        finally:
+            if executor is not self._executor:
+                executor.shutdown()
+        
+        if commit_buffer:
+            stats["added"] += self.shard_manager.add_credentials(commit_buffer)
+        
+        elapsed = time.time() - start_time
+        stats["elapsed"] = elapsed
+        stats["rows_per_second"] = stats["processed"] / elapsed if elapsed > 0 else 0
+        return stats
+    
+    @staticmethod
+    def _report_progress(processed: int, total: Optional[int], start_time: float):
+        """
+        输出进度和吞吐量
+        """
+        elapsed = time.time() - start_time
+        rate = processed / elapsed if elapsed > 0 else 0
+        progress = f"{processed}/{total}" if total is not None else f"{processed}"
+        print(f"已处理 {progress} 条记录 ({elapsed:.2f}秒, {rate:.1f} 条/秒)")
@@ -0,0 +1,438 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from ..utils.constants import ARGON2_HASH_LENGTH, CURVE_POINT_SIZE
+from ..utils.sharding import get_prefix_length, get_shard_index
+
+
+# 分片文件格式:
+#   头部: MAGIC(8) || shard_count(4) || record_count(8) || key_id(16)
+#   索引: (shard_count + 1) 个小端uint64，第i个分片的记录为 [index[i], index[i+1])
+#   记录: record_count 条定长记录 credential_hash(16) || blinded_hash(29) || mapped_point(56)，
+#         按凭证哈希全局排序（分片键是哈希前缀，因此同一分片的记录连续存放）；
+#         mapped_point 是凭证哈希映射到的曲线点（未压缩坐标 x || y），重新盲化时直接使用，
+#         全零表示未缓存（由旧版本文件转换而来）
+#   shard_count = 2^prefix_bits，索引对应文件写入时的分片前缀位数；
+#   按其他位数查找时，更少的位数对应索引中的连续区间，更多的位数在分片内二分定位
+#
+# 增量段文件格式（每次保存写入一个段，定期合并进分片文件）:
+#   头部: MAGIC(8) || record_count(8)
+#   记录: 与分片文件相同的定长记录，按凭证哈希排序，按分片查找时二分定位（与分片前缀位数无关）
+#
+# 版本1（GPCSHD01 / GPCSEG01）的记录没有 mapped_point，仍可读取，合并和重新盲化时转换为当前格式
+SHARD_FILE_MAGIC = b"GPCSHD02"
+SEGMENT_FILE_MAGIC = b"GPCSEG02"
+LEGACY_SHARD_FILE_MAGIC = b"GPCSHD01"
+LEGACY_SEGMENT_FILE_MAGIC = b"GPCSEG01"
+HASH_SIZE = ARGON2_HASH_LENGTH
+POINT_SIZE = CURVE_POINT_SIZE + 1  # 压缩点格式: 1字节前缀 + 28字节x坐标
+MAPPED_POINT_SIZE = CURVE_POINT_SIZE * 2  # 未压缩坐标 x || y
+RECORD_SIZE = HASH_SIZE + POINT_SIZE + MAPPED_POINT_SIZE
+LEGACY_RECORD_SIZE = HASH_SIZE + POINT_SIZE
+NO_MAPPED_POINT = bytes(MAPPED_POINT_SIZE)
+KEY_ID_SIZE = 16
+
+_HEADER_FORMAT = "<8sIQ16s"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_SEGMENT_HEADER_FORMAT = "<8sQ"
+_SEGMENT_HEADER_SIZE = struct.calcsize(_SEGMENT_HEADER_FORMAT)
+
+
+class RecordView:
+    """
+    分片文件中一列定长字段的零拷贝只读视图
+    
+    支持 len()、下标、迭代和 in 运算，元素为指向mmap的memoryview
+    """
+    
+    __slots__ = ("_buffer", "_start", "_count", "_offset", "_width", "_stride")
+    
+    def __init__(self, buffer: memoryview, start: int, count: int, offset: int, width: int,
+                 stride: int = RECORD_SIZE):
+        self._buffer = buffer
+        self._start = start
+        self._count = count
+        self._offset = offset
+        self._width = width
+        self._stride = stride
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def __getitem__(self, index: int) -> memoryview:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("记录下标越界")
+        begin = self._start + index * self._stride + self._offset
+        return self._buffer[begin:begin + self._width]
+    
+    def __iter__(self) -> Iterator[memoryview]:
+        begin = self._start + self._offset
+        for _ in range(self._count):
+            yield self._buffer[begin:begin + self._width]
+            begin += self._stride
+    
+    def __contains__(self, value) -> bool:
+        if len(value) != self._width:
+            return False
+        return any(item == value for item in self)
+    
+    def __repr__(self) -> str:
+        return f"RecordView({[bytes(item).hex() for item in self]})"
+
+
+class _RecordFile:
+    """
+    以mmap方式只读打开的定长记录文件
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        
+        self.record_count = 0
+        self.record_size = RECORD_SIZE
+        self._records_offset = 0
+    
+    def _key_at(self, record: int, length: int) -> bytes:
+        begin = self._records_offset + record * self.record_size
+        return self._buffer[begin:begin + length].tobytes()
+    
+    def _lower_bound(self, key: bytes, low: int, high: int) -> int:
+        """
+        在 [low, high) 的排序记录上二分查找第一个哈希前缀不小于key的记录
+        """
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle, len(key)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def _search_range(self, shard_index: int, prefix_bits: int, start: int, end: int) -> Tuple[int, int]:
+        """
+        在 [start, end) 的排序记录上二分定位分片的记录区间
+        """
+        length = get_prefix_length(prefix_bits)
+        shift = length * 8 - prefix_bits
+        low = self._lower_bound((shard_index << shift).to_bytes(length, 'big'), start, end)
+        if shard_index + 1 == 1 << prefix_bits:
+            return low, end
+        return low, self._lower_bound(((shard_index + 1) << shift).to_bytes(length, 'big'), low, end)
+    
+    def get_record_range(self, shard_index: int, prefix_bits: int) -> Tuple[int, int]:
+        """
+        获取分片的记录区间
+        
+        Args:
+            shard_index: 分片索引
+            prefix_bits: 分片前缀位数
+        
+        Returns:
+            (起始记录号, 结束记录号)
+        """
+        if not 0 <= shard_index < 1 << prefix_bits:
+            return 0, 0
+        return self._search_range(shard_index, prefix_bits, 0, self.record_count)
+    
+    def get_shard_size(self, shard_index: int, prefix_bits: int) -> int:
+        """
+        获取分片中的记录数量
+        """
+        start, end = self.get_record_range(shard_index, prefix_bits)
+        return end - start
+    
+    def get_shard_sizes(self, prefix_bits: int) -> Dict[int, int]:
+        """
+        获取所有非空分片的记录数量
+        
+        Args:
+            prefix_bits: 分片前缀位数
+        
+        Returns:
+            {分片索引: 记录数量}
+        """
+        length = get_prefix_length(prefix_bits)
+        sizes = {}
+        for record in range(self.record_count):
+            shard_index = get_shard_index(self._key_at(record, length), prefix_bits)
+            sizes[shard_index] = sizes.get(shard_index, 0) + 1
+        return sizes
+    
+    def contains_hash(self, credential_hash: bytes, prefix_bits: int) -> bool:
+        """
+        在所属分片的排序记录上二分查找凭证哈希
+        
+        Args:
+            credential_hash: 凭证哈希
+            prefix_bits: 分片前缀位数（用于缩小查找范围）
+            
+        Returns:
+            是否存在
+        """
+        start, end = self.get_record_range(get_shard_index(credential_hash, prefix_bits), prefix_bits)
+        low = self._lower_bound(credential_hash, start, end)
+        return low < end and self._key_at(low, HASH_SIZE) == credential_hash
+    
+    def _view(self, shard_index: int, prefix_bits: int, offset: int, width: int) -> RecordView:
+        start, end = self.get_record_range(shard_index, prefix_bits)
+        # 视图持有自己的切片而不是文件的memoryview，文件关闭后视图仍然有效（映射在视图释放后关闭）
+        begin = self._records_offset + start * self.record_size
+        return RecordView(
+            self._buffer[begin:self._records_offset + end * self.record_size], 0, end - start,
+            offset, width, self.record_size
+        )
+    
+    def get_hashes(self, shard_index: int, prefix_bits: int) -> RecordView:
+        """
+        获取分片中凭证哈希的零拷贝视图
+        """
+        return self._view(shard_index, prefix_bits, 0, HASH_SIZE)
+    
+    def get_blinded_hashes(self, shard_index: int, prefix_bits: int) -> RecordView:
+        """
+        获取分片中盲化哈希的零拷贝视图
+        """
+        return self._view(shard_index, prefix_bits, HASH_SIZE, POINT_SIZE)
+    
+    def get_records(self, shard_index: int, prefix_bits: int) -> bytes:
+        """
+        获取分片中所有记录的字节（用于合并写入新文件）
+        
+        旧版本文件的记录补上全零的 mapped_point，返回值总是当前记录格式
+        """
+        start, end = self.get_record_range(shard_index, prefix_bits)
+        begin = self._records_offset + start * self.record_size
+        records = self._buffer[begin:self._records_offset + end * self.record_size].tobytes()
+        if self.record_size == RECORD_SIZE:
+            return records
+        return b''.join(
+            records[i:i + self.record_size] + NO_MAPPED_POINT
+            for i in range(0, len(records), self.record_size)
+        )
+    
+    def close(self):
+        """
+        关闭文件映射
+        
+        仍有视图引用映射时无法立即关闭，此时由垃圾回收在视图释放后关闭
+        """
+        try:
+            self._buffer.release()
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+class ShardFile(_RecordFile):
+    """
+    以mmap方式打开的只读分片文件
+    
+    打开文件只读取头部，分片数据在访问时由操作系统按页加载，
+    因此打开耗时与数据库大小无关
+    """
+    
+    def __init__(self, path: str):
+        """
+        打开分片文件
+        
+        Args:
+            path: 分片文件路径
+        """
+        super().__init__(path)
+        
+        if len(self._buffer) < _HEADER_SIZE:
+            raise ValueError("分片文件头部不完整")
+        
+        magic, self.shard_count, self.record_count, key_id = struct.unpack_from(
+            _HEADER_FORMAT, self._buffer, 0
+        )
+        if magic == LEGACY_SHARD_FILE_MAGIC:
+            self.record_size = LEGACY_RECORD_SIZE
+        elif magic != SHARD_FILE_MAGIC:
+            raise ValueError("无效的分片文件")
+        if self.shard_count == 0 or self.shard_count & (self.shard_count - 1):
+            raise ValueError(f"分片数量不是2的幂: {self.shard_count}")
+        
+        self.prefix_bits = self.shard_count.bit_length() - 1
+        self.key_id: Optional[str] = key_id.hex() if any(key_id) else None
+        self._index_offset = _HEADER_SIZE
+        self._records_offset = _HEADER_SIZE + (self.shard_count + 1) * 8
+        
+        expected_size = self._records_offset + self.record_count * self.record_size
+        if len(self._buffer) != expected_size:
+            raise ValueError("分片文件大小与头部不一致")
+    
+    def _index_at(self, shard_index: int) -> int:
+        return struct.unpack_from("<Q", self._buffer, self._index_offset + shard_index * 8)[0]
+    
+    def get_record_range(self, shard_index: int, prefix_bits: int) -> Tuple[int, int]:
+        """
+        获取分片的记录区间
+        
+        位数不超过文件的分片前缀位数时直接读取索引，否则在所属分片内二分定位
+        
+        Args:
+            shard_index: 分片索引
+            prefix_bits: 分片前缀位数
+        
+        Returns:
+            (起始记录号, 结束记录号)
+        """
+        if not 0 <= shard_index < 1 << prefix_bits:
+            return 0, 0
+        
+        if prefix_bits > self.prefix_bits:
+            file_shard = shard_index >> (prefix_bits - self.prefix_bits)
+            return self._search_range(shard_index, prefix_bits, self._index_at(file_shard),
+                                      self._index_at(file_shard + 1))
+        
+        shift = self.prefix_bits - prefix_bits
+        return self._index_at(shard_index << shift), self._index_at((shard_index + 1) << shift)
+    
+    def get_shard_sizes(self, prefix_bits: int) -> Dict[int, int]:
+        """
+        获取所有非空分片的记录数量
+        
+        Args:
+            prefix_bits: 分片前缀位数，与文件的位数不同时逐条统计
+        
+        Returns:
+            {分片索引: 记录数量}
+        """
+        if prefix_bits != self.prefix_bits:
+            return super().get_shard_sizes(prefix_bits)
+        
+        index = array('Q')
+        index.frombytes(self._buffer[self._index_offset:self._records_offset])
+        if sys.byteorder != 'little':
+            index.byteswap()
+        
+        return {
+            shard_index: index[shard_index + 1] - index[shard_index]
+            for shard_index in range(self.shard_count)
+            if index[shard_index + 1] > index[shard_index]
+        }
+
+
+class SegmentFile(_RecordFile):
+    """
+    以mmap方式打开的只读增量段文件
+    
+    段文件没有分片索引，按分片查找时在排序记录上二分定位
+    """
+    
+    def __init__(self, path: str):
+        """
+        打开增量段文件
+        
+        Args:
+            path: 段文件路径
+        """
+        super().__init__(path)
+        
+        if len(self._buffer) < _SEGMENT_HEADER_SIZE:
+            raise ValueError("段文件头部不完整")
+        
+        magic, self.record_count = struct.unpack_from(_SEGMENT_HEADER_FORMAT, self._buffer, 0)
+        if magic == LEGACY_SEGMENT_FILE_MAGIC:
+            self.record_size = LEGACY_RECORD_SIZE
+        elif magic != SEGMENT_FILE_MAGIC:
+            raise ValueError("无效的段文件")
+        
+        self._records_offset = _SEGMENT_HEADER_SIZE
+        if len(self._buffer) != self._records_offset + self.record_count * self.record_size:
+            raise ValueError("段文件大小与头部不一致")
+
+
+def sync_directory(path: str):
+    """
+    将目录项的修改（文件创建、重命名）刷新到磁盘
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomically(path: str, write_function: Callable[[BinaryIO], None]):
+    """
+    先写临时文件并刷盘，再原子替换目标文件
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write_function(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_shard_file(path: str, shard_count: int, key_id: Optional[str],
+                     get_records: Callable[[int], bytes]):
+    """
+    写入分片文件（先写临时文件再原子替换）
+    
+    Args:
+        path: 分片文件路径
+        shard_count: 分片数量
+        key_id: 生成盲化哈希的服务器密钥标识
+        get_records: 按分片索引返回该分片排序后的记录字节
+    """
+    key_id_bytes = bytes.fromhex(key_id) if key_id else bytes(KEY_ID_SIZE)
+    if len(key_id_bytes) != KEY_ID_SIZE:
+        raise ValueError("无效的密钥标识")
+    
+    def write(f: BinaryIO):
+        index = array('Q', [0])
+        
+        # 先写记录，头部和索引在记录写完后回填
+        f.seek(_HEADER_SIZE + (shard_count + 1) * 8)
+        record_count = 0
+        for shard_index in range(shard_count):
+            records = get_records(shard_index)
+            if len(records) % RECORD_SIZE:
+                raise ValueError(f"分片 {shard_index} 的记录长度无效")
+            f.write(records)
+            record_count += len(records) // RECORD_SIZE
+            index.append(record_count)
+        
+        if sys.byteorder != 'little':
+            index.byteswap()
+        
+        f.seek(0)
+        f.write(struct.pack(_HEADER_FORMAT, SHARD_FILE_MAGIC, shard_count,
+                            record_count, key_id_bytes))
+        f.write(index.tobytes())
+    
+    _write_atomically(path, write)
+
+
+def write_segment_file(path: str, records: List[bytes]):
+    """
+    写入增量段文件（先写临时文件再原子替换）
+    
+    Args:
+        path: 段文件路径
+        records: 定长记录列表，写入前按凭证哈希排序
+    """
+    def write(f: BinaryIO):
+        f.write(struct.pack(_SEGMENT_HEADER_FORMAT, SEGMENT_FILE_MAGIC, len(records)))
+        f.write(b''.join(sorted(records)))
+    
+    _write_atomically(path, write)
@@ -1,28 +1,90 @@
 import os
 import pickle
 import json
-from typing import Dict, List, Optional, Tuple
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from collections import defaultdict
-from ..utils.constants import SHARD_COUNT, SHARD_PREFIX_LENGTH
-from ..crypto.argon2_hash import Argon2Hasher
+from ..utils.constants import DEFAULT_SHARD_PREFIX_BITS, MAX_SHARD_PREFIX_BITS_DEFICIT
+from ..utils.sharding import (
+    choose_prefix_bits, get_shard_count, get_shard_index, validate_prefix_bits
+)
+from .shard_file import (
+    ShardFile, SegmentFile, write_shard_file, write_segment_file, sync_directory,
+    HASH_SIZE, POINT_SIZE, MAPPED_POINT_SIZE, RECORD_SIZE, NO_MAPPED_POINT
+)
+
+
+# 清单文件：记录当前生效的分片文件、增量段文件、分片前缀位数和密钥版本，通过原子替换切换
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 2
+# 版本1的清单没有记录分片前缀位数（固定16位）
+SUPPORTED_MANIFEST_VERSIONS = (1, MANIFEST_VERSION)
+
+# 没有清单时使用的单一分片文件名
+SHARD_FILE_NAME = "shards.bin"
+
+# 分片文件和增量段文件的文件名前缀
+BASE_FILE_PREFIX = "shards-"
+SEGMENT_FILE_PREFIX = "segment-"
+
+# 旧版本的pickle格式文件（加载时自动迁移）
+LEGACY_SHARD_FILES = ["shards.pkl", "blinded_shards.pkl", "blinding_key.json"]
+
+# 增量段数量达到该值时在后台合并进分片文件
+COMPACTION_SEGMENT_THRESHOLD = 8
 
 
 class ShardManager:
     """
     分片管理器，负责管理泄露数据库的分片存储和检索
+    
+    已保存的数据由一个按凭证哈希排序的分片文件和若干增量段文件组成，均以mmap方式只读打开；
+    新添加的条目先保存在内存中，每次 save_shards 追加写入一个增量段，
+    增量段积累到一定数量后在后台线程中合并进新的分片文件
+    
+    分片前缀位数（prefix_bits）记录在清单中；指定target_shard_size时，
+    平均分片大小偏离目标过多会触发重新分片，由同一次流式合并写入新位数的分片文件
     """
     
-    def __init__(self, storage_path: str = "shards"):
+    def __init__(self, storage_path: str = "shards",
+                 compaction_threshold: int = COMPACTION_SEGMENT_THRESHOLD,
+                 target_shard_size: Optional[int] = None):
         """
         初始化分片管理器
         
         Args:
             storage_path: 分片存储路径
+            compaction_threshold: 触发后台合并的增量段数量
+            target_shard_size: 目标平均分片条目数，为None时不自动调整分片前缀位数
         """
         self.storage_path = storage_path
-        self.hasher = Argon2Hasher()
-        self.shards: Dict[int, List[bytes]] = defaultdict(list)
-        self.blinded_shards: Dict[int, List[bytes]] = defaultdict(list)
+        self.compaction_threshold = compaction_threshold
+        self.target_shard_size = target_shard_size
+        
+        # 当前分片布局的前缀位数（从清单加载）
+        self.prefix_bits = DEFAULT_SHARD_PREFIX_BITS
+        
+        # 已保存的文件：(分片文件, 增量段文件元组)，整体替换以保证查询看到一致的组合
+        self._files: Tuple[Optional[ShardFile], Tuple[SegmentFile, ...]] = (None, ())
+        
+        # 尚未保存的新增条目
+        self.pending_shards: Dict[int, List[bytes]] = defaultdict(list)
+        self.pending_blinded_shards: Dict[int, List[bytes]] = defaultdict(list)
+        self.pending_mapped_points: Dict[int, List[bytes]] = defaultdict(list)
+        
+        # 未保存条目的去重索引；已保存的记录按哈希排序，用二分查找去重
+        self._pending_hashes: Set[bytes] = set()
+        
+        # 生成盲化分片所用的服务器密钥标识，以及密钥版本（每次重新盲化后加一）
+        self.blinding_key_id: Optional[str] = None
+        self.key_epoch = 0
+        
+        # 保存或合并分片时计算的统计信息，统计需要遍历所有分片，不在每次请求时重新计算
+        self._statistics: Optional[Dict[str, Dict]] = None
+        
+        self._next_file_id = 1
+        self._lock = threading.RLock()
+        self._compaction_thread: Optional[threading.Thread] = None
         
         # 创建存储目录
         os.makedirs(storage_path, exist_ok=True)
@@ -30,47 +92,395 @@ class ShardManager:
         # 加载现有分片
         self._load_shards()
     
-    def add_credential(self, credential_hash: bytes, blinded_hash: bytes):
+    @property
+    def shard_file(self) -> Optional[ShardFile]:
+        """
+        当前生效的分片文件
+        """
+        return self._files[0]
+    
+    @property
+    def segment_files(self) -> Tuple[SegmentFile, ...]:
+        """
+        尚未合并的增量段文件
+        """
+        return self._files[1]
+    
+    def _saved_files(self) -> List:
+        base, segments = self._files
+        return ([base] if base is not None else []) + list(segments)
+    
+    @staticmethod
+    def _check_entry(credential_hash: bytes, blinded_hash: bytes, mapped_point: Optional[bytes]) -> bytes:
+        """
+        检查条目各字段的长度，返回要保存的映射点（未提供时为全零）
+        """
+        if len(credential_hash) != HASH_SIZE or len(blinded_hash) != POINT_SIZE:
+            raise ValueError("凭证哈希或盲化哈希长度无效")
+        if mapped_point is None:
+            return NO_MAPPED_POINT
+        if len(mapped_point) != MAPPED_POINT_SIZE:
+            raise ValueError("映射点长度无效")
+        return bytes(mapped_point)
+    
+    def add_credential(self, credential_hash: bytes, blinded_hash: bytes,
+                       mapped_point: Optional[bytes] = None) -> bool:
         """
         添加凭证到对应分片
         
+        去重检查对未保存条目是集合查找，对已保存文件是排序记录上的二分查找，
+        不随分片大小线性增长。持有锁计算分片索引并写入未保存条目，
+        与后台合并切换分片前缀位数互斥
+        
         Args:
             credential_hash: 原始凭证哈希
             blinded_hash: 盲化后的凭证哈希
+            mapped_point: 凭证哈希映射到的曲线点（重新盲化时使用），为None时不缓存
+            
+        Returns:
+            是否为新增条目（已存在的凭证不会重复添加）
         """
-        # 获取分片索引
-        shard_index = self.hasher.get_shard_index(credential_hash)
+        mapped_point = self._check_entry(credential_hash, blinded_hash, mapped_point)
+        credential_hash = bytes(credential_hash)
         
-        # 添加到对应分片
-        if credential_hash not in self.shards[shard_index]:
-            self.shards[shard_index].append(credential_hash)
-            self.blinded_shards[shard_index].append(blinded_hash)
+        with self._lock:
+            if credential_hash in self._pending_hashes:
+                return False
+            
+            # 获取分片索引
+            shard_index = get_shard_index(credential_hash, self.prefix_bits)
+            
+            for saved_file in self._saved_files():
+                if saved_file.contains_hash(credential_hash, self.prefix_bits):
+                    return False
+            
+            # 添加到对应分片
+            self._add_pending(shard_index, credential_hash, bytes(blinded_hash), mapped_point)
+            return True
     
-    def get_shard_data(self, shard_prefix: bytes) -> List[bytes]:
+    def add_credentials(self, entries: Iterable[Tuple[bytes, ...]]) -> int:
+        """
+        批量添加凭证到对应分片
+        
+        批内先去重并按哈希排序，使对已保存文件的查找按顺序访问映射内存；
+        与 add_credential 相同，写入未保存条目时持有锁
+        
+        Args:
+            entries: 条目列表 [(credential_hash, blinded_hash[, mapped_point]), ...]
+            
+        Returns:
+            新增的条目数量
+        """
+        batch = {}
+        for credential_hash, blinded_hash, *mapped_point in entries:
+            mapped_point = self._check_entry(credential_hash, blinded_hash,
+                                             mapped_point[0] if mapped_point else None)
+            batch.setdefault(bytes(credential_hash), (bytes(blinded_hash), mapped_point))
+        
+        added = 0
+        with self._lock:
+            saved_files = self._saved_files()
+            for credential_hash in sorted(batch):
+                if credential_hash in self._pending_hashes:
+                    continue
+                shard_index = get_shard_index(credential_hash, self.prefix_bits)
+                if any(saved_file.contains_hash(credential_hash, self.prefix_bits)
+                       for saved_file in saved_files):
+                    continue
+                self._add_pending(shard_index, credential_hash, *batch[credential_hash])
+                added += 1
+        return added
+    
+    def _add_pending(self, shard_index: int, credential_hash: bytes, blinded_hash: bytes,
+                     mapped_point: bytes):
+        self.pending_shards[shard_index].append(credential_hash)
+        self.pending_blinded_shards[shard_index].append(blinded_hash)
+        self.pending_mapped_points[shard_index].append(mapped_point)
+        self._pending_hashes.add(credential_hash)
+    
+    def _clear_pending(self):
+        # 换成新的字典而不是原地清空，查询持有的快照（旧文件和旧的未保存条目）保持一致
+        self.pending_shards = defaultdict(list)
+        self.pending_blinded_shards = defaultdict(list)
+        self.pending_mapped_points = defaultdict(list)
+        self._pending_hashes = set()
+    
+    def validate_query_prefix(self, shard_prefix: bytes, prefix_bits: Optional[int] = None) -> int:
+        """
+        验证查询的分片前缀
+        
+        前缀位数可以多于数据库的分片前缀位数（只返回匹配更长前缀的条目），
+        也可以少若干位（返回多个相邻分片），但最多少 MAX_SHARD_PREFIX_BITS_DEFICIT 位
+        
+        Args:
+            shard_prefix: 分片前缀
+            prefix_bits: 前缀的有效位数，为None时按前缀字节数计算（旧版本客户端）
+            
+        Returns:
+            前缀的有效位数
+        """
+        if prefix_bits is None:
+            prefix_bits = len(shard_prefix) * 8
+        validate_prefix_bits(prefix_bits)
+        get_shard_index(shard_prefix, prefix_bits)
+        
+        if prefix_bits < self.prefix_bits - MAX_SHARD_PREFIX_BITS_DEFICIT:
+            raise ValueError(
+                f"分片前缀只有 {prefix_bits} 位，数据库当前使用 {self.prefix_bits} 位，"
+                f"请从 /info 获取分片前缀位数"
+            )
+        return prefix_bits
+    
+    @staticmethod
+    def _get_pending(shard_index: int, prefix_bits: int, blinded: bool, pending_prefix_bits: int,
+                     pending_shards: Dict[int, List[bytes]],
+                     pending_blinded_shards: Dict[int, List[bytes]]) -> List[bytes]:
+        """
+        获取未保存条目中匹配分片前缀的条目（未保存条目按 pending_prefix_bits 位分组）
+        
+        只使用调用方在锁内取得的快照，不读取可能被合并线程替换的属性
+        """
+        shards = pending_blinded_shards if blinded else pending_shards
+        
+        if prefix_bits < pending_prefix_bits:
+            shift = pending_prefix_bits - prefix_bits
+            return [
+                item
+                for pending_index in range(shard_index << shift, (shard_index + 1) << shift)
+                for item in shards.get(pending_index, ())
+            ]
+        
+        pending_index = shard_index >> (prefix_bits - pending_prefix_bits)
+        items = shards.get(pending_index)
+        if not items or prefix_bits == pending_prefix_bits:
+            return list(items or ())
+        return [
+            item
+            for credential_hash, item in zip(pending_shards.get(pending_index, ()), items)
+            if get_shard_index(credential_hash, prefix_bits) == shard_index
+        ]
+    
+    def _get_shard(self, shard_prefix: bytes, blinded: bool,
+                   prefix_bits: Optional[int] = None) -> Sequence[bytes]:
+        """
+        合并分片文件、增量段和未保存条目中的分片数据
+        
+        记录在每个文件中都按凭证哈希排序，任意位数的前缀都对应连续的记录区间；
+        只有分片文件包含该分片时直接返回文件的零拷贝视图。
+        已保存文件的视图、分片前缀位数和未保存条目在锁内一次取得快照，
+        保存和合并只会整体替换这些属性，查询不会看到新旧混合的组合
+        """
+        prefix_bits = self.validate_query_prefix(shard_prefix, prefix_bits)
+        shard_index = get_shard_index(shard_prefix, prefix_bits)
+        
+        parts = []
+        with self._lock:
+            # 在锁内取得文件视图，保存或合并不会在取得视图之前关闭这些文件
+            for saved_file in self._saved_files():
+                if blinded:
+                    view = saved_file.get_blinded_hashes(shard_index, prefix_bits)
+                else:
+                    view = saved_file.get_hashes(shard_index, prefix_bits)
+                if len(view) > 0:
+                    parts.append(view)
+            pending_snapshot = (self.prefix_bits, self.pending_shards, self.pending_blinded_shards)
+        
+        pending = self._get_pending(shard_index, prefix_bits, blinded, *pending_snapshot)
+        if pending:
+            parts.append(pending)
+        
+        if not parts:
+            return []
+        if len(parts) == 1:
+            return parts[0]
+        return [item for part in parts for item in part]
+    
+    def get_shard_data(self, shard_prefix: bytes, prefix_bits: Optional[int] = None) -> Sequence[bytes]:
         """
         获取指定分片的原始数据
         
         Args:
             shard_prefix: 分片前缀
+            prefix_bits: 前缀的有效位数，为None时按前缀字节数计算
             
         Returns:
             分片中的所有原始凭证哈希
         """
-        shard_index = int.from_bytes(shard_prefix, byteorder='big')
-        return self.shards.get(shard_index, [])
+        return self._get_shard(shard_prefix, False, prefix_bits)
     
-    def get_blinded_shard_data(self, shard_prefix: bytes) -> List[bytes]:
+    def get_blinded_shard_data(self, shard_prefix: bytes,
+                               prefix_bits: Optional[int] = None) -> Sequence[bytes]:
         """
         获取指定分片的盲化数据
         
         Args:
             shard_prefix: 分片前缀
+            prefix_bits: 前缀的有效位数，为None时按前缀字节数计算
             
         Returns:
             分片中的所有盲化凭证哈希
         """
-        shard_index = int.from_bytes(shard_prefix, byteorder='big')
-        return self.blinded_shards.get(shard_index, [])
+        return self._get_shard(shard_prefix, True, prefix_bits)
+    
+    def has_credentials(self) -> bool:
+        """
+        分片中是否有任何凭证
+        """
+        if any(saved_file.record_count > 0 for saved_file in self._saved_files()):
+            return True
+        return any(self.pending_shards.values())
+    
+    def get_shard_sizes(self) -> Dict[int, int]:
+        """
+        获取所有非空分片的条目数量
+        
+        Returns:
+            {分片索引: 条目数量}
+        """
+        sizes = {}
+        for saved_file in self._saved_files():
+            for shard_index, size in saved_file.get_shard_sizes(self.prefix_bits).items():
+                sizes[shard_index] = sizes.get(shard_index, 0) + size
+        for shard_index, shard in self.pending_shards.items():
+            if shard:
+                sizes[shard_index] = sizes.get(shard_index, 0) + len(shard)
+        return sizes
+    
+    def _get_pending_records(self, shard_index: int) -> List[bytes]:
+        pending = self.pending_shards.get(shard_index) or []
+        return [
+            credential_hash + blinded_hash + mapped_point
+            for credential_hash, blinded_hash, mapped_point in zip(
+                pending, self.pending_blinded_shards[shard_index], self.pending_mapped_points[shard_index]
+            )
+        ]
+    
+    @staticmethod
+    def _merge_records(saved_files: List, shard_index: int, prefix_bits: int,
+                       extra_records: Optional[List[bytes]] = None) -> bytes:
+        """
+        合并多个文件中同一分片的记录，按凭证哈希排序
+        """
+        chunks = [saved_file.get_records(shard_index, prefix_bits) for saved_file in saved_files]
+        chunks = [chunk for chunk in chunks if chunk]
+        if not extra_records and len(chunks) <= 1:
+            return chunks[0] if chunks else b''
+        
+        records = [chunk[i:i + RECORD_SIZE] for chunk in chunks for i in range(0, len(chunk), RECORD_SIZE)]
+        records.extend(extra_records or [])
+        records.sort()
+        return b''.join(records)
+    
+    def _allocate_path(self, prefix: str) -> Tuple[str, str]:
+        name = f"{prefix}{self._next_file_id:06d}.bin"
+        self._next_file_id += 1
+        return name, os.path.join(self.storage_path, name)
+    
+    def _write_manifest(self):
+        """
+        写入清单文件（先写临时文件并刷盘，再原子替换）
+        
+        数据文件总是在清单引用它之前写完并刷盘，因此任何时刻崩溃后
+        清单引用的都是完整的文件，未被引用的文件在下次加载时清理
+        """
+        base, segments = self._files
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "key_id": self.blinding_key_id,
+            "key_epoch": self.key_epoch,
+            "prefix_bits": self.prefix_bits,
+            "base": os.path.basename(base.path) if base is not None else None,
+            "segments": [os.path.basename(segment.path) for segment in segments],
+            "next_file_id": self._next_file_id
+        }
+        
+        manifest_file = os.path.join(self.storage_path, MANIFEST_FILE_NAME)
+        tmp_file = f"{manifest_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, manifest_file)
+        sync_directory(self.storage_path)
+    
+    def _retire_files(self, old_files: List):
+        """
+        关闭并删除已不再被清单引用的文件
+        """
+        for old_file in old_files:
+            old_file.close()
+            if os.path.exists(old_file.path):
+                os.remove(old_file.path)
+    
+    def _write_base_file(self, get_records: Callable[[int], bytes]):
+        """
+        写入新的分片文件，替换当前的分片文件和全部增量段（调用方持有锁）
+        """
+        name, path = self._allocate_path(BASE_FILE_PREFIX)
+        write_shard_file(path, get_shard_count(self.prefix_bits), self.blinding_key_id, get_records)
+        sync_directory(self.storage_path)
+        
+        old_files = self._saved_files()
+        self._files = (ShardFile(path), ())
+        self._clear_pending()
+        self._write_manifest()
+        
+        # 旧映射可能仍被正在处理的查询引用，由close在无引用时才真正关闭
+        self._retire_files(old_files)
+    
+    def rebuild_blinded_shards(self, blind_shards: Callable[[Iterable[bytes]], Iterator[bytes]],
+                               key_id: str, on_switch: Optional[Callable[[], None]] = None):
+        """
+        使用新的服务器密钥重新盲化所有分片，写入新的分片文件后原子切换，密钥版本加一
+        
+        各分片合并后的记录按分片索引顺序交给blind_shards（例如 BulkBlinder.blind_shards），
+        它按相同顺序产出重新盲化后的记录，直接流式写入新的分片文件；
+        写入期间不持有锁，查询继续使用旧密钥的分片。调用方需保证期间没有其他写入
+        
+        Args:
+            blind_shards: 批量盲化函数，输入各分片的记录，按顺序产出盲化后的记录
+            key_id: 新服务器密钥的标识
+            on_switch: 切换到新分片文件后、释放锁之前调用，用于同时切换查询使用的服务器密钥
+        """
+        self.wait_for_compaction()
+        
+        with self._lock:
+            saved_files = self._files
+            prefix_bits = self.prefix_bits
+            pending_count = len(self._pending_hashes)
+            pending_records = {
+                shard_index: self._get_pending_records(shard_index)
+                for shard_index in list(self.pending_shards)
+            }
+            name, path = self._allocate_path(BASE_FILE_PREFIX)
+        
+        snapshot = ([saved_files[0]] if saved_files[0] is not None else []) + list(saved_files[1])
+        merged_shards = (
+            self._merge_records(snapshot, shard_index, prefix_bits, pending_records.get(shard_index))
+            for shard_index in range(get_shard_count(prefix_bits))
+        )
+        blinded_shards = blind_shards(merged_shards)
+        write_shard_file(path, get_shard_count(prefix_bits), key_id,
+                         lambda shard_index: next(blinded_shards))
+        sync_directory(self.storage_path)
+        
+        with self._lock:
+            if (self._files is not saved_files or self.prefix_bits != prefix_bits
+                    or len(self._pending_hashes) != pending_count):
+                os.remove(path)
+                raise RuntimeError("重新盲化期间分片数据被修改，已放弃新的分片文件")
+            
+            # 先递增密钥版本再替换文件，查询据此发现切换并按新密钥重做
+            self.key_epoch += 1
+            self.blinding_key_id = key_id
+            self._files = (ShardFile(path), ())
+            self._clear_pending()
+            if on_switch is not None:
+                on_switch()
+            
+            self._write_manifest()
+            self._retire_files(snapshot)
+            self._save_statistics()
     
     def get_shard_statistics(self) -> Dict[str, int]:
         """
@@ -79,78 +489,388 @@ class ShardManager:
         Returns:
             分片统计信息
         """
-        total_credentials = sum(len(shard) for shard in self.shards.values())
-        non_empty_shards = sum(1 for shard in self.shards.values() if len(shard) > 0)
+        return self._summarize_shard_sizes(self.get_shard_sizes())
+    
+    def _summarize_shard_sizes(self, sizes: Dict[int, int]) -> Dict[str, int]:
+        total_credentials = sum(sizes.values())
+        non_empty_shards = len(sizes)
         
         return {
             "total_credentials": total_credentials,
-            "total_shards": SHARD_COUNT,
+            "prefix_bits": self.prefix_bits,
+            "total_shards": get_shard_count(self.prefix_bits),
             "non_empty_shards": non_empty_shards,
             "average_shard_size": total_credentials / non_empty_shards if non_empty_shards > 0 else 0,
-            "max_shard_size": max(len(shard) for shard in self.shards.values()) if self.shards else 0
+            "max_shard_size": max(sizes.values()) if sizes else 0
         }
     
+    def get_cached_statistics(self) -> Dict[str, Dict]:
+        """
+        获取缓存的分片统计信息和分片大小分布
+        
+        统计在保存、合并和重新盲化分片时计算，不包括之后添加的未保存条目；
+        尚未计算过（如刚重新加载）时计算一次
+        
+        Returns:
+            {"shard_statistics": 分片统计信息, "size_distribution": 分片大小分布}
+        """
+        with self._lock:
+            if self._statistics is None:
+                self._statistics = self._compute_statistics()
+            return self._statistics
+    
+    def _compute_statistics(self) -> Dict[str, Dict]:
+        sizes = self.get_shard_sizes()
+        return {
+            "shard_statistics": self._summarize_shard_sizes(sizes),
+            "size_distribution": self._summarize_size_distribution(sizes)
+        }
+    
+    def _save_statistics(self):
+        self._statistics = self._compute_statistics()
+        stats_file = os.path.join(self.storage_path, "statistics.json")
+        with open(stats_file, 'w') as f:
+            json.dump(self._statistics["shard_statistics"], f, indent=2)
+    
     def save_shards(self):
         """
         保存分片到磁盘
+        
+        未保存的条目排序后追加写入一个新的增量段文件，再原子替换清单，
+        耗时只与新增条目数量有关；增量段过多或平均分片大小偏离目标过多时触发后台合并
         """
         try:
-            # 保存原始分片
-            shards_file = os.path.join(self.storage_path, "shards.pkl")
-            with open(shards_file, 'wb') as f:
-                pickle.dump(dict(self.shards), f)
-            
-            # 保存盲化分片
-            blinded_shards_file = os.path.join(self.storage_path, "blinded_shards.pkl")
-            with open(blinded_shards_file, 'wb') as f:
-                pickle.dump(dict(self.blinded_shards), f)
-            
-            # 保存统计信息
-            stats_file = os.path.join(self.storage_path, "statistics.json")
-            with open(stats_file, 'w') as f:
-                json.dump(self.get_shard_statistics(), f, indent=2)
+            with self._lock:
+                records = [
+                    record
+                    for shard_index in list(self.pending_shards)
+                    for record in self._get_pending_records(shard_index)
+                ]
+                
+                base, segments = self._files
+                if records and self.target_shard_size is not None and base is None and not segments:
+                    # 首次保存时按条目数选择分片前缀位数，直接写入分片文件
+                    self._set_prefix_bits(self.get_adaptive_prefix_bits())
+                    self._write_base_file(
+                        lambda shard_index: b''.join(sorted(self._get_pending_records(shard_index)))
+                    )
+                
+                elif records:
+                    name, path = self._allocate_path(SEGMENT_FILE_PREFIX)
+                    write_segment_file(path, records)
+                    sync_directory(self.storage_path)
+                    
+                    self._files = (base, segments + (SegmentFile(path),))
+                    self._clear_pending()
                 
+                self._write_manifest()
+                if records:
+                    self._save_statistics()
+                
+                # 新格式写入成功后删除旧版本文件
+                self._remove_files(LEGACY_SHARD_FILES)
+                
+                should_compact = (len(self.segment_files) >= self.compaction_threshold
+                                  or self.get_adaptive_prefix_bits() != self.prefix_bits)
+        
         except Exception as e:
             raise RuntimeError(f"保存分片失败: {e}")
+        
+        if should_compact:
+            self.compact_shards(background=True)
+    
+    def compact_shards(self, background: bool = False):
+        """
+        将增量段合并进新的分片文件，平均分片大小偏离目标过多时同时调整分片前缀位数
+        
+        Args:
+            background: 是否在后台线程中执行（已有合并在进行时不会重复启动）
+        """
+        if not background:
+            self.wait_for_compaction()
+            self._run_compaction()
+            return
+        
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(
+                target=self._run_compaction, name="shard-compaction", daemon=True
+            )
+            self._compaction_thread.start()
+    
+    def wait_for_compaction(self):
+        """
+        等待正在进行的后台合并完成
+        """
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
+    
+    def reshard(self, prefix_bits: int):
+        """
+        按新的分片前缀位数重写分片文件
+        
+        与合并相同，流式遍历一遍现有文件写入新的分片文件后原子切换清单，
+        期间查询和保存照常进行
+        
+        Args:
+            prefix_bits: 新的分片前缀位数
+        """
+        validate_prefix_bits(prefix_bits)
+        
+        # 重写期间分片文件被并发的合并替换时重试
+        while True:
+            self.wait_for_compaction()
+            if self._compact(prefix_bits):
+                return
+    
+    def get_adaptive_prefix_bits(self) -> int:
+        """
+        按当前条目数计算应使用的分片前缀位数
+        
+        平均分片大小在 [目标/4, 目标*2] 内时保持当前位数，避免在边界附近反复重新分片
+        
+        Returns:
+            分片前缀位数，未设置目标分片大小时返回当前位数
+        """
+        if self.target_shard_size is None:
+            return self.prefix_bits
+        
+        # 各文件之间以及与未保存条目之间已经去重，记录数之和即条目总数
+        record_count = (sum(saved_file.record_count for saved_file in self._saved_files())
+                        + len(self._pending_hashes))
+        average = record_count / get_shard_count(self.prefix_bits)
+        if self.target_shard_size / 4 <= average <= self.target_shard_size * 2:
+            return self.prefix_bits
+        return choose_prefix_bits(record_count, self.target_shard_size)
+    
+    def _set_prefix_bits(self, prefix_bits: int):
+        """
+        切换分片前缀位数，未保存条目按新位数重新分组（调用方持有锁）
+        """
+        if prefix_bits == self.prefix_bits:
+            return
+        
+        entries = [
+            entry
+            for shard_index in list(self.pending_shards)
+            for entry in zip(self.pending_shards[shard_index],
+                             self.pending_blinded_shards[shard_index],
+                             self.pending_mapped_points[shard_index])
+        ]
+        # 与 rebuild_blinded_shards 相同的未保存条目数检查：重新分组不能丢失条目
+        if len(entries) != len(self._pending_hashes):
+            raise RuntimeError(
+                f"未保存条目不一致（{len(entries)} / {len(self._pending_hashes)}），无法切换分片前缀位数"
+            )
+        
+        self.prefix_bits = prefix_bits
+        self._statistics = None
+        self.pending_shards = defaultdict(list)
+        self.pending_blinded_shards = defaultdict(list)
+        self.pending_mapped_points = defaultdict(list)
+        for credential_hash, blinded_hash, mapped_point in entries:
+            shard_index = get_shard_index(credential_hash, prefix_bits)
+            self.pending_shards[shard_index].append(credential_hash)
+            self.pending_blinded_shards[shard_index].append(blinded_hash)
+            self.pending_mapped_points[shard_index].append(mapped_point)
+    
+    def _run_compaction(self):
+        try:
+            self._compact(self.get_adaptive_prefix_bits())
+        except Exception as e:
+            print(f"警告: 合并分片失败: {e}")
     
-    def _load_shards(self):
+    def _compact(self, prefix_bits: int) -> bool:
+        """
+        合并当前的分片文件和增量段，写入prefix_bits位的分片文件
+        
+        合并期间不持有锁，查询和新的保存照常进行；
+        合并完成后只替换被合并的增量段，合并期间新写入的段保留
+        
+        Args:
+            prefix_bits: 新分片文件的分片前缀位数
+            
+        Returns:
+            是否完成（合并期间分片文件被其他操作替换时丢弃本次结果）
+        """
+        with self._lock:
+            base, segments = self._files
+            if not segments and prefix_bits == self.prefix_bits:
+                return True
+            if base is None and not segments:
+                # 没有已保存的文件，只需更改位数
+                self._set_prefix_bits(prefix_bits)
+                self._write_manifest()
+                return True
+            key_id = self.blinding_key_id
+            name, path = self._allocate_path(BASE_FILE_PREFIX)
+        
+        snapshot = ([base] if base is not None else []) + list(segments)
+        write_shard_file(
+            path, get_shard_count(prefix_bits), key_id,
+            lambda shard_index: self._merge_records(snapshot, shard_index, prefix_bits)
+        )
+        sync_directory(self.storage_path)
+        
+        with self._lock:
+            current_base, current_segments = self._files
+            if current_base is not base or key_id != self.blinding_key_id:
+                # 合并期间分片文件已被替换（如重新盲化），丢弃本次结果
+                os.remove(path)
+                return False
+            
+            remaining = tuple(segment for segment in current_segments if segment not in segments)
+            self._files = (ShardFile(path), remaining)
+            self._set_prefix_bits(prefix_bits)
+            self._write_manifest()
+            self._retire_files(snapshot)
+            self._save_statistics()
+        
+        return True
+    
+    def reload_shards(self):
+        """
+        重新加载磁盘上的分片（其他进程保存或合并分片后调用）
+        
+        只读取清单并打开其中的文件，不清理未引用的文件，
+        因为它们可能是写入进程正在生成的新文件
+        """
+        self.wait_for_compaction()
+        
+        with self._lock:
+            old_files = self._saved_files()
+            self._clear_pending()
+            self._load_shards(remove_unreferenced=False)
+            self._statistics = None
+            
+            for old_file in old_files:
+                old_file.close()
+    
+    def _load_shards(self, remove_unreferenced: bool = True):
         """
         从磁盘加载分片
+        
+        分片文件和增量段都以mmap方式打开，只读取头部，耗时与数据库大小无关
+        
+        Args:
+            remove_unreferenced: 是否清理未被清单引用的遗留文件
         """
         try:
-            # 加载原始分片
-            shards_file = os.path.join(self.storage_path, "shards.pkl")
-            if os.path.exists(shards_file):
-                with open(shards_file, 'rb') as f:
-                    loaded_shards = pickle.load(f)
-                    self.shards = defaultdict(list, loaded_shards)
-            
-            # 加载盲化分片
-            blinded_shards_file = os.path.join(self.storage_path, "blinded_shards.pkl")
-            if os.path.exists(blinded_shards_file):
-                with open(blinded_shards_file, 'rb') as f:
-                    loaded_blinded_shards = pickle.load(f)
-                    self.blinded_shards = defaultdict(list, loaded_blinded_shards)
-                    
+            manifest_file = os.path.join(self.storage_path, MANIFEST_FILE_NAME)
+            shard_file_path = os.path.join(self.storage_path, SHARD_FILE_NAME)
+            
+            if os.path.exists(manifest_file):
+                with open(manifest_file, 'r') as f:
+                    manifest = json.load(f)
+                if manifest.get("version") not in SUPPORTED_MANIFEST_VERSIONS:
+                    raise ValueError(f"不支持的清单版本: {manifest.get('version')}")
+                
+                base = None
+                if manifest["base"]:
+                    base = ShardFile(os.path.join(self.storage_path, manifest["base"]))
+                segments = tuple(
+                    SegmentFile(os.path.join(self.storage_path, name))
+                    for name in manifest["segments"]
+                )
+                self._files = (base, segments)
+                self.prefix_bits = manifest.get("prefix_bits", DEFAULT_SHARD_PREFIX_BITS)
+                self.blinding_key_id = manifest["key_id"]
+                self.key_epoch = manifest.get("key_epoch", 0)
+                self._next_file_id = manifest["next_file_id"]
+                if remove_unreferenced:
+                    self._remove_unreferenced_files(manifest)
+            
+            elif os.path.exists(shard_file_path):
+                self._files = (ShardFile(shard_file_path), ())
+                self.blinding_key_id = self.shard_file.key_id
+                self.prefix_bits = self.shard_file.prefix_bits
+            
+            else:
+                # 旧版本pickle格式按16位分片前缀分组
+                self.prefix_bits = DEFAULT_SHARD_PREFIX_BITS
+                self._load_legacy_shards()
+            
+            validate_prefix_bits(self.prefix_bits)
+            if self.shard_file is not None and self.shard_file.prefix_bits != self.prefix_bits:
+                raise ValueError(f"分片数量不匹配: {self.shard_file.shard_count}")
+        
         except Exception as e:
             print(f"警告: 加载分片失败: {e}")
             # 如果加载失败，使用空的分片
-            self.shards = defaultdict(list)
-            self.blinded_shards = defaultdict(list)
+            self._files = (None, ())
+            self.pending_shards = defaultdict(list)
+            self.pending_blinded_shards = defaultdict(list)
+            self.pending_mapped_points = defaultdict(list)
+            self._pending_hashes = set()
+            self.blinding_key_id = None
+            self.prefix_bits = DEFAULT_SHARD_PREFIX_BITS
     
-    def clear_all_shards(self):
+    def _remove_unreferenced_files(self, manifest: Dict):
         """
-        清空所有分片数据
+        清理崩溃遗留的、未被清单引用的数据文件和临时文件
         """
-        self.shards.clear()
-        self.blinded_shards.clear()
+        referenced = set(manifest["segments"])
+        if manifest["base"]:
+            referenced.add(manifest["base"])
         
-        # 删除磁盘文件
-        for filename in ["shards.pkl", "blinded_shards.pkl", "statistics.json"]:
+        for filename in os.listdir(self.storage_path):
+            is_data_file = filename.startswith((BASE_FILE_PREFIX, SEGMENT_FILE_PREFIX, SHARD_FILE_NAME))
+            if filename.endswith(".tmp") or (is_data_file and filename not in referenced):
+                os.remove(os.path.join(self.storage_path, filename))
+    
+    def _load_legacy_shards(self):
+        """
+        加载旧版本的pickle格式分片，作为未保存条目，下次保存时转换为新格式
+        """
+        shards_file = os.path.join(self.storage_path, "shards.pkl")
+        blinded_shards_file = os.path.join(self.storage_path, "blinded_shards.pkl")
+        if not (os.path.exists(shards_file) and os.path.exists(blinded_shards_file)):
+            return
+        
+        with open(shards_file, 'rb') as f:
+            self.pending_shards = defaultdict(list, pickle.load(f))
+        with open(blinded_shards_file, 'rb') as f:
+            self.pending_blinded_shards = defaultdict(list, pickle.load(f))
+        self.pending_mapped_points = defaultdict(list, {
+            shard_index: [NO_MAPPED_POINT] * len(shard)
+            for shard_index, shard in self.pending_shards.items()
+        })
+        self._pending_hashes = {h for shard in self.pending_shards.values() for h in shard}
+        
+        key_file = os.path.join(self.storage_path, "blinding_key.json")
+        if os.path.exists(key_file):
+            with open(key_file, 'r') as f:
+                self.blinding_key_id = json.load(f).get("key_id")
+        
+        print("检测到旧版本分片文件，将在下次保存时转换为新格式")
+    
+    def _remove_files(self, filenames: List[str]):
+        for filename in filenames:
             filepath = os.path.join(self.storage_path, filename)
             if os.path.exists(filepath):
                 os.remove(filepath)
     
+    def clear_all_shards(self):
+        """
+        清空所有分片数据
+        """
+        self.wait_for_compaction()
+        
+        with self._lock:
+            old_files = self._saved_files()
+            self._files = (None, ())
+            self._clear_pending()
+            self.blinding_key_id = None
+            self.prefix_bits = DEFAULT_SHARD_PREFIX_BITS
+            self._next_file_id = 1
+            self._statistics = None
+            
+            # 删除磁盘文件
+            self._remove_files([MANIFEST_FILE_NAME, "statistics.json"] + LEGACY_SHARD_FILES)
+            self._retire_files(old_files)
+    
     def get_shard_size_distribution(self) -> Dict[str, int]:
         """
         获取分片大小分布
@@ -158,8 +878,11 @@ class ShardManager:
         Returns:
             分片大小分布统计
         """
+        return self._summarize_size_distribution(self.get_shard_sizes())
+    
+    def _summarize_size_distribution(self, sizes: Dict[int, int]) -> Dict[str, int]:
         size_ranges = {
-            "0": 0,
+            "0": get_shard_count(self.prefix_bits) - len(sizes),
             "1-10": 0,
             "11-50": 0,
             "51-100": 0,
@@ -168,11 +891,8 @@ class ShardManager:
             "1000+": 0
         }
         
-        for shard in self.shards.values():
-            size = len(shard)
-            if size == 0:
-                size_ranges["0"] += 1
-            elif size <= 10:
+        for size in sizes.values():
+            if size <= 10:
                 size_ranges["1-10"] += 1
             elif size <= 50:
                 size_ranges["11-50"] += 1
@@ -198,11 +918,10 @@ class ShardManager:
             "statistics": self.get_shard_statistics(),
             "size_distribution": self.get_shard_size_distribution(),
             "shard_details": {
-                str(index): len(shard) 
-                for index, shard in self.shards.items() 
-                if len(shard) > 0
+                str(index): size
+                for index, size in sorted(self.get_shard_sizes().items())
             }
         }
         
         with open(output_file, 'w') as f:
-            json.dump(info, f, indent=2) 
\ No newline at end of file
+            json.dump(info, f, indent=2)
@@ -1,9 +1,18 @@
 import time
 import json
-from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify
+from typing import Dict, Any, List, Optional
+from flask import Flask, Response, request, jsonify
 from ..database.breach_db import BreachDatabase
-from ..utils.constants import DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT
+from ..database.shard_file import POINT_SIZE
+from .metrics import METRICS_CONTENT_TYPE, render_metrics
+from .prefork import PreforkServer
+from .query_stats import QueryStatistics
+from ..utils.constants import DEFAULT_SERVER_HOST, DEFAULT_SERVER_PORT, MAX_QUERY_BATCH_SIZE
+from ..utils.latency_histogram import timed_stage
+from ..utils.wire_format import (
+    BINARY_CONTENT_TYPE, JSON_CONTENT_TYPE, KEY_EPOCH_HEADER, SHARD_PREFIX_BITS_HEADER,
+    encode_batch_response, encode_query_response
+)
 
 
 class CheckupServer:
@@ -13,30 +22,58 @@ class CheckupServer:
     """
     
     def __init__(self, database_path: str = "breach_db", 
-                 server_private_key: Optional[bytes] = None):
+                 server_private_key: Optional[bytes] = None,
+                 argon2_profile: Optional[str] = None):
         """
         初始化服务器
         
         Args:
             database_path: 数据库存储路径
             server_private_key: 服务器私钥
+            argon2_profile: Argon2参数配置名称，为None时沿用数据库中记录的配置
         """
         self.app = Flask(__name__)
-        self.database = BreachDatabase(database_path, server_private_key)
+        self.database = BreachDatabase(database_path, server_private_key, argon2_profile)
         
-        # 统计信息
-        self.query_count = 0
-        self.total_query_time = 0.0
+        # 统计信息（多进程模式下替换为共享内存中的统计）
+        self.statistics = QueryStatistics()
         self.start_time = time.time()
         
+        # 多进程模式下数据库只读，管理端点被禁用
+        self.read_only = False
+        self.workers = 1
+        
         # 注册路由
         self._register_routes()
     
+    @property
+    def query_count(self) -> int:
+        return self.statistics.snapshot()[0]
+    
+    @property
+    def total_query_time(self) -> float:
+        return self.statistics.snapshot()[1]
+    
     def _register_routes(self):
         """
         注册Flask路由
         """
         
+        @self.app.before_request
+        def reject_admin_when_read_only():
+            """只读模式下拒绝修改数据库的管理端点"""
+            if self.read_only and request.path.startswith('/admin/'):
+                return jsonify({
+                    "error": "数据库为只读模式，请离线导入数据后发送SIGHUP重新加载"
+                }), 403
+        
+        @self.app.after_request
+        def add_shard_prefix_bits_header(response):
+            """查询响应（包括前缀位数不足的400错误）带有当前的分片前缀位数"""
+            if request.path in ('/query', '/query_batch'):
+                response.headers[SHARD_PREFIX_BITS_HEADER] = str(self.database.shard_prefix_bits)
+            return response
+        
         @self.app.route('/health', methods=['GET'])
         def health_check():
             """健康检查端点"""
@@ -56,6 +93,14 @@ class CheckupServer:
                     "version": "1.0.0",
                     "protocol": "Google Password Checkup",
                     "uptime": time.time() - self.start_time,
+                    "workers": self.workers,
+                    # 客户端必须使用相同的参数计算凭证哈希
+                    "argon2_profile": self.database.argon2_profile.to_dict(),
+                    # 客户端按当前的分片前缀位数发送分片前缀
+                    "shard_prefix_bits": self.database.shard_prefix_bits,
+                    # 服务器密钥版本，轮换期间新版本的分片在后台生成
+                    "key_epoch": self.database.key_epoch,
+                    "key_rotation_in_progress": self.database.key_rotation_in_progress,
                     "total_queries": self.query_count,
                     "average_query_time": (self.total_query_time / self.query_count 
                                          if self.query_count > 0 else 0)
@@ -66,7 +111,8 @@ class CheckupServer:
         @self.app.route('/query', methods=['POST'])
         def process_query():
             """处理密码检查查询"""
-            start_time = time.time()
+            start_time = time.perf_counter()
+            stage_times = {}
             
             try:
                 # 解析请求数据
@@ -80,33 +126,132 @@ class CheckupServer:
                 if not blinded_hash_hex or not shard_prefix_hex:
                     return jsonify({"error": "缺少必要参数"}), 400
                 
-                # 将十六进制字符串转换为字节
-                blinded_hash = bytes.fromhex(blinded_hash_hex)
-                shard_prefix = bytes.fromhex(shard_prefix_hex)
+                try:
+                    # 将十六进制字符串转换为字节
+                    blinded_hash = bytes.fromhex(blinded_hash_hex)
+                    shard_prefix = bytes.fromhex(shard_prefix_hex)
+                    
+                    # 可选的截断摘要模式和分片前缀位数
+                    digest_length = self._parse_digest_length(data)
+                    prefix_bits = self._parse_prefix_bits(data, [shard_prefix])
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                stage_times["parse"] = time.perf_counter() - start_time
                 
-                # 获取对应分片的数据
-                shard_data = self.database.shard_manager.get_shard_data(shard_prefix)
-                
-                # 使用PSI协议处理查询
-                double_blinded_hash, blinded_shard_data = self.database.psi_protocol.server_process_query(
-                    blinded_hash, shard_prefix, shard_data
+                # 双重盲化查询哈希并取出预先盲化的分片数据（响应中的密钥版本为实际使用的版本）
+                double_blinded_hash, blinded_shard_data, key_epoch = self.database.process_query(
+                    blinded_hash, shard_prefix, digest_length, prefix_bits, stage_times
                 )
                 
-                # 准备响应数据
-                response_data = {
-                    "double_blinded_hash": double_blinded_hash.hex(),
-                    "blinded_shard_data": [item.hex() for item in blinded_shard_data]
-                }
+                with timed_stage(stage_times, "serialization"):
+                    # 根据Accept头选择响应格式，默认JSON
+                    response_type = request.accept_mimetypes.best_match(
+                        [JSON_CONTENT_TYPE, BINARY_CONTENT_TYPE], default=JSON_CONTENT_TYPE
+                    )
+                    
+                    if response_type == BINARY_CONTENT_TYPE:
+                        response = Response(
+                            encode_query_response(double_blinded_hash, blinded_shard_data,
+                                                  digest_length or POINT_SIZE),
+                            mimetype=BINARY_CONTENT_TYPE
+                        )
+                    else:
+                        response_data = {
+                            "double_blinded_hash": double_blinded_hash.hex(),
+                            "blinded_shard_data": [item.hex() for item in blinded_shard_data],
+                            "key_epoch": key_epoch
+                        }
+                        if digest_length is not None:
+                            response_data["digest_length"] = digest_length
+                        response = jsonify(response_data)
+                    response.headers[KEY_EPOCH_HEADER] = str(key_epoch)
                 
                 # 更新统计信息
-                self.query_count += 1
-                self.total_query_time += time.time() - start_time
+                stage_times["request"] = time.perf_counter() - start_time
+                self.statistics.record(1, stage_times["request"], stage_times)
                 
-                return jsonify(response_data)
+                return response
                 
+            except ValueError as e:
+                # 盲化哈希不是有效的曲线点等客户端输入错误
+                return jsonify({"error": f"无效的查询参数: {e}"}), 400
             except Exception as e:
                 return jsonify({"error": f"处理查询时发生错误: {str(e)}"}), 500
         
+        @self.app.route('/query_batch', methods=['POST'])
+        def process_query_batch():
+            """批量处理密码检查查询"""
+            start_time = time.perf_counter()
+            stage_times = {}
+            
+            try:
+                data = request.get_json()
+                if not data:
+                    return jsonify({"error": "无效的请求数据"}), 400
+                
+                queries = data.get("queries")
+                if not queries or not isinstance(queries, list):
+                    return jsonify({"error": "缺少必要参数"}), 400
+                if len(queries) > MAX_QUERY_BATCH_SIZE:
+                    return jsonify({
+                        "error": f"单次批量查询最多 {MAX_QUERY_BATCH_SIZE} 条"
+                    }), 400
+                
+                try:
+                    digest_length = self._parse_digest_length(data)
+                    query_list = [
+                        (bytes.fromhex(query["blinded_hash"]), bytes.fromhex(query["shard_prefix"]))
+                        for query in queries
+                    ]
+                    prefix_bits = self._parse_prefix_bits(
+                        data, [shard_prefix for _, shard_prefix in query_list]
+                    )
+                except (KeyError, TypeError, ValueError) as e:
+                    return jsonify({"error": f"无效的查询参数: {e}"}), 400
+                stage_times["parse"] = time.perf_counter() - start_time
+                
+                # 相同分片只查找一次
+                double_blinded_hashes, shard_indices, shards, key_epoch = self.database.process_query_batch(
+                    query_list, digest_length, prefix_bits, stage_times
+                )
+                
+                with timed_stage(stage_times, "serialization"):
+                    response_type = request.accept_mimetypes.best_match(
+                        [JSON_CONTENT_TYPE, BINARY_CONTENT_TYPE], default=JSON_CONTENT_TYPE
+                    )
+                    
+                    if response_type == BINARY_CONTENT_TYPE:
+                        response = Response(
+                            encode_batch_response(double_blinded_hashes, shard_indices, shards,
+                                                  digest_length or POINT_SIZE),
+                            mimetype=BINARY_CONTENT_TYPE
+                        )
+                    else:
+                        response_data = {
+                            "results": [
+                                {"double_blinded_hash": double_blinded_hash.hex(), "shard": shard_index}
+                                for double_blinded_hash, shard_index in zip(double_blinded_hashes,
+                                                                            shard_indices)
+                            ],
+                            "shards": [[item.hex() for item in shard] for shard in shards],
+                            "key_epoch": key_epoch
+                        }
+                        if digest_length is not None:
+                            response_data["digest_length"] = digest_length
+                        response = jsonify(response_data)
+                    response.headers[KEY_EPOCH_HEADER] = str(key_epoch)
+                
+                # 更新统计信息（阶段耗时为整个批次的合计）
+                stage_times["request"] = time.perf_counter() - start_time
+                self.statistics.record(len(query_list), stage_times["request"], stage_times)
+                
+                return response
+                
+            except ValueError as e:
+                return jsonify({"error": f"无效的查询参数: {e}"}), 400
+            except Exception as e:
+                return jsonify({"error": f"处理批量查询时发生错误: {str(e)}"}), 500
+        
         @self.app.route('/statistics', methods=['GET'])
         def get_statistics():
             """获取服务器统计信息"""
@@ -118,9 +263,22 @@ class CheckupServer:
                                          if self.query_count > 0 else 0),
                     "uptime": time.time() - self.start_time
                 },
+                # 各处理阶段的请求数、平均耗时和P50/P95/P99（秒）
+                "latency": self.statistics.latency.summary(),
                 "database_stats": self.database.get_database_statistics()
             })
         
+        @self.app.route('/metrics', methods=['GET'])
+        def get_metrics():
+            """Prometheus格式的指标"""
+            return Response(render_metrics(self.statistics, {
+                "uptime_seconds": time.time() - self.start_time,
+                "workers": self.workers,
+                "key_epoch": self.database.key_epoch,
+                "key_rotation_in_progress": int(self.database.key_rotation_in_progress),
+                "shard_prefix_bits": self.database.shard_prefix_bits
+            }), content_type=METRICS_CONTENT_TYPE)
+        
         @self.app.route('/admin/add_breach', methods=['POST'])
         def add_breach_data():
             """管理员端点：添加泄露数据"""
@@ -166,6 +324,22 @@ class CheckupServer:
             except Exception as e:
                 return jsonify({"error": f"生成模拟数据时发生错误: {str(e)}"}), 500
         
+        @self.app.route('/admin/rotate_key', methods=['POST'])
+        def rotate_server_key():
+            """管理员端点：在后台轮换服务器密钥，完成前继续使用当前密钥"""
+            try:
+                # 新私钥在切换时由数据库保存，服务器重启后直接使用
+                self.database.rotate_server_key()
+            except RuntimeError as e:
+                return jsonify({"error": str(e)}), 409
+            except Exception as e:
+                return jsonify({"error": f"轮换服务器密钥时发生错误: {str(e)}"}), 500
+            
+            return jsonify({
+                "message": "已开始在后台轮换服务器密钥",
+                "key_epoch": self.database.key_epoch
+            }), 202
+        
         @self.app.route('/admin/clear_database', methods=['POST'])
         def clear_database():
             """管理员端点：清空数据库"""
@@ -183,8 +357,53 @@ class CheckupServer:
         def internal_error(error):
             return jsonify({"error": "服务器内部错误"}), 500
     
+    def _parse_digest_length(self, data: Dict[str, Any]) -> Optional[int]:
+        """
+        解析请求中的截断摘要长度
+        
+        Args:
+            data: 请求数据
+            
+        Returns:
+            截断摘要长度，未指定时返回None
+        """
+        digest_length = data.get("digest_length")
+        if digest_length is None:
+            return None
+        
+        try:
+            digest_length = int(digest_length)
+            self.database.psi_protocol.validate_digest_length(digest_length)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"无效的截断摘要长度: {e}")
+        
+        return digest_length
+    
+    def _parse_prefix_bits(self, data: Dict[str, Any], shard_prefixes: List[bytes]) -> Optional[int]:
+        """
+        解析请求中分片前缀的有效位数并验证分片前缀
+        
+        Args:
+            data: 请求数据
+            shard_prefixes: 请求中的分片前缀
+            
+        Returns:
+            分片前缀位数，未指定时返回None（旧版本客户端，按前缀字节数计算）
+        """
+        prefix_bits = data.get("prefix_bits")
+        if prefix_bits is not None:
+            try:
+                prefix_bits = int(prefix_bits)
+            except (TypeError, ValueError):
+                raise ValueError(f"无效的分片前缀位数: {prefix_bits}")
+        
+        for shard_prefix in shard_prefixes:
+            self.database.shard_manager.validate_query_prefix(shard_prefix, prefix_bits)
+        
+        return prefix_bits
+    
     def run(self, host: str = DEFAULT_SERVER_HOST, port: int = DEFAULT_SERVER_PORT, 
-            debug: bool = False):
+            debug: bool = False, workers: Optional[int] = None):
         """
         启动服务器
         
@@ -192,12 +411,16 @@ class CheckupServer:
             host: 主机地址
             port: 端口号
             debug: 是否启用调试模式
+            workers: 生产模式的工作进程数，为None时使用Flask开发服务器
         """
         print(f"启动Password Checkup服务器...")
         print(f"地址: http://{host}:{port}")
         print(f"数据库统计: {self.database.get_database_statistics()}")
         
-        self.app.run(host=host, port=port, debug=debug)
+        if workers is not None:
+            PreforkServer(self, host, port, workers).serve()
+        else:
+            self.app.run(host=host, port=port, debug=debug)
     
     def get_database_statistics(self) -> Dict[str, Any]:
         """
@@ -241,15 +464,17 @@ class CheckupServer:
 
 
 def create_server(database_path: str = "breach_db", 
-                 server_private_key: Optional[bytes] = None) -> CheckupServer:
+                 server_private_key: Optional[bytes] = None,
+                 argon2_profile: Optional[str] = None) -> CheckupServer:
     """
     创建服务器实例
     
     Args:
         database_path: 数据库路径
         server_private_key: 服务器私钥
+        argon2_profile: Argon2参数配置名称
         
     Returns:
         服务器实例
     """
-    return CheckupServer(database_path, server_private_key) 
\ No newline at end of file
+    return CheckupServer(database_path, server_private_key, argon2_profile) 
\ No newline at end of file
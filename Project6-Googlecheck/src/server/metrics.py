@@ -0,0 +1,68 @@
+from typing import Dict, List
+from .query_stats import QueryStatistics
+from ..utils.latency_histogram import DEFAULT_QUANTILES, LATENCY_BUCKETS
+
+
+# Prometheus文本格式的Content-Type
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 指标名称前缀
+METRICS_PREFIX = "password_checkup"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(statistics: QueryStatistics, gauges: Dict[str, float]) -> str:
+    """
+    按Prometheus文本格式导出服务器指标
+    
+    各处理阶段导出为累计桶计数的直方图（*_bucket / *_sum / *_count），
+    同时导出由桶计数估计的P50/P95/P99，便于不经过Prometheus直接查看
+    
+    Args:
+        statistics: 查询统计
+        gauges: 其他瞬时指标 {名称: 值}，名称自动加上前缀
+    
+    Returns:
+        指标文本
+    """
+    query_count, total_query_time = statistics.snapshot()
+    lines: List[str] = [
+        f"# HELP {METRICS_PREFIX}_queries_total 已处理的查询数",
+        f"# TYPE {METRICS_PREFIX}_queries_total counter",
+        f"{METRICS_PREFIX}_queries_total {query_count}",
+        f"# HELP {METRICS_PREFIX}_query_time_seconds_total 处理查询的累计耗时",
+        f"# TYPE {METRICS_PREFIX}_query_time_seconds_total counter",
+        f"{METRICS_PREFIX}_query_time_seconds_total {_format_value(total_query_time)}",
+    ]
+    
+    histogram = f"{METRICS_PREFIX}_stage_latency_seconds"
+    quantile_gauge = f"{METRICS_PREFIX}_stage_latency_quantile_seconds"
+    snapshots = {stage: statistics.latency.snapshot(stage) for stage in statistics.latency.stages}
+    
+    lines.append(f"# HELP {histogram} 各处理阶段的耗时")
+    lines.append(f"# TYPE {histogram} histogram")
+    for stage, (counts, total_time, count) in snapshots.items():
+        cumulative = 0
+        for upper, bucket_count in zip(LATENCY_BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'{histogram}_bucket{{stage="{stage}",le="{upper:.6g}"}} {cumulative}')
+        lines.append(f'{histogram}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{histogram}_sum{{stage="{stage}"}} {_format_value(total_time)}')
+        lines.append(f'{histogram}_count{{stage="{stage}"}} {count}')
+    
+    lines.append(f"# HELP {quantile_gauge} 由直方图估计的各处理阶段耗时分位数")
+    lines.append(f"# TYPE {quantile_gauge} gauge")
+    for stage, (counts, _, _) in snapshots.items():
+        for quantile in DEFAULT_QUANTILES:
+            value = statistics.latency.estimate_quantile(counts, quantile)
+            lines.append(f'{quantile_gauge}{{stage="{stage}",quantile="{quantile:g}"}} '
+                         f'{_format_value(value)}')
+    
+    for name, value in gauges.items():
+        lines.append(f"# TYPE {METRICS_PREFIX}_{name} gauge")
+        lines.append(f"{METRICS_PREFIX}_{name} {_format_value(value)}")
+    
+    return "\n".join(lines) + "\n"
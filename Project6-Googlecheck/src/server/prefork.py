@@ -0,0 +1,292 @@
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional, Set
+from werkzeug.serving import WSGIRequestHandler, make_server
+from .query_stats import QueryStatistics
+
+
+# 主进程检查工作进程状态和信号标志的间隔（秒）
+SUPERVISOR_INTERVAL = 0.2
+
+# 停止时等待工作进程处理完在途请求的最长时间（秒）
+GRACEFUL_TIMEOUT = 30
+
+# 监听队列长度
+LISTEN_BACKLOG = 1024
+
+# 空闲keep-alive连接的超时时间（秒），保证工作进程退出时不会被空闲连接阻塞
+KEEP_ALIVE_TIMEOUT = 5
+
+
+class _WorkerRequestHandler(WSGIRequestHandler):
+    """
+    工作进程的请求处理器：不逐条输出访问日志，服务器停止后不再复用连接
+    """
+    
+    timeout = KEEP_ALIVE_TIMEOUT
+    
+    def log_request(self, *args, **kwargs):
+        pass
+    
+    def handle_one_request(self):
+        super().handle_one_request()
+        if getattr(self.server, "stopping", False):
+            self.close_connection = True
+
+
+class PreforkServer:
+    """
+    多进程生产服务器
+    
+    主进程加载数据库并创建监听套接字后fork出多个工作进程，工作进程共享该套接字接受连接，
+    分片文件是以只读mmap方式打开的，fork后所有进程共享同一份页缓存；
+    查询统计保存在共享内存中，各工作进程的统计自动汇总
+    
+    信号:
+        SIGHUP: 重新加载数据库并启动新一批工作进程，旧工作进程处理完在途请求后退出
+        SIGUSR1: 在主进程的后台线程中轮换服务器密钥，期间工作进程继续使用旧密钥，
+            完成后同样启动新一批工作进程替换旧工作进程
+        SIGTERM / SIGINT: 优雅停止
+    """
+    
+    def __init__(self, server, host: str, port: int, workers: Optional[int] = None):
+        """
+        初始化多进程服务器
+        
+        Args:
+            server: CheckupServer实例（数据库已在主进程中加载）
+            host: 主机地址
+            port: 端口号
+            workers: 工作进程数，默认为CPU核数
+        """
+        self.server = server
+        self.host = host
+        self.port = port
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        
+        self._socket: Optional[socket.socket] = None
+        self._workers: Dict[int, int] = {}  # pid -> 工作进程编号
+        self._retiring: Set[int] = set()
+        self._reload_requested = False
+        self._rotate_requested = False
+        self._rotating_from_epoch: Optional[int] = None
+        self._stop_requested = False
+    
+    def serve(self):
+        """
+        启动工作进程并监督其运行，直到收到停止信号
+        """
+        # 工作进程只读共享数据库，统计放入共享内存
+        self.server.read_only = True
+        self.server.workers = self.workers
+        self.server.statistics = QueryStatistics(shared=True)
+        
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        self._socket = socket.create_server((self.host, self.port), family=family,
+                                            backlog=LISTEN_BACKLOG)
+        self._socket.set_inheritable(True)
+        
+        signal.signal(signal.SIGHUP, self._request_reload)
+        signal.signal(signal.SIGUSR1, self._request_key_rotation)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        
+        print(f"主进程 {os.getpid()} 启动 {self.workers} 个工作进程")
+        for index in range(self.workers):
+            self._spawn_worker(index)
+        
+        try:
+            while not self._stop_requested:
+                self._reap_workers()
+                if self._rotate_requested:
+                    self._rotate_requested = False
+                    self._start_key_rotation()
+                if self._rotating_from_epoch is not None:
+                    self._check_key_rotation()
+                elif self._reload_requested:
+                    # 密钥轮换期间推迟重新加载
+                    self._reload_requested = False
+                    self._reload()
+                time.sleep(SUPERVISOR_INTERVAL)
+        finally:
+            self._stop_workers(set(self._workers) | self._retiring)
+            self._socket.close()
+            print("服务器已停止")
+    
+    def _request_reload(self, signum, frame):
+        self._reload_requested = True
+    
+    def _request_key_rotation(self, signum, frame):
+        self._rotate_requested = True
+    
+    def _request_stop(self, signum, frame):
+        self._stop_requested = True
+    
+    def _spawn_worker(self, index: int):
+        """
+        fork一个工作进程
+        
+        Args:
+            index: 工作进程编号
+        """
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self._run_worker()
+            except BaseException as e:
+                print(f"工作进程 {os.getpid()} 异常退出: {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        
+        self._workers[pid] = index
+    
+    def _run_worker(self):
+        """
+        工作进程主循环：在共享的监听套接字上处理请求，收到SIGTERM后优雅退出
+        """
+        # 恢复继承自主进程的信号处理
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        
+        http_server = make_server(self.host, self.port, self.server.app, threaded=True,
+                                  request_handler=_WorkerRequestHandler,
+                                  fd=self._socket.fileno())
+        
+        # 关闭服务器时等待在途请求处理完成
+        http_server.daemon_threads = False
+        
+        def handle_stop(signum, frame):
+            # shutdown会等待serve_forever返回，必须在其他线程中调用
+            http_server.stopping = True
+            threading.Thread(target=http_server.shutdown, daemon=True).start()
+        
+        signal.signal(signal.SIGTERM, handle_stop)
+        
+        try:
+            http_server.serve_forever()
+        finally:
+            http_server.server_close()
+    
+    def _reap_workers(self):
+        """
+        回收已退出的工作进程，意外退出的工作进程会被重新启动
+        
+        只等待工作进程，主进程中的其他子进程（如密钥轮换使用的盲化进程池）由其所有者回收
+        """
+        for pid in list(self._workers) + list(self._retiring):
+            try:
+                finished_pid, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                finished_pid, status = pid, None
+            if finished_pid == 0:
+                continue
+            
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+            elif pid in self._workers:
+                index = self._workers.pop(pid)
+                if not self._stop_requested:
+                    print(f"工作进程 {pid} 意外退出 (状态 {status})，重新启动")
+                    self._spawn_worker(index)
+    
+    def _reload(self):
+        """
+        重新加载数据库并替换所有工作进程
+        
+        新工作进程从重新加载后的主进程fork，启动后立即在同一监听套接字上接受连接，
+        旧工作进程收到SIGTERM后不再接受新连接，处理完在途请求后退出
+        """
+        print("收到SIGHUP，重新加载数据库...")
+        try:
+            self.server.database.reload()
+        except Exception as e:
+            print(f"重新加载数据库失败，继续使用当前工作进程: {e}")
+            return
+        
+        self._replace_workers()
+        print(f"重新加载完成，已启动 {self.workers} 个新工作进程")
+    
+    def _replace_workers(self):
+        """
+        从主进程当前的状态fork新一批工作进程，旧工作进程处理完在途请求后退出
+        """
+        old_workers = self._workers
+        self._workers = {}
+        for index in range(self.workers):
+            self._spawn_worker(index)
+        
+        for pid in old_workers:
+            self._signal_worker(pid, signal.SIGTERM)
+        self._retiring.update(old_workers)
+    
+    def _start_key_rotation(self):
+        """
+        在主进程的后台线程中开始轮换服务器密钥
+        """
+        database = self.server.database
+        key_epoch = database.key_epoch
+        print(f"收到SIGUSR1，开始轮换服务器密钥（当前版本 {key_epoch}）...")
+        try:
+            # 新私钥在切换时由数据库保存，主进程重启后直接使用
+            database.rotate_server_key()
+        except RuntimeError as e:
+            print(f"无法开始密钥轮换: {e}")
+            return
+        self._rotating_from_epoch = key_epoch
+    
+    def _check_key_rotation(self):
+        """
+        密钥轮换完成后用新密钥的数据库替换所有工作进程
+        """
+        database = self.server.database
+        if database.key_rotation_in_progress:
+            return
+        
+        from_epoch = self._rotating_from_epoch
+        self._rotating_from_epoch = None
+        if database.key_epoch == from_epoch:
+            print("密钥轮换失败，继续使用当前工作进程")
+            return
+        
+        self._replace_workers()
+        print(f"密钥轮换完成（版本 {database.key_epoch}），已启动 {self.workers} 个新工作进程")
+    
+    def _stop_workers(self, pids: Set[int]):
+        """
+        通知工作进程退出并等待，超时后强制结束
+        """
+        for pid in pids:
+            self._signal_worker(pid, signal.SIGTERM)
+        
+        deadline = time.time() + GRACEFUL_TIMEOUT
+        remaining = set(pids)
+        while remaining and time.time() < deadline:
+            for pid in list(remaining):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0] != 0:
+                        remaining.discard(pid)
+                except ChildProcessError:
+                    remaining.discard(pid)
+            if remaining:
+                time.sleep(SUPERVISOR_INTERVAL)
+        
+        for pid in remaining:
+            self._signal_worker(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    
+    @staticmethod
+    def _signal_worker(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
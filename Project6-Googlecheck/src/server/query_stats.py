@@ -0,0 +1,73 @@
+import multiprocessing
+import threading
+from typing import Dict, Optional, Tuple
+from ..utils.latency_histogram import LatencyHistogram
+
+
+# 记录延迟直方图的处理阶段: 请求解析、分片查找、服务器盲化、响应序列化，
+# 以及整个请求的处理耗时（"request"）
+SERVER_STAGES = ("parse", "shard_lookup", "blinding", "serialization", "request")
+
+
+class QueryStatistics:
+    """
+    查询计数、累计耗时和各处理阶段的延迟直方图（线程安全）
+    
+    shared=True 时计数和直方图保存在共享内存中，fork出的所有工作进程累加到同一组计数，
+    任一进程读取到的都是所有进程的汇总值
+    """
+    
+    def __init__(self, shared: bool = False):
+        """
+        初始化查询统计
+        
+        Args:
+            shared: 是否放在进程间共享内存中（必须在fork工作进程之前创建）
+        """
+        self.shared = shared
+        
+        if shared:
+            # [查询数, 累计耗时]，自带进程间锁
+            self._values = multiprocessing.Array('d', 2)
+            self._lock = self._values.get_lock()
+        else:
+            self._values = [0.0, 0.0]
+            self._lock = threading.Lock()
+        
+        self.latency = LatencyHistogram(SERVER_STAGES, shared)
+    
+    def record(self, query_count: int, elapsed: float,
+               stage_times: Optional[Dict[str, float]] = None):
+        """
+        记录一次请求
+        
+        Args:
+            query_count: 请求包含的查询数
+            elapsed: 处理耗时（秒）
+            stage_times: 各处理阶段的耗时（秒），记录到延迟直方图
+        """
+        with self._lock:
+            self._values[0] += query_count
+            self._values[1] += elapsed
+        
+        for stage, stage_time in (stage_times or {}).items():
+            self.latency.observe(stage, stage_time)
+    
+    def snapshot(self) -> Tuple[int, float]:
+        """
+        读取当前统计
+        
+        Returns:
+            (查询数, 累计耗时)
+        """
+        with self._lock:
+            return int(self._values[0]), self._values[1]
+    
+    def reset(self):
+        """
+        清零统计
+        """
+        with self._lock:
+            self._values[0] = 0.0
+            self._values[1] = 0.0
+        self.latency.reset()
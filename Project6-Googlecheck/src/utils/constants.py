@@ -9,15 +9,33 @@ ARGON2_MEMORY_COST = 256 * 1024  # 256MB in KB
 ARGON2_TIME_COST = 3
 ARGON2_PARALLELISM = 1
 ARGON2_HASH_LENGTH = 16  # 16 bytes
+# 以上为"default"配置的参数；数据库可在元数据中选择其他配置（见 crypto/argon2_profiles.py）
+DEFAULT_ARGON2_PROFILE = "default"
 
 # 分片参数
 SHARD_PREFIX_LENGTH = 2  # 使用哈希前2字节作为分片键
 SHARD_COUNT = 2 ** (SHARD_PREFIX_LENGTH * 8)  # 65536个分片
+# 分片前缀位数是数据库属性（记录在分片清单中），随数据量调整；
+# 未记录位数的旧数据库和新建的空数据库使用16位
+DEFAULT_SHARD_PREFIX_BITS = SHARD_PREFIX_LENGTH * 8
+MIN_SHARD_PREFIX_BITS = 1
+MAX_SHARD_PREFIX_BITS = 24  # 分片文件索引最多 2^24 + 1 项（128MB）
+TARGET_SHARD_SIZE = 1024  # 选择前缀位数使平均分片条目数落在 (T/2, T]
+MAX_SHARD_PREFIX_BITS_DEFICIT = 4  # 客户端前缀最多比数据库少4位（响应最多为16个分片）
+
+# 截断摘要参数
+# 截断模式下每个分片条目只返回服务器盲化点x坐标的前t字节，
+# 单次查询的误报率约为 分片条目数 / 2^(8t)
+DEFAULT_DIGEST_LENGTH = 8  # 分片1000条时误报率约 5.4e-17
+MIN_DIGEST_LENGTH = 4
+MAX_DIGEST_LENGTH = CURVE_POINT_SIZE
 
 # 网络参数
 DEFAULT_SERVER_HOST = "localhost"
 DEFAULT_SERVER_PORT = 8080
 QUERY_TIMEOUT = 30  # 30秒超时
+QUERY_BATCH_SIZE = 256  # 客户端每个批量查询请求包含的查询数
+MAX_QUERY_BATCH_SIZE = 4096  # 服务器单个批量查询请求允许的最大查询数
 
 # 安全参数
 MIN_PASSWORD_LENGTH = 1
@@ -0,0 +1,150 @@
+import bisect
+import multiprocessing
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# 直方图桶上界（秒）：从10微秒到约84秒按 2^(1/4) 倍递增，另有一个超出最大上界的桶；
+# 分位数在桶内线性插值，误差不超过所在桶的宽度（约为上界的16%）
+LATENCY_BUCKETS = tuple(1e-5 * 2 ** (i / 4) for i in range(93))
+
+# 默认报告的分位数
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """
+    按阶段分组的固定桶延迟直方图（线程安全）
+    
+    每个阶段记录各桶的计数、耗时总和与次数，可导出为Prometheus直方图并估计分位数；
+    shared=True 时计数保存在共享内存中，fork出的所有工作进程记录到同一组直方图
+    """
+    
+    def __init__(self, stages: Sequence[str], shared: bool = False):
+        """
+        初始化延迟直方图
+        
+        Args:
+            stages: 阶段名称
+            shared: 是否放在进程间共享内存中（必须在fork工作进程之前创建）
+        """
+        self.stages = tuple(stages)
+        self._stage_index = {stage: i for i, stage in enumerate(self.stages)}
+        
+        # 每个阶段: 各桶计数（最后一个为超出最大上界的桶） || 耗时总和 || 次数
+        self._width = len(LATENCY_BUCKETS) + 3
+        size = self._width * len(self.stages)
+        
+        if shared:
+            self._values = multiprocessing.Array('d', size)
+            self._lock = self._values.get_lock()
+        else:
+            self._values = [0.0] * size
+            self._lock = threading.Lock()
+    
+    def observe(self, stage: str, seconds: float):
+        """
+        记录一次耗时
+        
+        Args:
+            stage: 阶段名称
+            seconds: 耗时（秒）
+        """
+        base = self._stage_index[stage] * self._width
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self._values[base + bucket] += 1
+            self._values[base + self._width - 2] += seconds
+            self._values[base + self._width - 1] += 1
+    
+    def snapshot(self, stage: str) -> Tuple[List[int], float, int]:
+        """
+        读取一个阶段的直方图
+        
+        Args:
+            stage: 阶段名称
+        
+        Returns:
+            (各桶计数（非累计，最后一个为超出最大上界的桶）, 耗时总和, 次数)
+        """
+        base = self._stage_index[stage] * self._width
+        with self._lock:
+            values = self._values[base:base + self._width]
+        return [int(count) for count in values[:-2]], values[-2], int(values[-1])
+    
+    @staticmethod
+    def estimate_quantile(counts: List[int], quantile: float) -> float:
+        """
+        由桶计数估计分位数（在所在桶的上下界之间线性插值）
+        
+        Args:
+            counts: 各桶计数
+            quantile: 分位数（0到1之间）
+        
+        Returns:
+            估计的耗时（秒），没有记录时返回0
+        """
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        
+        rank = quantile * total
+        cumulative = 0
+        for bucket, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if bucket == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[bucket - 1] if bucket > 0 else 0.0
+                upper = LATENCY_BUCKETS[bucket]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return LATENCY_BUCKETS[-1]
+    
+    def summary(self, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Dict[str, float]]:
+        """
+        各阶段的次数、平均耗时和分位数
+        
+        Args:
+            quantiles: 要估计的分位数
+        
+        Returns:
+            {阶段: {"count": 次数, "mean": 平均耗时, "p50": ..., "p95": ..., "p99": ...}}（单位为秒）
+        """
+        result = {}
+        for stage in self.stages:
+            counts, total_time, count = self.snapshot(stage)
+            stage_summary = {"count": count, "mean": total_time / count if count else 0.0}
+            for quantile in quantiles:
+                stage_summary[f"p{quantile * 100:g}"] = self.estimate_quantile(counts, quantile)
+            result[stage] = stage_summary
+        return result
+    
+    def reset(self):
+        """
+        清零所有阶段
+        """
+        with self._lock:
+            for i in range(len(self._values)):
+                self._values[i] = 0.0
+
+
+@contextmanager
+def timed_stage(stage_times: Optional[Dict[str, float]], stage: str) -> Iterator[None]:
+    """
+    把with块的耗时累加到 stage_times[stage]（秒），stage_times为None时不计时
+    
+    Args:
+        stage_times: 各阶段耗时
+        stage: 阶段名称
+    """
+    if stage_times is None:
+        yield
+        return
+    
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_times[stage] = stage_times.get(stage, 0.0) + time.perf_counter() - start_time
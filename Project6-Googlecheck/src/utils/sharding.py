@@ -0,0 +1,87 @@
+from .constants import MIN_SHARD_PREFIX_BITS, MAX_SHARD_PREFIX_BITS, TARGET_SHARD_SIZE
+
+
+# 分片键是凭证哈希的前prefix_bits位；分片前缀按大端字节序存放这些位，
+# 占 ceil(prefix_bits / 8) 字节，末尾多余的位清零。
+# 凭证哈希和分片前缀都可以用 get_shard_index 计算分片索引，
+# 因此任何位数不超过前缀长度的分片布局都能从同一个前缀定位分片
+
+
+def validate_prefix_bits(prefix_bits: int):
+    """
+    验证分片前缀位数
+    
+    Args:
+        prefix_bits: 分片前缀位数
+    """
+    if not MIN_SHARD_PREFIX_BITS <= prefix_bits <= MAX_SHARD_PREFIX_BITS:
+        raise ValueError(
+            f"分片前缀位数必须在 {MIN_SHARD_PREFIX_BITS}-{MAX_SHARD_PREFIX_BITS} 之间"
+        )
+
+
+def get_shard_count(prefix_bits: int) -> int:
+    return 1 << prefix_bits
+
+
+def get_prefix_length(prefix_bits: int) -> int:
+    """
+    分片前缀的字节数
+    """
+    return (prefix_bits + 7) // 8
+
+
+def get_shard_index(data: bytes, prefix_bits: int) -> int:
+    """
+    取凭证哈希或分片前缀的前prefix_bits位作为分片索引
+    
+    Args:
+        data: 凭证哈希或分片前缀
+        prefix_bits: 分片前缀位数
+    
+    Returns:
+        分片索引（0 到 2^prefix_bits - 1）
+    """
+    length = get_prefix_length(prefix_bits)
+    if len(data) < length:
+        raise ValueError(f"分片前缀不足 {prefix_bits} 位")
+    return int.from_bytes(data[:length], byteorder='big') >> (length * 8 - prefix_bits)
+
+
+def get_shard_prefix(credential_hash: bytes, prefix_bits: int) -> bytes:
+    """
+    获取凭证哈希的分片前缀，只保留前prefix_bits位，不向服务器多透露哈希的位
+    
+    Args:
+        credential_hash: 凭证哈希
+        prefix_bits: 分片前缀位数
+    
+    Returns:
+        分片前缀
+    """
+    length = get_prefix_length(prefix_bits)
+    shard_index = get_shard_index(credential_hash, prefix_bits)
+    return (shard_index << (length * 8 - prefix_bits)).to_bytes(length, byteorder='big')
+
+
+def choose_prefix_bits(record_count: int, target_shard_size: int = TARGET_SHARD_SIZE) -> int:
+    """
+    按条目总数选择分片前缀位数
+    
+    选择使平均分片条目数不超过target_shard_size的最小位数，
+    平均分片大小因此落在 (target_shard_size / 2, target_shard_size]（受位数上下限约束）
+    
+    Args:
+        record_count: 数据库中的条目总数
+        target_shard_size: 目标平均分片条目数
+    
+    Returns:
+        分片前缀位数
+    """
+    if target_shard_size <= 0:
+        raise ValueError("target_shard_size必须为正数")
+    
+    prefix_bits = 0
+    while record_count > target_shard_size << prefix_bits:
+        prefix_bits += 1
+    return min(MAX_SHARD_PREFIX_BITS, max(MIN_SHARD_PREFIX_BITS, prefix_bits))
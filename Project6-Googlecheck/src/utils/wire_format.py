@@ -0,0 +1,222 @@
+import struct
+from typing import Iterator, List, Sequence, Tuple
+
+
+# /query 二进制响应格式（大端）:
+#   MAGIC(2) || version(1) || hash_length(1) || entry_width(1) || entry_count(4)
+#   || double_blinded_hash(hash_length) || entry_count 个定长条目(entry_width)
+# 条目直接拼接，不做十六进制编码，体积约为JSON格式的一半
+BINARY_CONTENT_TYPE = "application/octet-stream"
+JSON_CONTENT_TYPE = "application/json"
+# 查询响应（两种格式）都带有服务器密钥版本的HTTP头，客户端据此发现密钥轮换
+KEY_EPOCH_HEADER = "X-Key-Epoch"
+# 查询响应（包括错误响应）都带有当前分片前缀位数的HTTP头，客户端据此发现重新分片
+SHARD_PREFIX_BITS_HEADER = "X-Shard-Prefix-Bits"
+WIRE_MAGIC = b"PC"
+WIRE_VERSION = 1
+
+_HEADER_FORMAT = ">2sBBBI"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+
+# /query_batch 二进制响应格式（大端）:
+#   BATCH_MAGIC(2) || version(1) || hash_length(1) || entry_width(1)
+#   || query_count(4) || shard_count(4)
+#   || query_count 个 (double_blinded_hash(hash_length) || shard_index(4))
+#   || shard_count 个 (entry_count(4) || entry_count 个定长条目)
+# 同一批次中落在相同分片的查询共享一份分片数据
+BATCH_WIRE_MAGIC = b"PB"
+
+_BATCH_HEADER_FORMAT = ">2sBBBII"
+_BATCH_HEADER_SIZE = struct.calcsize(_BATCH_HEADER_FORMAT)
+_COUNT_FORMAT = ">I"
+_COUNT_SIZE = struct.calcsize(_COUNT_FORMAT)
+
+
+class EntryView:
+    """
+    响应中定长条目的零拷贝只读视图
+    
+    条目不逐个拷贝成bytes对象，成员检查直接在原始响应数据上查找
+    """
+    
+    __slots__ = ("_data", "_view", "_start", "_count", "_width")
+    
+    def __init__(self, data: bytes, start: int, count: int, width: int):
+        self._data = data
+        self._view = memoryview(data)
+        self._start = start
+        self._count = count
+        self._width = width
+    
+    @property
+    def width(self) -> int:
+        return self._width
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def __getitem__(self, index: int) -> memoryview:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("条目下标越界")
+        begin = self._start + index * self._width
+        return self._view[begin:begin + self._width]
+    
+    def __iter__(self) -> Iterator[memoryview]:
+        for begin in range(self._start, self._start + self._count * self._width, self._width):
+            yield self._view[begin:begin + self._width]
+    
+    def __contains__(self, value) -> bool:
+        if len(value) != self._width:
+            return False
+        
+        # 在原始数据上查找，只接受与条目边界对齐的位置
+        end = self._start + self._count * self._width
+        position = self._data.find(value, self._start, end)
+        while position != -1:
+            if (position - self._start) % self._width == 0:
+                return True
+            position = self._data.find(value, position + 1, end)
+        return False
+
+
+def encode_query_response(double_blinded_hash: bytes, entries: Sequence[bytes],
+                          entry_width: int) -> bytes:
+    """
+    将查询响应编码为二进制格式
+    
+    Args:
+        double_blinded_hash: 双重盲化哈希
+        entries: 定长条目（盲化分片数据）
+        entry_width: 条目长度（字节）
+    
+    Returns:
+        编码后的响应数据
+    """
+    body = b''.join(entries)
+    if len(body) != len(entries) * entry_width:
+        raise ValueError("条目长度不一致")
+    
+    header = struct.pack(_HEADER_FORMAT, WIRE_MAGIC, WIRE_VERSION,
+                         len(double_blinded_hash), entry_width, len(entries))
+    return header + bytes(double_blinded_hash) + body
+
+
+def decode_query_response(data: bytes) -> Tuple[bytes, EntryView]:
+    """
+    解析二进制格式的查询响应
+    
+    Args:
+        data: 响应数据
+    
+    Returns:
+        (双重盲化哈希, 条目视图)
+    """
+    if len(data) < _HEADER_SIZE:
+        raise ValueError("响应数据不完整")
+    
+    magic, version, hash_length, entry_width, entry_count = struct.unpack_from(_HEADER_FORMAT, data, 0)
+    if magic != WIRE_MAGIC:
+        raise ValueError("无效的响应格式")
+    if version != WIRE_VERSION:
+        raise ValueError(f"不支持的响应版本: {version}")
+    if entry_width == 0:
+        raise ValueError("无效的条目长度")
+    
+    entries_offset = _HEADER_SIZE + hash_length
+    if len(data) != entries_offset + entry_count * entry_width:
+        raise ValueError("响应数据长度与头部不一致")
+    
+    double_blinded_hash = bytes(data[_HEADER_SIZE:entries_offset])
+    return double_blinded_hash, EntryView(data, entries_offset, entry_count, entry_width)
+
+
+def encode_batch_response(double_blinded_hashes: Sequence[bytes], shard_indices: Sequence[int],
+                          shards: Sequence[Sequence[bytes]], entry_width: int) -> bytes:
+    """
+    将批量查询响应编码为二进制格式
+    
+    Args:
+        double_blinded_hashes: 每个查询的双重盲化哈希
+        shard_indices: 每个查询对应的分片在shards中的下标
+        shards: 去重后的分片数据（定长条目）
+        entry_width: 条目长度（字节）
+    
+    Returns:
+        编码后的响应数据
+    """
+    if len(double_blinded_hashes) != len(shard_indices):
+        raise ValueError("查询结果数量不一致")
+    
+    hash_length = len(double_blinded_hashes[0]) if double_blinded_hashes else 0
+    parts = [struct.pack(_BATCH_HEADER_FORMAT, BATCH_WIRE_MAGIC, WIRE_VERSION, hash_length,
+                         entry_width, len(double_blinded_hashes), len(shards))]
+    
+    for double_blinded_hash, shard_index in zip(double_blinded_hashes, shard_indices):
+        if len(double_blinded_hash) != hash_length:
+            raise ValueError("双重盲化哈希长度不一致")
+        parts.append(bytes(double_blinded_hash))
+        parts.append(struct.pack(_COUNT_FORMAT, shard_index))
+    
+    for entries in shards:
+        body = b''.join(entries)
+        if len(body) != len(entries) * entry_width:
+            raise ValueError("条目长度不一致")
+        parts.append(struct.pack(_COUNT_FORMAT, len(entries)))
+        parts.append(body)
+    
+    return b''.join(parts)
+
+
+def decode_batch_response(data: bytes) -> List[Tuple[bytes, EntryView]]:
+    """
+    解析二进制格式的批量查询响应
+    
+    Args:
+        data: 响应数据
+    
+    Returns:
+        与查询一一对应的 (双重盲化哈希, 条目视图) 列表，相同分片共享同一个视图
+    """
+    if len(data) < _BATCH_HEADER_SIZE:
+        raise ValueError("响应数据不完整")
+    
+    magic, version, hash_length, entry_width, query_count, shard_count = struct.unpack_from(
+        _BATCH_HEADER_FORMAT, data, 0
+    )
+    if magic != BATCH_WIRE_MAGIC:
+        raise ValueError("无效的响应格式")
+    if version != WIRE_VERSION:
+        raise ValueError(f"不支持的响应版本: {version}")
+    if entry_width == 0:
+        raise ValueError("无效的条目长度")
+    
+    offset = _BATCH_HEADER_SIZE
+    queries = []
+    for _ in range(query_count):
+        if offset + hash_length + _COUNT_SIZE > len(data):
+            raise ValueError("响应数据不完整")
+        double_blinded_hash = bytes(data[offset:offset + hash_length])
+        shard_index, = struct.unpack_from(_COUNT_FORMAT, data, offset + hash_length)
+        queries.append((double_blinded_hash, shard_index))
+        offset += hash_length + _COUNT_SIZE
+    
+    shards = []
+    for _ in range(shard_count):
+        if offset + _COUNT_SIZE > len(data):
+            raise ValueError("响应数据不完整")
+        entry_count, = struct.unpack_from(_COUNT_FORMAT, data, offset)
+        offset += _COUNT_SIZE
+        shards.append(EntryView(data, offset, entry_count, entry_width))
+        offset += entry_count * entry_width
+    
+    if offset != len(data):
+        raise ValueError("响应数据长度与头部不一致")
+    
+    results = []
+    for double_blinded_hash, shard_index in queries:
+        if shard_index >= shard_count:
+            raise ValueError("无效的分片下标")
+        results.append((double_blinded_hash, shards[shard_index]))
+    return results
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+客户端功能测试
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.client.hash_cache import CredentialHashCache
+from src.crypto.psi_protocol import PSIProtocol
+
+
+class TestCredentialHashCache(unittest.TestCase):
+    """
+    测试客户端凭证哈希缓存
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "hash_cache.bin")
+        self.key = os.urandom(32)
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = CredentialHashCache(self.key, max_entries=2)
+        cache.put("tag", "alice", "pw1", b"a" * 16)
+        cache.put("tag", "bob", "pw2", b"b" * 16)
+        
+        # 访问alice后bob成为最久未使用的条目
+        self.assertEqual(cache.get("tag", "alice", "pw1"), b"a" * 16)
+        cache.put("tag", "carol", "pw3", b"c" * 16)
+        
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("tag", "bob", "pw2"))
+        self.assertEqual(cache.get("tag", "carol", "pw3"), b"c" * 16)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+    
+    def test_parameters_tag_invalidates(self):
+        """测试Argon2参数变化后旧条目不再命中"""
+        cache = CredentialHashCache(self.key)
+        cache.put("argon2id:m=1", "alice", "pw1", b"a" * 16)
+        
+        self.assertIsNone(cache.get("argon2id:m=2", "alice", "pw1"))
+    
+    def test_encrypted_persistence(self):
+        """测试缓存加密保存、重新加载和密钥不匹配"""
+        cache = CredentialHashCache(self.key, self.path)
+        cache.put("tag", "alice", "secret-password", b"a" * 16)
+        cache.save()
+        
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertNotIn(b"alice", data)
+        self.assertNotIn(b"secret-password", data)
+        
+        reloaded = CredentialHashCache(self.key, self.path)
+        self.assertEqual(reloaded.get("tag", "alice", "secret-password"), b"a" * 16)
+        
+        # 密钥错误或文件被篡改时使用空缓存
+        self.assertEqual(len(CredentialHashCache(os.urandom(32), self.path)), 0)
+        with open(self.path, 'wb') as f:
+            f.write(data[:-1] + bytes([data[-1] ^ 1]))
+        self.assertEqual(len(CredentialHashCache(self.key, self.path)), 0)
+    
+    def test_protocol_uses_cache(self):
+        """测试客户端重复检查同一凭证时命中缓存"""
+        cache = CredentialHashCache(self.key)
+        psi = PSIProtocol(hash_cache=cache)
+        
+        first = psi.client_hash_credential("Alice@Example.com", "password")
+        second = psi.client_hash_credential("alice@example.com", "password")
+        
+        self.assertEqual(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
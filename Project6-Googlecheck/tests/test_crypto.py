@@ -12,7 +12,10 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
 from src.crypto.argon2_hash import Argon2Hasher
-from src.crypto.elliptic_curve import EllipticCurveBlinder
+from src.crypto.argon2_profiles import Argon2Profile, calibrate, get_profile
+from src.crypto.elliptic_curve import (
+    EllipticCurveBlinder, CURVE_B, CURVE_FIELD_PRIME, hash_to_curve_bytes, hash_to_curve_x
+)
 from src.crypto.psi_protocol import PSIProtocol
 from src.utils.canonicalize import canonicalize_username, validate_credentials
 
@@ -51,6 +54,47 @@ class TestArgon2Hasher(unittest.TestCase):
         self.assertTrue(0 <= index < 65536)  # 有效分片索引
 
 
+class TestArgon2Profiles(unittest.TestCase):
+    """
+    测试Argon2参数配置和校准
+    """
+    
+    def test_profile_parameters(self):
+        """测试配置序列化、参数标识和哈希结果"""
+        profile = get_profile("low-memory")
+        restored = Argon2Profile.from_dict(profile.to_dict())
+        renamed = Argon2Profile("renamed", profile.memory_cost, profile.time_cost, profile.parallelism)
+        
+        self.assertEqual(restored.tag, profile.tag)
+        self.assertTrue(renamed.same_parameters(profile))
+        self.assertFalse(profile.same_parameters(get_profile()))
+        
+        # 不同参数得到不同的凭证哈希
+        default_hash = Argon2Hasher().hash_credential_with_fixed_salt("testuser", "testpass")
+        profile_hash = Argon2Hasher(profile).hash_credential_with_fixed_salt("testuser", "testpass")
+        self.assertNotEqual(default_hash, profile_hash)
+        self.assertEqual(Argon2Hasher(renamed).hash_credential_with_fixed_salt("testuser", "testpass"),
+                         profile_hash)
+        
+        with self.assertRaises(ValueError):
+            get_profile("unknown")
+        with self.assertRaises(ValueError):
+            Argon2Profile("invalid", 8, 0, 1)
+    
+    def test_calibrate(self):
+        """测试校准只推荐满足延迟目标的最强配置"""
+        small = Argon2Profile("small", 1024, 1, 1)
+        large = Argon2Profile("large", 2048, 1, 1)
+        
+        report = calibrate([small, large], latency_slo_ms=60000, samples=1)
+        self.assertEqual(report["recommended"]["name"], "large")
+        self.assertTrue(all(result["meets_slo"] for result in report["results"]))
+        self.assertTrue(all(result["peak_rss_mb"] > 0 for result in report["results"]))
+        
+        report = calibrate([small], latency_slo_ms=0, samples=1)
+        self.assertIsNone(report["recommended"])
+
+
 class TestEllipticCurveBlinder(unittest.TestCase):
     """
     测试椭圆曲线盲化器
@@ -67,6 +111,32 @@ class TestEllipticCurveBlinder(unittest.TestCase):
         # 应该返回有效的椭圆曲线点
         self.assertIsNotNone(point)
     
+    def test_hash_to_curve_deterministic(self):
+        """测试哈希到曲线映射是确定的，不同输入映射到不同的点"""
+        x_bytes = hash_to_curve_x(b"test data")
+        self.assertEqual(x_bytes, hash_to_curve_x(b"test data"))
+        self.assertNotEqual(x_bytes, hash_to_curve_x(b"other data"))
+        self.assertNotEqual(self.blinder.point_to_bytes(self.blinder.hash_to_curve(b"test data")),
+                            self.blinder.point_to_bytes(self.blinder.public_key))
+        
+        # 缓存的未压缩坐标在曲线上，并与压缩形式表示同一个点
+        xy_bytes = hash_to_curve_bytes(b"test data")
+        x, y = int.from_bytes(xy_bytes[:28], 'big'), int.from_bytes(xy_bytes[28:], 'big')
+        self.assertEqual(xy_bytes[:28], x_bytes)
+        self.assertEqual((y * y - (x ** 3 - 3 * x + CURVE_B)) % CURVE_FIELD_PRIME, 0)
+        self.assertEqual(self.blinder.point_to_bytes(self.blinder.point_from_xy(xy_bytes)),
+                         self.blinder.point_to_bytes(self.blinder.hash_to_curve(b"test data")))
+    
+    def test_blinding_commutative(self):
+        """测试两次盲化的结果与顺序无关"""
+        point = self.blinder.hash_to_curve(b"test data")
+        first, second = self.blinder.generate_random_key(), self.blinder.generate_random_key()
+        
+        self.assertEqual(
+            self.blinder.blind_point_to_bytes(self.blinder.blind_point(point, first), second),
+            self.blinder.blind_point_to_bytes(self.blinder.blind_point(point, second), first)
+        )
+    
     def test_point_serialization(self):
         """测试点序列化"""
         data = b"test data"
@@ -81,6 +151,11 @@ class TestEllipticCurveBlinder(unittest.TestCase):
             self.blinder.point_to_bytes(point),
             self.blinder.point_to_bytes(recovered_point)
         )
+        
+        # 无效的点编码被拒绝，而不是替换为其他点
+        for invalid_bytes in (b"", b"\x05" + point_bytes[1:], point_bytes[:-1]):
+            with self.assertRaises(ValueError):
+                self.blinder.bytes_to_point(invalid_bytes)
     
     def test_blinding_unblinding(self):
         """测试盲化和解盲化"""
@@ -172,6 +247,49 @@ class TestPSIProtocol(unittest.TestCase):
         
         # 应该找到匹配
         self.assertTrue(is_match)
+        
+        # 其他凭证不应匹配
+        blinded_hash, query_prefix, client_key = self.psi.client_prepare_query(
+            username, "wrongpass"
+        )
+        double_blinded_hash, blinded_shard_data = self.psi.server_process_query(
+            blinded_hash, query_prefix, shard_data
+        )
+        self.assertFalse(self.psi.client_process_response(
+            double_blinded_hash, blinded_shard_data, client_key
+        ))
+    
+    def test_truncated_digest_protocol(self):
+        """测试截断摘要模式"""
+        credential_hash, _ = self.psi.create_breach_database_entry("testuser", "testpass")
+        blinded_hash, query_prefix, client_key = self.psi.client_prepare_query(
+            "testuser", "testpass"
+        )
+        
+        double_blinded_hash, digests = self.psi.server_process_query(
+            blinded_hash, query_prefix, [credential_hash], digest_length=8
+        )
+        
+        self.assertEqual([len(digest) for digest in digests], [8])
+        self.assertEqual(
+            digests[0], self.psi.blind_database_entry(credential_hash)[1:9]
+        )
+        self.assertTrue(self.psi.client_process_response(
+            double_blinded_hash, digests, client_key, digest_length=8
+        ))
+        self.assertFalse(self.psi.client_process_response(
+            double_blinded_hash, [os.urandom(8)], client_key, digest_length=8
+        ))
+    
+    def test_digest_length_limits(self):
+        """测试截断摘要长度范围和误报率估算"""
+        with self.assertRaises(ValueError):
+            self.psi.truncate_blinded_entries([b"\x02" * 29], 3)
+        with self.assertRaises(ValueError):
+            self.psi.truncate_blinded_entries([b"\x02" * 29], 29)
+        
+        self.assertEqual(self.psi.false_positive_rate(256, 4), 2 ** -24)
+        self.assertEqual(self.psi.false_positive_rate(1, 1), 1 / 256)
 
 
 class TestUtilities(unittest.TestCase):
@@ -0,0 +1,738 @@
+#!/usr/bin/env python3
+"""
+数据库功能测试
+"""
+
+import sys
+import os
+import bz2
+import gzip
+import json
+import lzma
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.crypto.argon2_hash import Argon2Hasher
+from src.database.breach_db import BreachDatabase, IMPORT_CHECKPOINT_DIR, SERVER_KEY_FILE
+from src.database.breach_import import BreachFileReader, ImportCheckpoint
+from src.database.bulk_blinding import BulkBlinder
+from src.database.ingest_pipeline import get_worker_count, hash_credential_batch
+from src.database.shard_file import (
+    RecordView, HASH_SIZE, POINT_SIZE, RECORD_SIZE, NO_MAPPED_POINT, LEGACY_SEGMENT_FILE_MAGIC
+)
+from src.database.shard_manager import ShardManager
+from src.utils.sharding import choose_prefix_bits, get_shard_count, get_shard_index, get_shard_prefix
+
+
+class TestIngestionPipeline(unittest.TestCase):
+    """
+    测试多进程导入流水线
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.database = BreachDatabase(os.path.join(self.temp_dir, "breach_db"))
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_worker_count(self):
+        """测试工作进程数限制"""
+        self.assertEqual(get_worker_count(1), 1)
+        self.assertGreaterEqual(get_worker_count(0), 1)
+        self.assertLessEqual(get_worker_count(4), 4)
+    
+    def test_hash_credential_batch(self):
+        """测试批量哈希与单条哈希一致"""
+        hasher = Argon2Hasher()
+        hashes = hash_credential_batch([("User@Example.com", "secret")])
+        
+        self.assertEqual(hashes, [hasher.hash_credential_with_fixed_salt("user", "secret")])
+    
+    def test_add_breach_data(self):
+        """测试并行导入泄露数据"""
+        credentials = [
+            ("alice", "password1"),
+            ("bob", "password2"),
+            ("", "invalid"),
+            ("carol", "password3"),
+            ("alice", "password1")
+        ]
+        
+        stats = self.database.add_breach_data(
+            iter(credentials), "测试泄露", max_workers=2, batch_size=2
+        )
+        
+        self.assertEqual(stats["processed"], 4)
+        self.assertEqual(stats["added"], 3)
+        self.assertEqual(stats["skipped"], 1)
+        self.assertEqual(stats["failed"], 0)
+        self.assertGreater(stats["rows_per_second"], 0)
+        
+        shard_stats = self.database.shard_manager.get_shard_statistics()
+        self.assertEqual(shard_stats["total_credentials"], 3)
+        self.assertEqual(self.database.metadata["breaches"][0]["credential_count"], 4)
+        self.assertTrue(self.database.query_credential("bob", "password2"))
+
+
+
+class TestPrecomputedBlindedShards(unittest.TestCase):
+    """
+    测试预先盲化分片的查询路径
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.database_path = os.path.join(self.temp_dir, "breach_db")
+        self.server_key = bytes(range(1, 29))
+        self.credential_hashes = [bytes([0, 1]) + os.urandom(14) for _ in range(3)]
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _create_database(self, server_key: bytes) -> BreachDatabase:
+        database = BreachDatabase(self.database_path, server_key)
+        database.shard_manager.add_credentials([
+            (credential_hash, database.psi_protocol.blind_database_entry(credential_hash))
+            for credential_hash in self.credential_hashes
+        ])
+        database.save_database()
+        return database
+    
+    def test_process_query_matches_per_request_blinding(self):
+        """测试预先盲化的分片与逐条盲化结果一致"""
+        database = self._create_database(self.server_key)
+        blinded_hash, _, _ = database.psi_protocol.client_prepare_query("alice", "password1")
+        
+        double_blinded_hash, blinded_shard_data, key_epoch = database.process_query(blinded_hash, b"\x00\x01")
+        expected_hash, expected_data = database.psi_protocol.server_process_query(
+            blinded_hash, b"\x00\x01", sorted(self.credential_hashes)
+        )
+        
+        self.assertEqual(double_blinded_hash, expected_hash)
+        self.assertEqual([bytes(item) for item in blinded_shard_data], expected_data)
+        self.assertEqual(key_epoch, 0)
+    
+    def test_process_query_reports_epoch_used(self):
+        """测试查询跨过密钥切换时按新密钥重做，并返回实际使用的密钥版本"""
+        database = self._create_database(self.server_key)
+        blinded_hash, shard_prefix, _ = database.psi_protocol.client_blind_credential_hash(
+            self.credential_hashes[0]
+        )
+        
+        # 第一次查找分片后立即完成一次轮换
+        get_blinded_shard_data = database.shard_manager.get_blinded_shard_data
+        calls = []
+        
+        def rotate_after_lookup(*args):
+            result = get_blinded_shard_data(*args)
+            if not calls:
+                calls.append(database.rotate_server_key(max_workers=1, background=False))
+            return result
+        
+        database.shard_manager.get_blinded_shard_data = rotate_after_lookup
+        double_blinded_hash, blinded_shard_data, key_epoch = database.process_query(blinded_hash, shard_prefix)
+        self.assertEqual(key_epoch, 1)
+        self.assertEqual(double_blinded_hash, database.psi_protocol.server_blind_query(blinded_hash))
+        self.assertEqual([bytes(item) for item in blinded_shard_data],
+                         [database.psi_protocol.blind_database_entry(h) for h in sorted(self.credential_hashes)])
+        
+        calls.clear()
+        _, _, _, key_epoch = database.process_query_batch([(blinded_hash, shard_prefix)])
+        self.assertEqual(key_epoch, 2)
+        self.assertEqual(database.key_epoch, 2)
+    
+    def test_key_change_invalidates_blinded_shards(self):
+        """测试服务器密钥变更后自动重新盲化"""
+        self._create_database(self.server_key)
+        
+        # 相同密钥重新打开时直接使用存储的盲化分片
+        database = BreachDatabase(self.database_path, self.server_key)
+        self.assertEqual(database.shard_manager.blinding_key_id, database.psi_protocol.get_key_id())
+        
+        # 更换密钥后存储的盲化分片被重新计算并持久化
+        new_key = bytes(range(2, 30))
+        database = BreachDatabase(self.database_path, new_key)
+        key_id = database.psi_protocol.get_key_id()
+        expected = [database.psi_protocol.blind_database_entry(h) for h in sorted(self.credential_hashes)]
+        
+        self.assertEqual(database.shard_manager.blinding_key_id, key_id)
+        self.assertEqual([bytes(item) for item in database.shard_manager.get_blinded_shard_data(b"\x00\x01")], expected)
+        
+        reopened = BreachDatabase(self.database_path, new_key)
+        self.assertEqual(reopened.shard_manager.blinding_key_id, key_id)
+        self.assertEqual([bytes(item) for item in reopened.shard_manager.get_blinded_shard_data(b"\x00\x01")], expected)
+    
+    def test_reopen_without_key_uses_saved_key(self):
+        """测试未指定私钥时使用保存的私钥，重新打开不会重新盲化"""
+        database = self._create_database(None)
+        key_id = database.psi_protocol.get_key_id()
+        key_file = os.path.join(self.database_path, SERVER_KEY_FILE)
+        self.assertEqual(os.stat(key_file).st_mode & 0o777, 0o600)
+        
+        # 重新盲化会写入新的分片文件并递增密钥版本
+        shard_files = sorted(os.listdir(os.path.join(self.database_path, "shards")))
+        reopened = BreachDatabase(self.database_path)
+        self.assertEqual(reopened.psi_protocol.get_key_id(), key_id)
+        self.assertEqual(reopened.key_epoch, 0)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.database_path, "shards"))), shard_files)
+        
+        # 显式指定新私钥时重新盲化，之后不指定私钥打开时使用新私钥
+        database = BreachDatabase(self.database_path, self.server_key)
+        self.assertEqual(database.key_epoch, 1)
+        self.assertEqual(BreachDatabase(self.database_path).psi_protocol.get_key_id(),
+                         database.psi_protocol.get_key_id())
+    
+    def test_key_rotation(self):
+        """测试后台轮换密钥期间查询不中断，完成后切换到新密钥并递增密钥版本"""
+        database = self._create_database(self.server_key)
+        old_key_id = database.psi_protocol.get_key_id()
+        self.assertEqual(database.key_epoch, 0)
+        
+        # 客户端盲化与服务器密钥无关，同一个查询在轮换前后都应命中
+        blinded_hash, shard_prefix, client_key = database.psi_protocol.client_blind_credential_hash(
+            self.credential_hashes[0]
+        )
+        results = []
+        
+        def query():
+            double_blinded_hash, blinded_shard_data, _ = database.process_query(blinded_hash, shard_prefix)
+            results.append(database.psi_protocol.client_process_response(
+                double_blinded_hash, blinded_shard_data, client_key
+            ))
+        
+        new_key = database.rotate_server_key(max_workers=1)
+        while database.key_rotation_in_progress:
+            query()
+        database.wait_for_key_rotation()
+        query()
+        
+        self.assertTrue(all(results))
+        self.assertEqual(database.key_epoch, 1)
+        self.assertNotEqual(database.psi_protocol.get_key_id(), old_key_id)
+        self.assertEqual(database.shard_manager.blinding_key_id, database.psi_protocol.get_key_id())
+        
+        # 用新密钥重新打开时直接使用新版本的分片
+        reopened = BreachDatabase(self.database_path, new_key)
+        self.assertEqual(reopened.key_epoch, 1)
+        self.assertEqual(reopened.shard_manager.blinding_key_id, database.psi_protocol.get_key_id())
+        
+        # 新私钥已保存，不指定私钥打开时同样不会重新盲化
+        reopened = BreachDatabase(self.database_path)
+        self.assertEqual(reopened.key_epoch, 1)
+        self.assertEqual(reopened.psi_protocol.get_key_id(), database.psi_protocol.get_key_id())
+        self.assertFalse(os.path.exists(os.path.join(self.database_path, SERVER_KEY_FILE + ".tmp")))
+    
+    def test_mapped_points_cached(self):
+        """测试映射点随记录保存，旧格式记录在重新盲化时补上映射点"""
+        psi = self._create_database(self.server_key).psi_protocol
+        
+        # 旧版本（没有映射点）的增量段与当前格式的文件混合
+        legacy_hash = bytes([0, 1]) + os.urandom(14)
+        legacy_record = legacy_hash + psi.blind_database_entry(legacy_hash)
+        with open(os.path.join(self.database_path, "shards", "segment-000099.bin"), 'wb') as f:
+            f.write(struct.pack("<8sQ", LEGACY_SEGMENT_FILE_MAGIC, 1) + legacy_record)
+        manifest_path = os.path.join(self.database_path, "shards", "manifest.json")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest["segments"].append("segment-000099.bin")
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        
+        database = BreachDatabase(self.database_path, bytes(range(2, 30)))
+        manager = database.shard_manager
+        self.assertEqual(len(manager.segment_files), 0)
+        
+        hashes = sorted(self.credential_hashes + [legacy_hash])
+        records = manager.shard_file.get_records(get_shard_index(b"\x00\x01", 16), 16)
+        self.assertEqual(len(records), len(hashes) * RECORD_SIZE)
+        for i, credential_hash in enumerate(hashes):
+            record = records[i * RECORD_SIZE:(i + 1) * RECORD_SIZE]
+            mapped_point = record[HASH_SIZE + POINT_SIZE:]
+            self.assertEqual(record[:HASH_SIZE], credential_hash)
+            self.assertEqual(mapped_point, database.psi_protocol.map_database_entry(credential_hash))
+            self.assertEqual(record[HASH_SIZE:HASH_SIZE + POINT_SIZE],
+                             database.psi_protocol.blind_mapped_entry(mapped_point))
+    
+    def test_bulk_blinder(self):
+        """测试多进程批量盲化与逐条盲化一致，并按原顺序产出"""
+        psi = BreachDatabase(self.database_path, bytes(range(2, 30))).psi_protocol
+        credential_hashes = [os.urandom(16) for _ in range(6)]
+        
+        # 部分记录有缓存的映射点，其余记录需要先映射
+        records = [
+            h + bytes(POINT_SIZE) + (psi.map_database_entry(h) if i % 2 else NO_MAPPED_POINT)
+            for i, h in enumerate(credential_hashes)
+        ]
+        shards = [records[0] + records[1], records[2] + records[3], records[4] + records[5], b'']
+        expected = [
+            b''.join(h + psi.blind_database_entry(h) + psi.map_database_entry(h)
+                     for h in credential_hashes[i:i + 2])
+            for i in range(0, 6, 2)
+        ] + [b'']
+        
+        # 每个任务一条记录，强制使用进程池
+        with BulkBlinder(bytes(range(2, 30)), max_workers=2, batch_records=1) as bulk_blinder:
+            self.assertEqual(list(bulk_blinder.blind_shards(iter(shards))), expected)
+        with BulkBlinder(bytes(range(2, 30)), max_workers=1) as bulk_blinder:
+            self.assertEqual(list(bulk_blinder.blind_shards(shards)), expected)
+    
+    def test_argon2_profile_persisted(self):
+        """测试Argon2配置记录在元数据中，已有凭证时不能更换"""
+        database = BreachDatabase(self.database_path, self.server_key, "low-memory")
+        self.assertEqual(database.metadata["argon2_profile"]["name"], "low-memory")
+        
+        # 重新打开时沿用记录的配置
+        database = self._create_database(self.server_key)
+        self.assertEqual(database.argon2_profile.name, "low-memory")
+        
+        with self.assertRaises(ValueError):
+            BreachDatabase(self.database_path, self.server_key, "default")
+        
+        # 清空后保留配置，空数据库可以更换配置
+        database.clear_database()
+        self.assertEqual(database.metadata["argon2_profile"]["name"], "low-memory")
+        database = BreachDatabase(self.database_path, self.server_key, "default")
+        self.assertEqual(BreachDatabase(self.database_path).argon2_profile.name, "default")
+
+
+
+class TestShardFile(unittest.TestCase):
+    """
+    测试mmap定长记录分片文件
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.entries = [(os.urandom(16), os.urandom(29)) for _ in range(200)]
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_save_and_reload(self):
+        """测试分片文件保存、重新加载和零拷贝读取"""
+        manager = ShardManager(self.temp_dir)
+        self.assertEqual(manager.add_credentials(self.entries), 200)
+        manager.save_shards()
+        
+        reloaded = ShardManager(self.temp_dir)
+        self.assertEqual(reloaded.get_shard_statistics()["total_credentials"], 200)
+        
+        credential_hash, blinded_hash = self.entries[0]
+        shard = reloaded.get_shard_data(credential_hash[:2])
+        blinded_shard = reloaded.get_blinded_shard_data(credential_hash[:2])
+        
+        self.assertIsInstance(shard, RecordView)
+        self.assertIn(credential_hash, shard)
+        self.assertIn(blinded_hash, blinded_shard)
+        self.assertEqual(bytes(blinded_shard[list(shard).index(credential_hash)]), blinded_hash)
+        self.assertEqual(len(reloaded.get_shard_data(b"\xff\xff")), sum(
+            1 for h, _ in self.entries if h[:2] == b"\xff\xff"
+        ))
+    
+    def test_incremental_save_and_deduplication(self):
+        """测试增量保存与跨批次去重"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:100])
+        manager.save_shards()
+        
+        # 已保存的条目不会重复添加
+        self.assertEqual(manager.add_credentials(self.entries), 100)
+        manager.save_shards()
+        
+        # 每次保存追加一个增量段
+        self.assertEqual(len(manager.segment_files), 2)
+        
+        reloaded = ShardManager(self.temp_dir)
+        sizes = reloaded.get_shard_sizes()
+        self.assertEqual(sum(sizes.values()), 200)
+        
+        for credential_hash, blinded_hash in self.entries:
+            shard = [bytes(item) for item in reloaded.get_shard_data(credential_hash[:2])]
+            self.assertEqual(shard, sorted(shard))
+            self.assertIn(blinded_hash, reloaded.get_blinded_shard_data(credential_hash[:2]))
+    
+    def test_bulk_deduplication(self):
+        """测试批量添加时批内、未保存条目和已保存文件之间的去重"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:50])
+        manager.save_shards()
+        manager.compact_shards()
+        manager.add_credentials(self.entries[50:100])
+        manager.save_shards()
+        manager.add_credentials(self.entries[100:150])
+        
+        # 与分片文件、增量段、未保存条目重复的条目以及批内重复的条目都被跳过
+        batch = self.entries[25:175] + self.entries[150:175]
+        self.assertEqual(manager.add_credentials(batch), 25)
+        self.assertFalse(manager.add_credential(*self.entries[10]))
+        self.assertFalse(manager.add_credential(*self.entries[60]))
+        self.assertFalse(manager.add_credential(*self.entries[160]))
+        self.assertTrue(manager.add_credential(*self.entries[199]))
+        self.assertEqual(manager.get_shard_statistics()["total_credentials"], 176)
+    
+    def test_compaction(self):
+        """测试增量段后台合并进分片文件"""
+        manager = ShardManager(self.temp_dir, compaction_threshold=3)
+        for i in range(0, 150, 50):
+            manager.add_credentials(self.entries[i:i + 50])
+            manager.save_shards()
+        manager.wait_for_compaction()
+        
+        # 第3个段写入后触发合并
+        self.assertIsNotNone(manager.shard_file)
+        self.assertEqual(manager.shard_file.record_count, 150)
+        self.assertEqual(manager.segment_files, ())
+        
+        manager.add_credentials(self.entries[150:])
+        manager.save_shards()
+        self.assertEqual(len(manager.segment_files), 1)
+        
+        manager.compact_shards()
+        self.assertEqual(manager.shard_file.record_count, 200)
+        self.assertEqual(manager.segment_files, ())
+        
+        data_files = sorted(f for f in os.listdir(self.temp_dir) if f.endswith(".bin"))
+        self.assertEqual(data_files, [os.path.basename(manager.shard_file.path)])
+        
+        reloaded = ShardManager(self.temp_dir)
+        for credential_hash, blinded_hash in self.entries:
+            self.assertIn(blinded_hash, reloaded.get_blinded_shard_data(credential_hash[:2]))
+    
+    def test_view_outlives_retired_file(self):
+        """测试查询取得的视图在文件被合并替换（关闭并删除）后仍然有效"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:100])
+        manager.save_shards()
+        
+        credential_hash, blinded_hash = self.entries[0]
+        view = manager.get_blinded_shard_data(credential_hash[:2])
+        old_path = manager.segment_files[0].path
+        
+        manager.add_credentials(self.entries[100:])
+        manager.save_shards()
+        manager.compact_shards()
+        self.assertFalse(os.path.exists(old_path))
+        
+        self.assertIn(blinded_hash, view)
+        self.assertEqual(len([bytes(item) for item in view]), len(view))
+    
+    def test_unreferenced_files_removed(self):
+        """测试崩溃遗留的未引用段文件在加载时被清理"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:10])
+        manager.save_shards()
+        
+        # 模拟写完段文件但未更新清单时崩溃
+        orphan = os.path.join(self.temp_dir, "segment-999999.bin")
+        with open(orphan, 'wb') as f:
+            f.write(b"partial")
+        
+        reloaded = ShardManager(self.temp_dir)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(reloaded.get_shard_statistics()["total_credentials"], 10)
+
+    
+    def test_reload_shards(self):
+        """测试读取方重新加载写入方保存的分片，且不清理写入方的文件"""
+        writer = ShardManager(self.temp_dir)
+        writer.add_credentials(self.entries[:50])
+        writer.save_shards()
+        
+        reader = ShardManager(self.temp_dir)
+        writer.add_credentials(self.entries[50:])
+        writer.save_shards()
+        self.assertEqual(reader.get_shard_statistics()["total_credentials"], 50)
+        
+        # 写入方正在生成、尚未加入清单的文件
+        in_progress = os.path.join(self.temp_dir, "segment-999999.bin.tmp")
+        with open(in_progress, 'wb') as f:
+            f.write(b"partial")
+        
+        reader.reload_shards()
+        self.assertEqual(reader.get_shard_statistics()["total_credentials"], 200)
+        self.assertTrue(os.path.exists(in_progress))
+
+
+class TestAdaptiveSharding(unittest.TestCase):
+    """
+    测试分片前缀位数的选择和重新分片
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.entries = [(os.urandom(16), os.urandom(29)) for _ in range(300)]
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _expected(self, credential_hash: bytes, prefix_bits: int):
+        shard_index = get_shard_index(credential_hash, prefix_bits)
+        return sorted(
+            blinded_hash for h, blinded_hash in self.entries
+            if get_shard_index(h, prefix_bits) == shard_index
+        )
+    
+    def _assert_lookups(self, manager: ShardManager, query_bits):
+        for credential_hash, _ in self.entries[:20]:
+            for prefix_bits in query_bits:
+                shard_prefix = get_shard_prefix(credential_hash, prefix_bits)
+                shard = manager.get_blinded_shard_data(shard_prefix, prefix_bits)
+                self.assertEqual(sorted(bytes(item) for item in shard),
+                                 self._expected(credential_hash, prefix_bits))
+    
+    def test_prefix_helpers(self):
+        """测试分片前缀只保留指定位数以及位数选择"""
+        credential_hash = bytes([0b10110111, 0xff]) + bytes(14)
+        
+        self.assertEqual(get_shard_prefix(credential_hash, 3), bytes([0b10100000]))
+        self.assertEqual(get_shard_prefix(credential_hash, 12), bytes([0b10110111, 0xf0]))
+        self.assertEqual(get_shard_index(get_shard_prefix(credential_hash, 12), 12),
+                         get_shard_index(credential_hash, 12))
+        with self.assertRaises(ValueError):
+            get_shard_index(b"\x01", 12)
+        
+        self.assertEqual(choose_prefix_bits(1000, 1024), 1)
+        self.assertEqual(choose_prefix_bits(5_000_000_000, 1024), 23)
+        self.assertEqual(choose_prefix_bits(10 ** 15, 1024), 24)
+        for record_count in (5000, 70000, 3_000_000):
+            prefix_bits = choose_prefix_bits(record_count, 1024)
+            self.assertTrue(512 < record_count / 2 ** prefix_bits <= 1024)
+    
+    def test_reshard(self):
+        """测试重新分片后任意位数的前缀都能定位到相同的记录"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:200])
+        manager.save_shards()
+        manager.compact_shards()
+        manager.add_credentials(self.entries[200:250])
+        manager.save_shards()
+        manager.add_credentials(self.entries[250:])
+        self.assertEqual(manager.prefix_bits, 16)
+        
+        for prefix_bits in (4, 20):
+            manager.reshard(prefix_bits)
+            
+            # 分片文件和增量段合并为新位数的分片文件，未保存条目按新位数重新分组
+            self.assertEqual(manager.prefix_bits, prefix_bits)
+            self.assertEqual(manager.shard_file.shard_count, 2 ** prefix_bits)
+            self.assertEqual(manager.segment_files, ())
+            self.assertEqual(manager.get_shard_statistics()["total_credentials"], 300)
+            self._assert_lookups(manager, (prefix_bits - 3, prefix_bits, 16, 24))
+        
+        manager.save_shards()
+        reloaded = ShardManager(self.temp_dir)
+        self.assertEqual(reloaded.prefix_bits, 20)
+        self._assert_lookups(reloaded, (16, 20))
+        
+        # 前缀位数比数据库少太多时拒绝查询
+        with self.assertRaises(ValueError):
+            reloaded.get_blinded_shard_data(b"\x00\x00", 15)
+    
+    def test_add_during_prefix_change(self):
+        """测试添加条目与切换分片前缀位数并发进行时不丢失条目"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:100])
+        manager.save_shards()
+        
+        def add_entries():
+            for start in range(100, 300, 5):
+                manager.add_credentials(self.entries[start:start + 5])
+                manager.add_credential(*self.entries[start])
+        
+        thread = threading.Thread(target=add_entries)
+        thread.start()
+        for prefix_bits in (4, 12, 6, 16) * 5:
+            manager.reshard(prefix_bits)
+        thread.join()
+        
+        self.assertEqual(len(manager._pending_hashes), 200)
+        self.assertEqual(sum(len(shard) for shard in manager.pending_shards.values()), 200)
+        self.assertEqual(manager.get_shard_statistics()["total_credentials"], 300)
+        manager.save_shards()
+        self._assert_lookups(manager, (manager.prefix_bits, 16))
+        for credential_hash, blinded_hash in self.entries[100:]:
+            shard = manager.get_blinded_shard_data(get_shard_prefix(credential_hash, 16), 16)
+            self.assertIn(blinded_hash, [bytes(item) for item in shard])
+    
+    def test_lookup_during_prefix_change(self):
+        """测试查询与切换分片前缀位数、保存分片并发进行时总能找到已添加的条目"""
+        manager = ShardManager(self.temp_dir)
+        manager.add_credentials(self.entries[:100])
+        done = threading.Event()
+        
+        def change_layout():
+            try:
+                # 只有未保存条目时重新分片只重新分组，切换很快；之后反复保存新的增量段
+                for round_index in range(200):
+                    manager.reshard((4, 12, 6, 10)[round_index % 4])
+                for start in range(100, 300, 5):
+                    manager.add_credentials(self.entries[start:start + 5])
+                    manager.save_shards()
+            finally:
+                done.set()
+        
+        # 频繁切换线程，使查询更容易落在切换分片布局的中途
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        thread = threading.Thread(target=change_layout)
+        thread.start()
+        try:
+            rounds = 0
+            while not done.is_set() or rounds == 0:
+                # 12位的查询在数据库位数更多时返回多个分片，位数更少时只返回匹配的条目
+                for query_bits in (12, 16):
+                    for credential_hash, blinded_hash in self.entries[:100]:
+                        shard = manager.get_blinded_shard_data(
+                            get_shard_prefix(credential_hash, query_bits), query_bits
+                        )
+                        self.assertIn(blinded_hash, [bytes(item) for item in shard])
+                rounds += 1
+        finally:
+            thread.join()
+            sys.setswitchinterval(switch_interval)
+    
+    def test_database_prefix_bits_follow_size(self):
+        """测试数据库首次保存按条目数选择位数，数据量增长后自动重新分片"""
+        database = BreachDatabase(os.path.join(self.temp_dir, "breach_db"))
+        manager = database.shard_manager
+        manager.target_shard_size = 16
+        
+        manager.add_credentials(self.entries[:40])
+        database.save_database()
+        self.assertEqual(database.shard_prefix_bits, 2)
+        
+        manager.add_credentials(self.entries[40:])
+        database.save_database()
+        manager.wait_for_compaction()
+        self.assertEqual(database.shard_prefix_bits, choose_prefix_bits(300, 16))
+        self.assertEqual(database.get_database_statistics()["shard_statistics"]["prefix_bits"],
+                         database.shard_prefix_bits)
+        self._assert_lookups(manager, (database.shard_prefix_bits, 16))
+        
+        self.assertEqual(database.reshard(3), 3)
+        self.assertEqual(BreachDatabase(os.path.join(self.temp_dir, "breach_db")).shard_prefix_bits, 3)
+    
+    def test_statistics_cached(self):
+        """测试数据库统计在保存和合并分片时计算，读取统计不遍历分片"""
+        database = BreachDatabase(os.path.join(self.temp_dir, "breach_db"))
+        manager = database.shard_manager
+        manager.add_credentials(self.entries[:100])
+        database.save_database()
+        
+        shard_size_calls = []
+        get_shard_sizes = manager.get_shard_sizes
+        manager.get_shard_sizes = lambda: shard_size_calls.append(1) or get_shard_sizes()
+        
+        for _ in range(3):
+            statistics = database.get_database_statistics()
+        self.assertEqual(shard_size_calls, [])
+        self.assertEqual(statistics["shard_statistics"]["total_credentials"], 100)
+        self.assertEqual(sum(statistics["size_distribution"].values()),
+                         get_shard_count(database.shard_prefix_bits))
+        
+        # 未保存的条目在保存后计入统计
+        manager.add_credentials(self.entries[100:])
+        self.assertEqual(database.get_database_statistics()["shard_statistics"]["total_credentials"], 100)
+        database.save_database()
+        manager.wait_for_compaction()
+        self.assertEqual(database.get_database_statistics()["shard_statistics"]["total_credentials"], 300)
+        
+        database.reshard(3)
+        statistics = database.get_database_statistics()
+        self.assertEqual(statistics["shard_statistics"]["prefix_bits"], 3)
+        self.assertEqual(sum(statistics["size_distribution"].values()), 8)
+
+
+class TestBreachImport(unittest.TestCase):
+    """
+    测试泄露数据文件的流式导入
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _write(self, name: str, content: str, opener=open) -> str:
+        path = os.path.join(self.temp_dir, name)
+        with opener(path, 'wt', encoding='utf-8') as f:
+            f.write(content)
+        return path
+    
+    def test_reader_formats(self):
+        """测试按文件头识别压缩格式并解析各种文件格式"""
+        combo = self._write("dump.txt.gz", "alice@example.com:pw:with:colons\nno separator\n\nbob:secret\n",
+                            gzip.open)
+        reader = BreachFileReader(combo)
+        self.assertEqual(reader.file_format, "combo")
+        self.assertEqual(list(reader.read()), [("alice@example.com", "pw:with:colons"), ("bob", "secret")])
+        self.assertEqual(reader.malformed, 1)
+        
+        # 扩展名与内容不符时仍按文件头解压
+        plain = self._write("passwords.bin", "123456\n  password  \n", bz2.open)
+        self.assertEqual(list(BreachFileReader(plain, "plain", username_prefix="p").read()),
+                         [("p0", "123456"), ("p1", "password")])
+        
+        table = self._write("dump.csv.xz", 'Password,Email\n"pa,ss",carol\nshort\n', lzma.open)
+        reader = BreachFileReader(table, username_column="email", password_column="password")
+        self.assertEqual(list(reader.read()), [("carol", "pa,ss")])
+        self.assertEqual(reader.malformed, 1)
+    
+    def test_reader_resume(self):
+        """测试从保存的读取位置继续读取"""
+        path = self._write("dump.csv.gz", "user,password\n" + "".join(
+            f"user{i},password{i}\n" for i in range(10)
+        ), gzip.open)
+        
+        reader = BreachFileReader(path, header=True)
+        credentials = reader.read()
+        first = [next(credentials) for _ in range(4)]
+        position = reader.position()
+        credentials.close()
+        
+        rest = list(BreachFileReader(path, header=True).read(**position))
+        self.assertEqual(first + rest, [(f"user{i}", f"password{i}") for i in range(10)])
+    
+    def test_import_resume(self):
+        """测试导入从检查点继续，完成后不重复导入"""
+        path = self._write("dump.txt", "alice:password1\nbob:password2\nBob@example.com:password2\n"
+                                       "x:\ncarol:password3\n")
+        database = BreachDatabase(os.path.join(self.temp_dir, "breach_db"))
+        
+        # 模拟在第一条记录写入后中断的导入
+        reader = BreachFileReader(path)
+        credentials = reader.read()
+        database.add_breach_data([next(credentials)], max_workers=1)
+        checkpoint = ImportCheckpoint(
+            os.path.join(database.storage_path, IMPORT_CHECKPOINT_DIR), path,
+            {
+                "format": "combo", "separator": ":", "username_column": 0, "password_column": 1,
+                "header": False, "username_prefix": "user", "encoding": "utf-8"
+            }
+        )
+        checkpoint.position = reader.position()
+        checkpoint.stats = {"read": 1, "processed": 1, "added": 1}
+        checkpoint.save()
+        credentials.close()
+        
+        stats = database.import_breach_file(path, "测试泄露", chunk_size=2, max_workers=1)
+        self.assertEqual((stats["read"], stats["processed"], stats["added"]), (5, 3, 3))
+        self.assertEqual((stats["invalid"], stats["duplicates"]), (1, 1))
+        self.assertEqual(database.shard_manager.get_shard_statistics()["total_credentials"], 3)
+        self.assertTrue(database.query_credential("carol", "password3"))
+        
+        self.assertEqual(database.import_breach_file(path)["processed"], 3)
+        self.assertEqual(len(database.metadata["breaches"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,662 @@
+#!/usr/bin/env python3
+"""
+服务器与客户端通信测试
+"""
+
+import sys
+import os
+import asyncio
+import contextlib
+import io
+import json
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import requests
+from werkzeug.serving import make_server
+
+# 添加src目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.client.async_checker import AsyncPasswordChecker
+from src.client.load_benchmark import LoadGenerator, prepare_queries
+from src.client.password_checker import PasswordChecker
+from src.crypto.psi_protocol import PSIProtocol
+from src.database.breach_db import BreachDatabase
+from src.server.checkup_server import CheckupServer
+from src.server.metrics import METRICS_CONTENT_TYPE
+from src.utils.latency_histogram import LATENCY_BUCKETS, LatencyHistogram
+from src.utils.wire_format import (
+    BINARY_CONTENT_TYPE, EntryView, decode_batch_response, decode_query_response,
+    encode_batch_response, encode_query_response
+)
+
+
+def make_response(content: bytes, content_type: str) -> requests.Response:
+    """构造一个requests响应对象"""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response.headers["Content-Type"] = content_type
+    return response
+
+
+class TestWireFormat(unittest.TestCase):
+    """
+    测试二进制响应格式
+    """
+    
+    def test_encode_decode(self):
+        """测试编码和零拷贝解析"""
+        entries = [os.urandom(29) for _ in range(50)]
+        data = encode_query_response(b"\x02" * 29, entries, 29)
+        
+        double_blinded_hash, view = decode_query_response(data)
+        
+        self.assertEqual(double_blinded_hash, b"\x02" * 29)
+        self.assertIsInstance(view, EntryView)
+        self.assertEqual(len(view), 50)
+        self.assertEqual([bytes(item) for item in view], entries)
+        self.assertEqual(bytes(view[-1]), entries[-1])
+        self.assertIn(entries[17], view)
+        self.assertNotIn(os.urandom(29), view)
+    
+    def test_membership_requires_alignment(self):
+        """测试跨越条目边界的匹配不算命中"""
+        entries = [bytes(range(0, 4)), bytes(range(4, 8))]
+        _, view = decode_query_response(encode_query_response(b"\x01", entries, 4))
+        
+        self.assertIn(bytes(range(4, 8)), view)
+        self.assertNotIn(bytes(range(2, 6)), view)
+        self.assertNotIn(bytes(range(4, 7)), view)
+    
+    def test_invalid_data(self):
+        """测试长度不一致的响应被拒绝"""
+        data = encode_query_response(b"\x01", [b"abcd"], 4)
+        
+        with self.assertRaises(ValueError):
+            decode_query_response(data[:-1])
+        with self.assertRaises(ValueError):
+            decode_query_response(b"XX" + data[2:])
+    
+    def test_batch_encode_decode(self):
+        """测试批量响应中相同分片共享同一个视图"""
+        shards = [[os.urandom(8) for _ in range(3)], [os.urandom(8)]]
+        hashes = [os.urandom(29) for _ in range(3)]
+        data = encode_batch_response(hashes, [0, 1, 0], shards, 8)
+        
+        results = decode_batch_response(data)
+        
+        self.assertEqual([item[0] for item in results], hashes)
+        self.assertIs(results[0][1], results[2][1])
+        self.assertEqual([bytes(item) for item in results[0][1]], shards[0])
+        self.assertEqual([bytes(item) for item in results[1][1]], shards[1])
+        
+        with self.assertRaises(ValueError):
+            decode_batch_response(data[:-1])
+        with self.assertRaises(ValueError):
+            decode_batch_response(encode_batch_response(hashes[:1], [2], shards, 8))
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """
+    测试延迟直方图
+    """
+    
+    def test_quantiles(self):
+        """测试分位数估计误差不超过所在桶的宽度"""
+        histogram = LatencyHistogram(["request"])
+        samples = [i / 10000 for i in range(1, 1001)]
+        for seconds in samples:
+            histogram.observe("request", seconds)
+        histogram.observe("request", LATENCY_BUCKETS[-1] * 2)
+        
+        counts, total_time, count = histogram.snapshot("request")
+        self.assertEqual(count, 1001)
+        self.assertEqual(sum(counts), 1001)
+        self.assertEqual(counts[-1], 1)
+        self.assertAlmostEqual(total_time, sum(samples) + LATENCY_BUCKETS[-1] * 2)
+        
+        summary = histogram.summary()["request"]
+        for name, expected in (("p50", 0.05), ("p95", 0.095), ("p99", 0.099)):
+            self.assertLess(abs(summary[name] - expected), expected * 0.2)
+        
+        histogram.reset()
+        self.assertEqual(histogram.summary()["request"], {"count": 0, "mean": 0.0, "p50": 0.0,
+                                                          "p95": 0.0, "p99": 0.0})
+
+
+class TestQueryEndpoint(unittest.TestCase):
+    """
+    测试 /query 端点的内容协商
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = CheckupServer(os.path.join(self.temp_dir, "breach_db"))
+        self.client = self.server.app.test_client()
+        
+        psi = self.server.database.psi_protocol
+        self.credential_hashes = [b"\x12\x34" + os.urandom(14) for _ in range(20)]
+        self.server.database.shard_manager.add_credentials([
+            (credential_hash, psi.blind_database_entry(credential_hash))
+            for credential_hash in self.credential_hashes
+        ])
+        self.request_data = {
+            "blinded_hash": psi.server_blind_query(psi.blinder.point_to_bytes(psi.blinder.public_key)).hex(),
+            "shard_prefix": "1234"
+        }
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_json_response_by_default(self):
+        """测试未指定Accept时返回JSON"""
+        response = self.client.post('/query', json=self.request_data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(len(response.get_json()["blinded_shard_data"]), 20)
+    
+    def test_binary_response(self):
+        """测试二进制响应与JSON响应内容一致且体积更小"""
+        json_response = self.client.post('/query', json=self.request_data)
+        binary_response = self.client.post(
+            '/query', json=self.request_data, headers={"Accept": BINARY_CONTENT_TYPE}
+        )
+        
+        self.assertEqual(binary_response.mimetype, BINARY_CONTENT_TYPE)
+        self.assertLess(len(binary_response.data) * 2, len(json_response.data))
+        
+        parsed_json = PasswordChecker._parse_query_response(
+            make_response(json_response.data, "application/json")
+        )
+        parsed_binary = PasswordChecker._parse_query_response(
+            make_response(binary_response.data, BINARY_CONTENT_TYPE)
+        )
+        
+        self.assertEqual(parsed_binary["double_blinded_hash"], parsed_json["double_blinded_hash"])
+        self.assertEqual(
+            [bytes(item) for item in parsed_binary["blinded_shard_data"]],
+            parsed_json["blinded_shard_data"]
+        )
+    
+    def test_truncated_digest_response(self):
+        """测试截断摘要模式的响应"""
+        request_data = dict(self.request_data, digest_length=8)
+        full_response = self.client.post(
+            '/query', json=self.request_data, headers={"Accept": BINARY_CONTENT_TYPE}
+        )
+        truncated_response = self.client.post(
+            '/query', json=request_data, headers={"Accept": BINARY_CONTENT_TYPE}
+        )
+        json_response = self.client.post('/query', json=request_data)
+        
+        self.assertLess(len(truncated_response.data) * 2, len(full_response.data))
+        
+        parsed_full = PasswordChecker._parse_query_response(
+            make_response(full_response.data, BINARY_CONTENT_TYPE)
+        )
+        parsed_truncated = PasswordChecker._parse_query_response(
+            make_response(truncated_response.data, BINARY_CONTENT_TYPE)
+        )
+        parsed_json = PasswordChecker._parse_query_response(
+            make_response(json_response.data, "application/json")
+        )
+        
+        self.assertIsNone(parsed_full["digest_length"])
+        self.assertEqual(parsed_truncated["digest_length"], 8)
+        self.assertEqual(parsed_json["digest_length"], 8)
+        self.assertEqual(
+            [bytes(item) for item in parsed_truncated["blinded_shard_data"]],
+            [bytes(item[1:9]) for item in parsed_full["blinded_shard_data"]]
+        )
+        self.assertEqual(parsed_json["blinded_shard_data"],
+                         [bytes(item) for item in parsed_truncated["blinded_shard_data"]])
+    
+    def test_invalid_digest_length(self):
+        """测试超出范围的截断摘要长度被拒绝"""
+        for digest_length in (0, 64, "abc"):
+            response = self.client.post(
+                '/query', json=dict(self.request_data, digest_length=digest_length)
+            )
+            self.assertEqual(response.status_code, 400)
+    
+    def test_invalid_blinded_hash(self):
+        """测试无效的十六进制或无效的曲线点编码被拒绝"""
+        for blinded_hash in ("zz", "05" + "00" * 32, self.request_data["blinded_hash"][:-2]):
+            request_data = dict(self.request_data, blinded_hash=blinded_hash)
+            self.assertEqual(self.client.post('/query', json=request_data).status_code, 400)
+            self.assertEqual(self.client.post(
+                '/query_batch', json={"queries": [request_data]}
+            ).status_code, 400)
+    
+    def test_prefix_bits(self):
+        """测试按请求的分片前缀位数定位分片，前缀过短时拒绝"""
+        info = self.client.get('/info').get_json()
+        self.assertEqual(info["server_info"]["shard_prefix_bits"], 16)
+        
+        # 更短的前缀返回相邻的多个分片，更长的前缀只返回匹配的条目
+        coarse = self.client.post('/query', json=dict(self.request_data, shard_prefix="1230",
+                                                      prefix_bits=12)).get_json()
+        fine = self.client.post('/query', json=dict(self.request_data, shard_prefix="123480",
+                                                    prefix_bits=17)).get_json()
+        self.assertEqual(len(coarse["blinded_shard_data"]), 20)
+        self.assertEqual(len(fine["blinded_shard_data"]), sum(
+            1 for credential_hash in self.credential_hashes if credential_hash[2] >= 0x80
+        ))
+        
+        for request_data in (dict(self.request_data, prefix_bits=8),
+                             dict(self.request_data, prefix_bits=24)):
+            self.assertEqual(self.client.post('/query', json=request_data).status_code, 400)
+        self.assertEqual(self.client.post('/query_batch', json={
+            "queries": [self.request_data], "prefix_bits": 8
+        }).status_code, 400)
+    
+    def test_key_rotation(self):
+        """测试响应带有密钥版本，轮换后版本递增且客户端丢弃缓存的服务器参数"""
+        response = self.client.post('/query', json=self.request_data)
+        self.assertEqual(response.headers["X-Key-Epoch"], "0")
+        self.assertEqual(response.get_json()["key_epoch"], 0)
+        
+        self.assertEqual(self.client.post('/admin/rotate_key').status_code, 202)
+        self.server.database.wait_for_key_rotation()
+        
+        response = self.client.post('/query', json=self.request_data,
+                                    headers={"Accept": BINARY_CONTENT_TYPE})
+        self.assertEqual(response.headers["X-Key-Epoch"], "1")
+        self.assertEqual(len(decode_query_response(response.data)[1]), 20)
+        self.assertEqual(self.client.get('/info').get_json()["server_info"]["key_epoch"], 1)
+        
+        checker = PasswordChecker()
+        checker.key_epoch = 0
+        checker._server_parameters_synced = True
+        rotated_response = make_response(response.data, BINARY_CONTENT_TYPE)
+        rotated_response.headers["X-Key-Epoch"] = "1"
+        checker._check_key_epoch(rotated_response)
+        self.assertEqual(checker.key_epoch, 1)
+        self.assertFalse(checker._server_parameters_synced)
+        checker.close()
+    
+    def test_metrics(self):
+        """测试 /metrics 导出各处理阶段的延迟直方图和分位数"""
+        for _ in range(3):
+            self.assertEqual(self.client.post('/query', json=self.request_data).status_code, 200)
+        
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], METRICS_CONTENT_TYPE)
+        
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn("password_checkup_queries_total 3", lines)
+        for stage in ("parse", "shard_lookup", "blinding", "serialization", "request"):
+            self.assertIn(f'password_checkup_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} 3',
+                          lines)
+            self.assertIn(f'password_checkup_stage_latency_seconds_count{{stage="{stage}"}} 3', lines)
+            for quantile in ("0.5", "0.95", "0.99"):
+                self.assertTrue(any(line.startswith(
+                    f'password_checkup_stage_latency_quantile_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                ) for line in lines))
+        self.assertIn("password_checkup_key_epoch 0", lines)
+        
+        latency = self.client.get('/statistics').get_json()["latency"]
+        self.assertEqual(latency["request"]["count"], 3)
+        self.assertGreaterEqual(latency["request"]["p99"], latency["request"]["p50"])
+    
+    def test_argon2_profile_advertised(self):
+        """测试服务器公布Argon2配置，客户端据此计算凭证哈希"""
+        server = CheckupServer(os.path.join(self.temp_dir, "low_memory_db"), argon2_profile="low-memory")
+        info = server.app.test_client().get('/info').get_json()
+        self.assertEqual(info["server_info"]["argon2_profile"]["name"], "low-memory")
+        
+        http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        
+        checker = PasswordChecker("127.0.0.1", http_server.server_port)
+        try:
+            self.assertTrue(checker.sync_server_parameters())
+        finally:
+            checker.close()
+            http_server.shutdown()
+            thread.join()
+        
+        self.assertEqual(checker.psi_protocol.argon2_profile.tag, server.database.argon2_profile.tag)
+        self.assertEqual(checker.psi_protocol.shard_prefix_bits, server.database.shard_prefix_bits)
+
+
+
+class TestQueryBatchEndpoint(unittest.TestCase):
+    """
+    测试 /query_batch 端点和客户端批量查询
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = CheckupServer(os.path.join(self.temp_dir, "breach_db"))
+        self.client = self.server.app.test_client()
+        
+        psi = self.server.database.psi_protocol
+        self.server.database.shard_manager.add_credentials([
+            (credential_hash, psi.blind_database_entry(credential_hash))
+            for credential_hash in [prefix + os.urandom(14)
+                                    for prefix in (b"\x12\x34", b"\x56\x78") for _ in range(10)]
+        ])
+        
+        blinded_hash = psi.server_blind_query(psi.blinder.point_to_bytes(psi.blinder.public_key))
+        self.queries = [
+            {"blinded_hash": blinded_hash.hex(), "shard_prefix": shard_prefix}
+            for shard_prefix in ("1234", "5678", "1234", "9abc")
+        ]
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_shared_shards(self):
+        """测试相同分片在批量响应中只出现一次"""
+        response = self.client.post('/query_batch', json={"queries": self.queries})
+        data = response.get_json()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["shard"] for result in data["results"]], [0, 1, 0, 2])
+        self.assertEqual([len(shard) for shard in data["shards"]], [10, 10, 0])
+        self.assertEqual(self.server.query_count, 4)
+    
+    def test_batch_matches_single_queries(self):
+        """测试批量响应与逐条查询的结果一致"""
+        request_data = {"queries": self.queries, "digest_length": 8}
+        json_response = self.client.post('/query_batch', json=request_data)
+        binary_response = self.client.post(
+            '/query_batch', json=request_data, headers={"Accept": BINARY_CONTENT_TYPE}
+        )
+        
+        parsed_json = PasswordChecker._parse_batch_response(
+            make_response(json_response.data, "application/json")
+        )
+        parsed_binary = PasswordChecker._parse_batch_response(
+            make_response(binary_response.data, BINARY_CONTENT_TYPE)
+        )
+        
+        for query, json_item, binary_item in zip(self.queries, parsed_json, parsed_binary):
+            single = PasswordChecker._parse_query_response(make_response(
+                self.client.post('/query', json=dict(query, digest_length=8)).data,
+                "application/json"
+            ))
+            
+            for item in (json_item, binary_item):
+                self.assertEqual(item["double_blinded_hash"], single["double_blinded_hash"])
+                self.assertEqual(item["digest_length"], 8)
+                self.assertEqual([bytes(entry) for entry in item["blinded_shard_data"]],
+                                 single["blinded_shard_data"])
+    
+    def test_invalid_batch(self):
+        """测试无效的批量请求被拒绝"""
+        self.assertEqual(self.client.post('/query_batch', json={"queries": []}).status_code, 400)
+        self.assertEqual(self.client.post(
+            '/query_batch', json={"queries": [{"blinded_hash": "00"}]}
+        ).status_code, 400)
+    
+    def test_client_batch_check(self):
+        """测试客户端通过一次批量请求检查多个凭证"""
+        http_server = make_server("127.0.0.1", 0, self.server.app, threaded=True)
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        
+        checker = PasswordChecker("127.0.0.1", http_server.server_port, digest_length=8)
+        output = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                results = checker.batch_check_credentials(
+                    [("alice", "password1"), ("bob", "password2"), ("", "")], show_progress=False
+                )
+        finally:
+            checker.close()
+            http_server.shutdown()
+            thread.join()
+        
+        self.assertEqual(set(results), {"alice:password1", "bob:password2", ":"})
+        self.assertFalse(results[":"])
+        # 不显示进度时批量检查不向标准输出打印任何内容
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(self.server.query_count, 2)
+        statistics = checker.get_statistics()
+        self.assertEqual(statistics["total_queries"], 2)
+        
+        # 两次Argon2哈希，/info之外只有一次批量请求
+        self.assertEqual(statistics["latency"]["argon2"]["count"], 2)
+        self.assertEqual(statistics["latency"]["network"]["count"], 1)
+        self.assertEqual(statistics["latency"]["request"]["count"], 1)
+    
+    def test_client_resyncs_after_reshard(self):
+        """测试重新分片后前缀位数过时的查询被拒绝时，客户端重新同步参数并重试一次"""
+        # 保存时按条目数选择较少的前缀位数
+        self.server.database.add_breach_data([("alice", "password1")], max_workers=1)
+        prefix_bits = self.server.database.shard_prefix_bits
+        self.assertLess(prefix_bits, 8)
+        
+        http_server = make_server("127.0.0.1", 0, self.server.app, threaded=True)
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        
+        checkers = [PasswordChecker("127.0.0.1", http_server.server_port) for _ in range(2)]
+        output = io.StringIO()
+        try:
+            for checker in checkers:
+                self.assertTrue(checker.sync_server_parameters())
+                self.assertEqual(checker.psi_protocol.shard_prefix_bits, prefix_bits)
+            self.server.database.reshard(prefix_bits + 8)
+            
+            response = self.client.post('/query_batch', json={"queries": self.queries,
+                                                              "prefix_bits": prefix_bits})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.headers["X-Shard-Prefix-Bits"], str(prefix_bits + 8))
+            
+            self.assertTrue(checkers[0].check_credentials("alice", "password1"))
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(checkers[1].batch_check_credentials(
+                    [("alice", "password1"), ("bob", "password2")], show_progress=False
+                ), {"alice:password1": True, "bob:password2": False})
+        finally:
+            for checker in checkers:
+                checker.close()
+            http_server.shutdown()
+            thread.join()
+        
+        for checker in checkers:
+            self.assertEqual(checker.psi_protocol.shard_prefix_bits, prefix_bits + 8)
+            # 被拒绝的请求和重试各一次
+            self.assertEqual(checker.get_statistics()["latency"]["network"]["count"], 2)
+        # 重新同步的提示信息同样只在显示进度时输出
+        self.assertEqual(output.getvalue(), "")
+
+
+
+class TestAsyncPasswordChecker(unittest.TestCase):
+    """
+    测试并发密码检查客户端
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = CheckupServer(os.path.join(self.temp_dir, "breach_db"))
+        self.http_server = make_server("127.0.0.1", 0, self.server.app, threaded=True)
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def tearDown(self):
+        self.http_server.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_iter_check_credentials(self):
+        """测试异步生成器产出每个凭证的结果"""
+        credentials = [("alice", "password1"), ("bob", "password2"), ("", ""), ("carol", "password3")]
+        
+        async def run():
+            async with AsyncPasswordChecker("127.0.0.1", self.http_server.server_port,
+                                            concurrency=2, hash_workers=1) as checker:
+                results = [result async for result in checker.iter_check_credentials(iter(credentials))]
+                return results, checker.get_statistics()
+        
+        results, statistics = asyncio.run(run())
+        
+        self.assertEqual(sorted((username, password) for username, password, _ in results),
+                         sorted(credentials))
+        self.assertIn(("", "", False), results)
+        self.assertEqual(statistics["total_queries"], 3)
+        self.assertEqual(self.server.query_count, 3)
+    
+    def test_invalid_concurrency(self):
+        """测试并发数必须为正数"""
+        with self.assertRaises(ValueError):
+            AsyncPasswordChecker(concurrency=0)
+
+
+
+class TestLoadGenerator(unittest.TestCase):
+    """
+    测试查询负载生成器
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = CheckupServer(os.path.join(self.temp_dir, "breach_db"))
+        self.http_server = make_server("127.0.0.1", 0, self.server.app, threaded=True)
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.thread.start()
+        self.server_url = f"http://127.0.0.1:{self.http_server.server_port}"
+    
+    def tearDown(self):
+        self.http_server.shutdown()
+        self.thread.join()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_closed_and_open_loop(self):
+        """测试闭环和开环压测的报告"""
+        prepared_requests = prepare_queries(10, self.server.database.shard_prefix_bits, batch_size=4)
+        self.assertEqual([query_count for _, _, query_count in prepared_requests], [4, 4, 2])
+        
+        generator = LoadGenerator(self.server_url, prepared_requests, concurrency=2)
+        try:
+            generator.warm_up(3)
+            report = generator.run_closed_loop(duration=30, max_requests=6)
+            self.assertEqual((report["requests"], report["queries"], report["error_rate"]), (6, 20, 0.0))
+            self.assertGreater(report["queries_per_second"], 0)
+            self.assertLessEqual(report["latency_ms"]["p50"], report["latency_ms"]["max"])
+            
+            report = generator.run_open_loop(rate=100, duration=30, arrival="uniform", max_requests=5)
+            self.assertEqual((report["mode"], report["requests"], report["errors"]), ("open", 5, {}))
+            self.assertIn("p99", report["service_latency_ms"])
+        finally:
+            generator.close()
+        
+        # 预热、闭环和开环各自从第一个请求开始循环使用
+        self.assertEqual(self.server.query_count, 10 + 20 + 18)
+    
+    def test_errors_and_loopback_only(self):
+        """测试错误请求计入错误率，且只能连接本机服务器"""
+        generator = LoadGenerator(self.server_url, [("/query", b"{}", 1)], concurrency=1)
+        try:
+            report = generator.run_closed_loop(duration=30, max_requests=2)
+        finally:
+            generator.close()
+        self.assertEqual((report["errors"], report["error_rate"]), ({"http_400": 2}, 1.0))
+        self.assertEqual(report["latency_ms"], {})
+        
+        with self.assertRaises(ValueError):
+            LoadGenerator("http://192.0.2.1:8080", [("/query", b"{}", 1)])
+
+
+class TestPreforkServer(unittest.TestCase):
+    """
+    测试多进程生产服务器
+    """
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        
+        script = (
+            "from src.server.checkup_server import CheckupServer\n"
+            f"CheckupServer({os.path.join(self.temp_dir, 'breach_db')!r})"
+            f".run('127.0.0.1', {self.port}, workers=2)\n"
+        )
+        self.process = subprocess.Popen([sys.executable, "-c", script], cwd=project_root,
+                                        stdout=subprocess.DEVNULL)
+        self._wait_until_healthy()
+    
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _wait_until_healthy(self):
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                if requests.get(f"{self.url}/health", timeout=1).status_code == 200:
+                    return
+            except requests.exceptions.ConnectionError:
+                pass
+            time.sleep(0.1)
+        self.fail("服务器未能启动")
+    
+    def test_shared_statistics_and_reload(self):
+        """测试统计在工作进程间汇总、SIGHUP重新加载、SIGUSR1密钥轮换和优雅停止"""
+        psi = PSIProtocol()
+        request_data = {
+            "blinded_hash": psi.server_blind_query(psi.blinder.point_to_bytes(psi.blinder.public_key)).hex(),
+            "shard_prefix": "1234"
+        }
+        
+        # 每次新建连接，使请求分散到不同的工作进程
+        for _ in range(6):
+            self.assertEqual(requests.post(f"{self.url}/query", json=request_data).status_code, 200)
+        
+        info = requests.get(f"{self.url}/info").json()["server_info"]
+        self.assertEqual(info["workers"], 2)
+        self.assertEqual(info["total_queries"], 6)
+        self.assertEqual(requests.post(f"{self.url}/admin/clear_database").status_code, 403)
+        
+        self.process.send_signal(signal.SIGHUP)
+        time.sleep(1)
+        self._wait_until_healthy()
+        self.assertEqual(requests.post(f"{self.url}/query", json=request_data).status_code, 200)
+        self.assertEqual(
+            requests.get(f"{self.url}/statistics").json()["server_stats"]["total_queries"], 7
+        )
+        
+        # SIGUSR1在主进程中轮换密钥，完成后新工作进程使用新的密钥版本
+        self.process.send_signal(signal.SIGUSR1)
+        deadline = time.time() + 30
+        while requests.get(f"{self.url}/info").json()["server_info"]["key_epoch"] != 1:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.1)
+        response = requests.post(f"{self.url}/query", json=request_data)
+        self.assertEqual(response.headers["X-Key-Epoch"], "1")
+        
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(timeout=30), 0)
+        
+        # 轮换后的私钥已保存，重启时使用它而不是生成新密钥
+        database_path = os.path.join(self.temp_dir, "breach_db")
+        with open(os.path.join(database_path, "shards", "manifest.json")) as f:
+            rotated_key_id = json.load(f)["key_id"]
+        reopened = BreachDatabase(database_path)
+        self.assertEqual(reopened.psi_protocol.get_key_id(), rotated_key_id)
+        self.assertEqual(reopened.key_epoch, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()